@@ -0,0 +1,95 @@
+# admission.py
+# Admission control for the backend's FastAPI layer (interview_trainer_app.py, and the
+# load-test stand-in mock_backend.py). Each model pool runs at most `capacity` requests at
+# once; up to `queue_depth` more wait here, in order, instead of piling up in Modal's queue.
+# Anything beyond that is refused at once (Overloaded -> 429) with a Retry-After estimated
+# from recent service times, so admitted requests keep a bounded wait. Counts are per API
+# container.
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+from starlette.responses import StreamingResponse
+
+class Overloaded(Exception):
+    def __init__(self, pool: str, retry_after: int):
+        super().__init__(f"{pool} is at capacity, retry in {retry_after}s")
+        self.pool = pool
+        self.retry_after = retry_after
+
+class AdmissionGate:
+    def __init__(self, pool: str, capacity: int, queue_depth: int, max_retry_after: int):
+        self.pool = pool
+        self.capacity = capacity
+        self.queue_depth = queue_depth
+        self.max_retry_after = max_retry_after
+        self.running = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_seconds = 1.0      # Moving average of how long one request holds a slot
+        self._slots = asyncio.Semaphore(capacity)
+
+    def retry_after(self) -> int:
+        """Seconds until the work ahead of a new request should have drained."""
+        waves = (self.running + self.queued) / self.capacity
+        return max(1, min(self.max_retry_after, math.ceil(waves * self.avg_seconds)))
+
+    async def acquire(self) -> float:
+        """Waits for a slot, or raises Overloaded if the queue is full. Returns the start time for release()."""
+        if self.running + self.queued >= self.capacity + self.queue_depth:
+            self.rejected += 1
+            raise Overloaded(self.pool, self.retry_after())
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        self.admitted += 1
+        return time.monotonic()
+
+    def release(self, started: float):
+        self.running -= 1
+        self._slots.release()
+        self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * (time.monotonic() - started)
+
+    @asynccontextmanager
+    async def admit(self):
+        started = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def snapshot(self) -> Dict:
+        return {
+            "running": self.running, "queued": self.queued, "capacity": self.capacity,
+            "queue_depth": self.queue_depth, "admitted": self.admitted, "rejected": self.rejected,
+            "avg_seconds": round(self.avg_seconds, 3), "retry_after": self.retry_after()
+        }
+
+class AdmittedStream(StreamingResponse):
+    """
+    A StreamingResponse holding a slot taken with `gate.acquire()` (before responding, so
+    overload is still a 429) until the response is over. The slot is released however it
+    ends, including a client that disconnects before or during the stream; the body is
+    closed first so its generator stops producing.
+    """
+    def __init__(self, gate: AdmissionGate, started: float, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.gate = gate
+        self.started = started
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                if hasattr(self.body_iterator, "aclose"): await self.body_iterator.aclose()
+            finally:
+                self.gate.release(self.started)
+
+def make_gates(capacity: Dict[str, int], queue_depth: Dict[str, int], max_retry_after: int) -> Dict[str, AdmissionGate]:
+    return {pool: AdmissionGate(pool, capacity[pool], queue_depth[pool], max_retry_after) for pool in capacity}
@@ -1,83 +1,404 @@
-# api_client.py
 import aiohttp
+import asyncio
 import json
-from typing import List, Dict
-# Ensure you update this URL after deploying the backend again
-BASE_URL = ""
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import List, Dict, NamedTuple, Optional, Tuple, AsyncIterator, Union
+from config import (
+    HTTP_POOL_SIZE, HTTP_KEEPALIVE_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+    HTTP_MAX_RETRIES, HTTP_RETRY_BACKOFF, HTTP_MAX_RETRY_AFTER, ENDPOINT_CONCURRENCY, TTS_VOICE, TTS_CACHE_MAX_BYTES,
+    TTS_FORMAT, TTS_BITRATE_KBPS, LLM_CONTEXT_TOKENS, READY_REQUEST_TIMEOUT, WARM_TOKEN_HEADER
+)
+import metrics
+# Ensure you update this URL after deploying the backend again (MODAL_BASE_URL overrides it,
+# e.g. to point load tests at mock_backend.py)
+BASE_URL = os.environ.get("MODAL_BASE_URL", "")
 TTS_URL = f"{BASE_URL}/tts"
 STT_URL = f"{BASE_URL}/stt"
 LLM_URL = f"{BASE_URL}/llm"
+LLM_STREAM_URL = f"{BASE_URL}/llm/stream"
+READY_URL = f"{BASE_URL}/ready"
+WARM_URL = f"{BASE_URL}/warm"
+
+# Server-side stop strings: short dialogue replies end at a blank line or a speaker label;
+# long-form output (reports, summaries) only at a new speaker turn
+DIALOGUE_STOP = ["\n\n", "User:", "Candidate:", "Assistant:"]
+LONG_FORM_STOP = ["\nUser:", "\nCandidate:", "\nAssistant:"]
+
+class Analysis(NamedTuple):
+    rating: str
+    feedback: str
+    is_struggling: bool
+    should_probe: bool
+
+def parse_analysis(text: str) -> Optional[Analysis]:
+    """Parses the analyzer's JSON reply into an Analysis, or None if it is not one."""
+    try:
+        data = json.loads(text)
+        return Analysis(
+            rating=str(data["rating"]),
+            feedback=str(data["feedback"]),
+            is_struggling=bool(data["is_struggling"]),
+            should_probe=bool(data["should_probe"])
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+
+# Errors worth another attempt: failed connects and dropped/reset connections. A read timeout
+# is not one: the backend may still be working on the request, so resending it only doubles
+# the load (and, at HTTP_READ_TIMEOUT, the wait)
+RETRYABLE_ERRORS = (aiohttp.ClientOSError, aiohttp.ServerDisconnectedError, aiohttp.ConnectionTimeoutError)
+
+class BackendBusy(Exception):
+    """The backend is shedding load (429) for `endpoint`; try again after `retry_after` seconds."""
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"The {endpoint} backend is busy, retry in {retry_after:.0f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+def retry_after_seconds(headers) -> float:
+    try:
+        return max(0.0, float(headers.get("Retry-After", 1)))
+    except ValueError:
+        return 1.0  # HTTP-date form, which the backend does not send
 
 class ModalClient:
+    # Process-wide transport, opened by the Chainlit app at startup (or lazily on first call)
+    _session: Optional[aiohttp.ClientSession] = None
+    _limits: Dict[str, asyncio.Semaphore] = {}
+    # TTS memoization: (normalized text, voice, format) -> audio, plus calls currently in flight
+    _tts_cache: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+    _tts_cache_bytes = 0
+    _tts_inflight: Dict[Tuple[str, str, str], "asyncio.Task"] = {}
+    # endpoint -> monotonic time before which the backend asked not to be called (Retry-After)
+    _busy_until: Dict[str, float] = {}
+
+    @classmethod
+    async def open(cls):
+        if cls._session is not None and not cls._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            ssl=False,
+            limit=HTTP_POOL_SIZE,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300
+        )
+        cls._session = aiohttp.ClientSession(connector=connector)
+        cls._limits = {name: asyncio.Semaphore(n) for name, n in ENDPOINT_CONCURRENCY.items()}
+
+    @classmethod
+    async def close(cls):
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
+
+    @classmethod
+    async def _wait_if_busy(cls, endpoint: str):
+        """Honors the endpoint's last Retry-After: waits out a short one, raises BackendBusy for a long one."""
+        remaining = cls._busy_until.get(endpoint, 0) - time.monotonic()
+        if remaining <= 0: return
+        if remaining > HTTP_MAX_RETRY_AFTER: raise BackendBusy(endpoint, remaining)
+        # Jittered so the callers that were turned away do not all return at once
+        await asyncio.sleep(remaining + random.uniform(0, HTTP_RETRY_BACKOFF))
+
+    @classmethod
+    def _note_busy(cls, endpoint: str, response: aiohttp.ClientResponse, attempt: int,
+                   metric: Optional[str] = None) -> Optional[BackendBusy]:
+        """Records a 429's Retry-After; returns the BackendBusy to raise if it should not be retried."""
+        busy = BackendBusy(endpoint, retry_after_seconds(response.headers))
+        cls._busy_until[endpoint] = max(cls._busy_until.get(endpoint, 0), time.monotonic() + busy.retry_after)
+        if attempt == HTTP_MAX_RETRIES or busy.retry_after > HTTP_MAX_RETRY_AFTER:
+            metrics.FAILURES.labels(metric or endpoint, "http_429").inc()
+            return busy
+        metrics.RETRIES.labels(metric or endpoint, "http_429").inc()
+        return None
+
+    @classmethod
+    async def _post(cls, endpoint: str, url: str, request_bytes: Optional[int] = None, **kwargs) -> Tuple[int, bytes]:
+        """
+        POSTs over the shared pool, capped per endpoint. Retries 5xx and
+        connection resets up to HTTP_MAX_RETRIES times with jittered backoff, and
+        429s after their Retry-After; raises BackendBusy when that is too long or
+        the retries run out. `data` may be a zero-arg callable so each attempt gets a fresh form body.
+        Attempts, retries, failures and body sizes go to metrics; `request_bytes`
+        gives the size of a `data` body (JSON bodies are measured here).
+        """
+        await cls.open()
+        timeout = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT[endpoint])
+        make_data = kwargs.pop("data", None)
+        if request_bytes is None and "json" in kwargs:
+            request_bytes = len(json.dumps(kwargs["json"]).encode())
+        metrics.REQUEST_BYTES.labels(endpoint).observe(request_bytes or 0)
+
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            await cls._wait_if_busy(endpoint)
+            if callable(make_data): kwargs["data"] = make_data()
+            elif make_data is not None: kwargs["data"] = make_data
+            start = time.perf_counter()
+            try:
+                async with cls._limits[endpoint]:
+                    async with cls._session.post(url, timeout=timeout, **kwargs) as response:
+                        body = await response.read()
+                        metrics.REQUEST_SECONDS.labels(endpoint, str(response.status)).observe(time.perf_counter() - start)
+                        if response.status == 429:
+                            busy = cls._note_busy(endpoint, response, attempt)
+                            if busy: raise busy
+                            continue  # the next attempt waits out Retry-After
+                        if response.status < 500 or attempt == HTTP_MAX_RETRIES:
+                            metrics.RESPONSE_BYTES.labels(endpoint).observe(len(body))
+                            if response.status >= 400: metrics.FAILURES.labels(endpoint, f"http_{response.status}").inc()
+                            return response.status, body
+                        metrics.RETRIES.labels(endpoint, f"http_{response.status}").inc()
+            except RETRYABLE_ERRORS as e:
+                metrics.REQUEST_SECONDS.labels(endpoint, metrics.failure_reason(e)).observe(time.perf_counter() - start)
+                if attempt == HTTP_MAX_RETRIES:
+                    metrics.FAILURES.labels(endpoint, metrics.failure_reason(e)).inc()
+                    raise
+                metrics.RETRIES.labels(endpoint, metrics.failure_reason(e)).inc()
+            # Full jitter: sleep somewhere in [0, backoff * 2^attempt]
+            await asyncio.sleep(random.uniform(0, HTTP_RETRY_BACKOFF * (2 ** attempt)))
+
     @staticmethod
-    async def stt(audio_path: str) -> str:
-        try:
+    @metrics.timed("stt")
+    async def stt(audio: Union[str, bytes], content_type: str = "audio/wav") -> str:
+        # A path is streamed into the request body (reopened per attempt); bytes are sent as-is
+        handles = []
+
+        def form():
             data = aiohttp.FormData()
-            data.add_field('file', open(audio_path, 'rb'), filename='input.wav', content_type='audio/wav')
-            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
-                async with session.post(STT_URL, data=data) as response:
-                    if response.status == 200:
-                        res_json = await response.json()
-                        return res_json.get("text", "")
-                    return ""
+            if isinstance(audio, bytes):
+                data.add_field('file', audio, filename='input.wav', content_type=content_type)
+            else:
+                f = open(audio, 'rb')
+                handles.append(f)
+                data.add_field('file', f, filename=os.path.basename(audio), content_type=content_type)
+            return data
+
+        try:
+            size = len(audio) if isinstance(audio, bytes) else os.path.getsize(audio)
+            status, body = await ModalClient._post("stt", STT_URL, request_bytes=size, data=form)
+            if status == 200:
+                return json.loads(body).get("text", "")
+            return ""
+        except BackendBusy:
+            raise
         except Exception as e:
             print(f"STT Exception: {e}")
             return ""
+        finally:
+            for f in handles: f.close()
 
     @staticmethod
-    async def tts(text: str) -> bytes:
+    async def _synthesize(text: str, voice: str, fmt: str) -> bytes:
         try:
-            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
-                async with session.post(TTS_URL, json={"text": text}) as response:
-                    if response.status == 200:
-                        return await response.read()
-                    return None
+            payload = {"text": text, "voice": voice, "format": fmt, "bitrate": TTS_BITRATE_KBPS}
+            status, body = await ModalClient._post("tts", TTS_URL, json=payload)
+            if status == 200:
+                return body
+            return None
         except Exception as e:
             print(f"TTS Exception: {e}")
             return None
 
     @staticmethod
-    async def llm(messages: List[Dict], max_tokens: int = 150, temperature: float = 0.7) -> str:
+    def _tts_done(key: Tuple[str, str, str], task: "asyncio.Task"):
+        ModalClient._tts_inflight.pop(key, None)
+        if task.cancelled() or not task.result(): return
+        audio = task.result()
+        cache = ModalClient._tts_cache
+        if key not in cache:
+            cache[key] = audio
+            ModalClient._tts_cache_bytes += len(audio)
+        while ModalClient._tts_cache_bytes > TTS_CACHE_MAX_BYTES and cache:
+            _, evicted = cache.popitem(last=False)
+            ModalClient._tts_cache_bytes -= len(evicted)
+
+    @staticmethod
+    async def tts(text: str, voice: str = TTS_VOICE, fmt: str = TTS_FORMAT) -> bytes:
+        """
+        Synthesizes through an LRU cache keyed by normalized text, voice and format
+        (wav, opus or mp3 at TTS_BITRATE_KBPS). Identical
+        concurrent requests share one backend call (single-flight); the shared call is
+        shielded so one caller being cancelled does not cancel it for the others.
+        """
+        start = time.perf_counter()
+        key = (re.sub(r"\s+", " ", text or "").strip().lower(), voice, fmt)
+        cached = ModalClient._tts_cache.get(key)
+        if cached is not None:
+            ModalClient._tts_cache.move_to_end(key)
+            metrics.timed_call("tts", time.perf_counter() - start, "cache_hit")
+            return cached
+
+        task = ModalClient._tts_inflight.get(key)
+        outcome = "shared" if task is not None else "ok"
+        if task is None:
+            task = asyncio.create_task(ModalClient._synthesize(text, voice, fmt))
+            ModalClient._tts_inflight[key] = task
+            task.add_done_callback(lambda t: ModalClient._tts_done(key, t))
+        audio = None
+        try:
+            audio = await asyncio.shield(task)
+            return audio
+        finally:
+            metrics.timed_call("tts", time.perf_counter() - start, outcome if audio else "failed")
+
+    @staticmethod
+    def _llm_payload(messages: List[Dict], max_tokens: int, temperature: float, stop: Optional[List[str]],
+                     json_schema: Optional[Dict] = None) -> Dict:
+        from context import fit_messages
+        limited_messages = fit_messages(messages, LLM_CONTEXT_TOKENS)
+        payload = {
+            "messages": limited_messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stop": DIALOGUE_STOP if stop is None else stop
+        }
+        if json_schema:
+            payload["response_format"] = {"type": "json_schema", "schema": json_schema}
+        return payload
+
+    @staticmethod
+    @metrics.timed("llm")
+    async def llm(messages: List[Dict], max_tokens: int = 150, temperature: float = 0.7,
+                  stop: Optional[List[str]] = None, json_schema: Optional[Dict] = None) -> str:
+        """
+        `json_schema` makes the server constrain decoding to a JSON object matching it.
+        Failures return ""; BackendBusy is raised so callers can tell load shedding apart.
+        """
         try:
-            limited_messages = messages[:1] + messages[-6:] if len(messages) > 7 else messages
-            payload = {
-                "messages": limited_messages,
-                "max_tokens": max_tokens,
-                "temperature": temperature,
-                "stop": ["\n\n", "User:", "Candidate:", "Assistant:"]
-            }
-            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
-                async with session.post(LLM_URL, json=payload) as response:
-                    if response.status == 200:
-                        res_json = await response.json()
-                        return res_json.get("response", "")
-                    return ""
+            payload = ModalClient._llm_payload(messages, max_tokens, temperature, stop, json_schema)
+            status, body = await ModalClient._post("llm", LLM_URL, json=payload)
+            if status == 200:
+                data = json.loads(body)
+                metrics.TOKENS.labels("llm", data.get("finish_reason", "unknown")).inc(data.get("tokens", 0))
+                return data.get("response", "")
+            return ""
+        except BackendBusy:
+            raise
         except Exception as e:
             print(f"LLM Exception: {e}")
             return ""
 
     @staticmethod
-    async def check_intent(last_input: str) -> str:
-        from prompts import INTENT_CHECK_PROMPT
+    async def llm_stream(messages: List[Dict], max_tokens: int = 150, temperature: float = 0.7,
+                         stop: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """
+        Yields text pieces from /llm/stream as they are generated. Failures are
+        retried like _post (including 429s), but only until the first piece has been yielded.
+        """
+        payload = ModalClient._llm_payload(messages, max_tokens, temperature, stop)
+        timeout = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT["llm"])
+        metrics.REQUEST_BYTES.labels("llm_stream").observe(len(json.dumps(payload).encode()))
+        started = False
+        call_start, received = time.perf_counter(), 0
         try:
-            prompt = INTENT_CHECK_PROMPT.format(last_user_input=last_input)
-            messages = [{"role": "user", "content": prompt}]
-            resp = await ModalClient.llm(messages, max_tokens=10, temperature=0.1)
-            return resp.strip().upper()
-        except Exception:
-            return "VALID" 
+            await ModalClient.open()
+            for attempt in range(HTTP_MAX_RETRIES + 1):
+                # Shares /llm's admission gate on the backend, so it shares its Retry-After too
+                await ModalClient._wait_if_busy("llm")
+                start = time.perf_counter()
+                try:
+                    async with ModalClient._limits["llm"]:
+                        async with ModalClient._session.post(LLM_STREAM_URL, json=payload, timeout=timeout) as response:
+                            if response.status == 429:
+                                metrics.REQUEST_SECONDS.labels("llm_stream", "429").observe(time.perf_counter() - start)
+                                busy = ModalClient._note_busy("llm", response, attempt, metric="llm_stream")
+                                if busy: raise busy
+                                continue
+                            if response.status != 200:
+                                metrics.REQUEST_SECONDS.labels("llm_stream", str(response.status)).observe(time.perf_counter() - start)
+                                if response.status < 500 or attempt == HTTP_MAX_RETRIES:
+                                    metrics.FAILURES.labels("llm_stream", f"http_{response.status}").inc()
+                                    return
+                                metrics.RETRIES.labels("llm_stream", f"http_{response.status}").inc()
+                            else:
+                                async for line in response.content:
+                                    received += len(line)
+                                    if not line.strip(): continue
+                                    event = json.loads(line)
+                                    if event.get("done"):
+                                        metrics.TOKENS.labels("llm_stream", event.get("finish_reason", "unknown")).inc(event.get("tokens", 0))
+                                        break
+                                    started = True
+                                    yield event.get("token", "")
+                                metrics.REQUEST_SECONDS.labels("llm_stream", "200").observe(time.perf_counter() - start)
+                                return
+                except RETRYABLE_ERRORS as e:
+                    metrics.REQUEST_SECONDS.labels("llm_stream", metrics.failure_reason(e)).observe(time.perf_counter() - start)
+                    if started or attempt == HTTP_MAX_RETRIES:
+                        metrics.FAILURES.labels("llm_stream", metrics.failure_reason(e)).inc()
+                        raise
+                    metrics.RETRIES.labels("llm_stream", metrics.failure_reason(e)).inc()
+                await asyncio.sleep(random.uniform(0, HTTP_RETRY_BACKOFF * (2 ** attempt)))
+        except BackendBusy:
+            raise
+        except Exception as e:
+            print(f"LLM Stream Exception: {e}")
+        finally:
+            metrics.RESPONSE_BYTES.labels("llm_stream").observe(received)
+            metrics.timed_call("llm_stream", time.perf_counter() - call_start, "ok" if started else "failed")
 
     @staticmethod
-    async def analyze(question: str, answer: str, difficulty: str = "medium") -> str:
-        from prompts import SYSTEM_PROMPT_ANALYZER
+    async def readiness() -> Dict:
+        """
+        The backend's /ready report: {"ready": bool, "models": {pool: "ready" | "loading" | "error"}}.
+        Not retried; an unreachable backend is reported as not ready.
+        """
         try:
-            prompt = SYSTEM_PROMPT_ANALYZER.format(
-                question=question, 
-                answer=answer, 
-                difficulty=difficulty
-            )
-            messages = [{"role": "user", "content": prompt}]
-            resp = await ModalClient.llm(messages, max_tokens=150, temperature=0.3)
-            return resp
+            await ModalClient.open()
+            timeout = aiohttp.ClientTimeout(total=READY_REQUEST_TIMEOUT)
+            async with ModalClient._session.get(READY_URL, timeout=timeout) as response:
+                return await response.json()
+        except Exception as e:
+            return {"ready": False, "models": {}, "error": str(e) or type(e).__name__}
+
+    @staticmethod
+    async def set_warm_containers(counts: Dict[str, int]) -> bool:
+        """
+        Asks the backend to keep at least counts[pool] containers of each model pool running.
+        Authenticated with the WARM_TOKEN environment variable (see config.WARM_TOKEN_HEADER).
+        """
+        try:
+            await ModalClient.open()
+            timeout = aiohttp.ClientTimeout(total=READY_REQUEST_TIMEOUT)
+            headers = {WARM_TOKEN_HEADER: os.environ.get("WARM_TOKEN", "")}
+            async with ModalClient._session.post(WARM_URL, json=counts, headers=headers, timeout=timeout) as response:
+                if response.status == 403: print("Keep-warm refused: WARM_TOKEN is missing or does not match the backend's")
+                return response.status == 200
+        except Exception as e:
+            print(f"Keep-warm request failed: {e}")
+            return False
+
+    @staticmethod
+    @metrics.timed("check_intent")
+    async def check_intent(last_input: str) -> str:
+        from intent import get_classifier
+        try:
+            # Local classifier first; only low-confidence inputs cost an LLM round trip
+            label, _ = await get_classifier().classify(last_input)
+            return label
+        except BackendBusy:
+            raise
         except Exception:
-            return "{}"
\ No newline at end of file
+            return "VALID"
+
+    @staticmethod
+    @metrics.timed("analyze")
+    async def analyze(question: str, answer: str, difficulty: str = "medium") -> Optional[Analysis]:
+        """Returns the parsed analysis, or None if the call or the JSON failed."""
+        from prompts import SYSTEM_PROMPT_ANALYZER, ANALYZER_SCHEMA
+        prompt = SYSTEM_PROMPT_ANALYZER.format(
+            question=question,
+            answer=answer,
+            difficulty=difficulty
+        )
+        messages = [{"role": "user", "content": prompt}]
+        # The schema closes the object, so no stop strings are needed
+        resp = await ModalClient.llm(messages, max_tokens=150, temperature=0.3, stop=[], json_schema=ANALYZER_SCHEMA)
+        analysis = parse_analysis(resp)
+        if analysis is None:
+            print(f"Analysis parse failed: {resp[:200]!r}")
+        return analysis
@@ -1,14 +1,152 @@
+import asyncio
 import chainlit as cl
-import os
+import io
+import time
 import uuid
-from graph import app_graph
-from api_client import ModalClient
-from config import MAX_QUESTIONS
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from chainlit.server import app as chainlit_server
+from fastapi import Response
+from graph import remember
+from utils import render_pdf_report, shutdown_render_pool
+from api_client import BackendBusy, ModalClient
+from config import (
+    MAX_QUESTIONS, TTS_FORMAT, TTS_MIME_TYPES, TTS_EXTENSIONS, SESSION_GC_INTERVAL, METRICS_PATH, METRICS_TURN_BREAKDOWN,
+    BUSY_MAX_WAIT_SECONDS, READY_NOTICE_DELAY
+)
 from pypdf import PdfReader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from summarizer import summarize_resume
+from audio_preprocess import preprocess
+from speech import synthesize_sentences, prewarm
+from prompts import CANONICAL_TTS_PHRASES, REPORT_READY_MESSAGE
+import metrics
+import resume_cache
+import sessions
+import warmup
+
+# Open the shared backend connection pool and the session store with the Chainlit server, close them on shutdown
+_chainlit_lifespan = chainlit_server.router.lifespan_context
+
+async def compact_sessions():
+    while True:
+        try:
+            threads, checkpoints = await sessions.compact()
+            print(f"Sessions compacted: {threads} idle threads, {checkpoints} old checkpoints removed")
+        except Exception as e:
+            print(f"Session compaction failed: {e}")
+        await asyncio.sleep(SESSION_GC_INTERVAL)
+
+async def prewarm_phrases():
+    if await warmup.warm():
+        await prewarm(CANONICAL_TTS_PHRASES)
+
+@asynccontextmanager
+async def lifespan(server):
+    await ModalClient.open()
+    await sessions.open()
+    # Start every model pool now, then keep them warm while candidates are around
+    backend_warmup = asyncio.create_task(warmup.run())
+    # Fixed phrases are synthesized in the background once TTS is up, then served from the TTS cache
+    tts_prewarm = asyncio.create_task(prewarm_phrases())
+    session_gc = asyncio.create_task(compact_sessions())
+    try:
+        async with _chainlit_lifespan(server) as state:
+            yield state
+    finally:
+        tts_prewarm.cancel()
+        session_gc.cancel()
+        backend_warmup.cancel()
+        await ModalClient.close()
+        await sessions.close()
+        shutdown_render_pool()
+
+chainlit_server.router.lifespan_context = lifespan
+
+@chainlit_server.get(METRICS_PATH, include_in_schema=False)
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+# Routes match in order, so put the scrape endpoint ahead of Chainlit's catch-all frontend route
+chainlit_server.router.routes.insert(0, chainlit_server.router.routes.pop())
+
+async def speak(text: str, name: str):
+    """
+    Sends audio one sentence at a time, so playback starts before the whole reply is synthesized.
+    Only the first clip auto-plays; public/audio_queue.js plays each next one when the previous ends.
+    """
+    reply, part = uuid.uuid4().hex[:8], 0
+    async for audio in synthesize_sentences(text):
+        await cl.Message(content="", elements=[cl.Audio(
+            name=f"{name}_{reply}_{part}.{TTS_EXTENSIONS[TTS_FORMAT]}", content=audio, mime=TTS_MIME_TYPES[TTS_FORMAT],
+            display="inline", auto_play=part == 0
+        )]).send()
+        part += 1
+
+async def wait_for_backend() -> bool:
+    """Readiness gate: on a cold start the candidate is told to wait instead of hitting a timeout."""
+    if warmup.is_ready():
+        return True
+    # After a quiet period every candidate waits on the one shared warm-up task, whose /ready
+    # also starts the pools that scaled to zero; the notice only shows if that takes a while
+    task, started = warmup.warm(), time.monotonic()
+    await asyncio.wait({task}, timeout=READY_NOTICE_DELAY)
+    if task.done() and task.result():
+        return True
+    notice = cl.Message(content="The interviewer is warming up. This can take a few minutes after a quiet period...", author="System")
+    await notice.send()
+    while not task.done():
+        await asyncio.wait({task}, timeout=15)
+        notice.content = f"The interviewer is warming up... ({time.monotonic() - started:.0f}s)"
+        await notice.update()
+    if not task.result():
+        notice.content = "The interview service is not available right now. Please try again in a few minutes."
+        await notice.update()
+        return False
+    notice.content = "The interviewer is ready."
+    await notice.update()
+    return True
+
+async def while_busy(make_call):
+    """
+    Awaits make_call(attempt). While the backend sheds load (BackendBusy), shows a busy
+    notice and tries again after its Retry-After, for up to BUSY_MAX_WAIT_SECONDS in all;
+    then the BackendBusy is raised.
+    """
+    notice, waited, attempt = None, 0.0, 0
+    try:
+        while True:
+            try:
+                return await make_call(attempt)
+            except BackendBusy as e:
+                if waited + e.retry_after > BUSY_MAX_WAIT_SECONDS:
+                    raise
+                text = f"⏳ The interviewer is busy with other candidates. Continuing in about {e.retry_after:.0f}s..."
+                if notice is None:
+                    notice = cl.Message(content=text, author="System")
+                    await notice.send()
+                else:
+                    notice.content = text
+                    await notice.update()
+                await asyncio.sleep(e.retry_after)
+                waited += e.retry_after
+                attempt += 1
+    finally:
+        if notice: await notice.remove()
 
 @cl.on_chat_start
 async def start():
+    if not await wait_for_backend():
+        return
+    # An interview already checkpointed for this thread (e.g. before a worker restart) carries on
+    thread_id = cl.context.session.thread_id
+    existing = await sessions.load(thread_id)
+    if existing and not existing.get("report_text"):
+        await cl.Message(content="Welcome back! Let's continue where we left off.", author="System").send()
+        await speak(existing["messages"][-1], "resume")
+        return
+    if existing: await sessions.forget(thread_id)
+
     # Ask for resume
     files = None
     while files is None:
@@ -27,26 +165,35 @@ async def start():
     await msg.send()
 
     try:
-        reader = PdfReader(resume_file.path)
-        resume_text = ""
-        for page in reader.pages:
-            resume_text += page.extract_text()
-
-        # Chunk the text
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        chunks = text_splitter.split_text(resume_text)
-
-        # Summarize the chunks
-        summaries = []
-        for chunk in chunks:
-            summary = await ModalClient.llm([{"role": "user", "content": f"Summarize the key skills and experiences in this section of a resume:\n\n{chunk}"}])
-            summaries.append(summary)
-        
-        final_summary = "\n".join(summaries)
-        
-        # Final combined summary
-        resume_summary = await ModalClient.llm([{"role": "user", "content": f"Combine these summaries into a single, coherent overview of the candidate's skills and project history:\n\n{final_summary}"}])
-        
+        with open(resume_file.path, "rb") as f:
+            pdf_bytes = f.read()
+
+        # Same PDF uploaded before: reuse its extraction and summaries
+        cache_key = resume_cache.resume_key(pdf_bytes)
+        cached = resume_cache.get(cache_key)
+        if cached:
+            resume_summary = cached["resume_summary"]
+        else:
+            reader = PdfReader(io.BytesIO(pdf_bytes))
+            resume_text = ""
+            for page in reader.pages:
+                resume_text += page.extract_text()
+
+            # Summarize chunks concurrently, then combine (map-reduce)
+            async def on_progress(done, total):
+                msg.content = f"Processing `{resume_file.name}`... {done}/{total} sections reviewed"
+                await msg.update()
+
+            chunk_summaries, resume_summary = await summarize_resume(resume_text, on_progress)
+
+            # Only cache complete results; a failed LLM call returns ""
+            if resume_summary and all(chunk_summaries):
+                resume_cache.put(cache_key, {
+                    "resume_text": resume_text,
+                    "chunk_summaries": chunk_summaries,
+                    "resume_summary": resume_summary
+                })
+
         cl.user_session.set("resume_summary", resume_summary)
         await cl.Message(content=f"Thank you. I've reviewed the resume.").send()
 
@@ -58,12 +205,13 @@ async def start():
     initial_state = {
         "messages": [], 
         "llm_history": [], 
+        "history_summary": "",
         "role": None, 
         "level": None, 
         "resume_summary": cl.user_session.get("resume_summary", ""),
         "question_count": 0, 
         "feedback_notes": [], 
-        "pdf_report": None, 
+        "report_text": None, 
         "message_type": "question",
         "project_questions_asked": 0,
         "technical_questions_asked": 0,
@@ -75,62 +223,99 @@ async def start():
         "current_topic": "technical"
     }
     
-    res = await app_graph.ainvoke(initial_state)
-    cl.user_session.set("state", res)
-    
-    text = res["messages"][0]
-    audio = await ModalClient.tts(text)
+    try:
+        res = await while_busy(lambda attempt: sessions.app_graph.ainvoke(
+            initial_state if attempt == 0 else None, sessions.config(thread_id)
+        ))
+    except BackendBusy:
+        await cl.Message(content="The interviewer is too busy to start right now. Please refresh in a few minutes.").send()
+        return
+    await sessions.touch(thread_id)
     
-    if audio:
-        await cl.Message(content="", elements=[cl.Audio(name="greeting.wav", content=audio, display="inline", auto_play=True)]).send()
+    text = res["messages"][-1]
+    await speak(text, "greeting")
 
-@cl.on_message
-async def main(message: cl.Message):
-    state = cl.user_session.get("state")
+async def answer_update(message: cl.Message, state: Dict) -> Optional[Dict]:
+    """The graph input for the candidate's answer (transcribed if spoken), or None if there is none to send."""
     user_text = ""
     
-    # Audio Input Handling with UNIQUE FILENAMES
+    # Audio Input Handling: mono 16 kHz, silence trimmed, long answers split at pauses
     if message.elements:
         loading = cl.Message(content="Listening...", author="System")
         await loading.send()
         
-        # Use UUID to prevent file collisions between users
-        unique_filename = f"temp_{uuid.uuid4()}.wav"
+        element = message.elements[0]
+        prepared = await asyncio.to_thread(preprocess, element.path)
+        try:
+            if prepared is None:
+                # Unreadable locally: upload straight from Chainlit's stored element, no temp copy
+                user_text = await while_busy(lambda _: ModalClient.stt(element.path, getattr(element, "mime", None) or "audio/wav"))
+            else:
+                print(f"STT preprocessing: removed {prepared.removed_seconds:.1f}s of {prepared.original_seconds:.1f}s")
+                texts = await while_busy(lambda _: asyncio.gather(*(ModalClient.stt(segment) for segment in prepared.segments)))
+                user_text = " ".join(t.strip() for t in texts if t and t.strip())
+        except BackendBusy:
+            await loading.remove()
+            await cl.Message(content="The interviewer is still busy. Please send your answer again in a minute.").send()
+            return None
         
-        with open(unique_filename, "wb") as f:
-            with open(message.elements[0].path, "rb") as aud: f.write(aud.read())
-            
-        user_text = await ModalClient.stt(unique_filename)
-        
-        if os.path.exists(unique_filename): os.remove(unique_filename)
         await loading.remove()
     else:
         user_text = message.content
     
     if not user_text:
         await cl.Message(content="I couldn't hear you.").send()
-        return
+        return None
 
-    # Handle hint request
-    if user_text.lower().strip() == "hint":
-        state["requesting_hint"] = True
-    else:
-        state["requesting_hint"] = False
+    # Handle hint request (only the changes are sent; the checkpointer holds the rest)
+    update = {"requesting_hint": user_text.lower().strip() == "hint"}
+    if not update["requesting_hint"]:
         # State Updates
-        if not state["role"]: state["role"] = user_text
-        elif not state["level"]: state["level"] = "hard" if "hard" in user_text.lower() else ("easy" if "easy" in user_text.lower() else "medium")
-        state["llm_history"].append({"role": "user", "content": user_text})
-    
+        if not state.get("role"): update["role"] = user_text
+        elif not state.get("level"): update["level"] = "hard" if "hard" in user_text.lower() else ("easy" if "easy" in user_text.lower() else "medium")
+        update.update(remember(state, {"role": "user", "content": user_text}))
+    return update
+
+@cl.on_message
+async def main(message: cl.Message):
+    thread_id = cl.context.session.thread_id
+    # Node and ModalClient timings for this message (STT through TTS)
+    turn_timings = metrics.start_turn()
+    state = await sessions.load(thread_id)
+    if state is None:
+        await cl.Message(content="This interview has expired. Please refresh to start a new one.").send()
+        return
+    if await sessions.pending(thread_id):
+        # The last answer is checkpointed but its turn stopped partway (the backend was
+        # busy, possibly on another worker); finish that turn instead of taking a new answer
+        update = None
+    else:
+        update = await answer_update(message, state)
+        if update is None: return
+
     # Agent Logic
+    report_msg = cl.Message(content="")
     async with cl.Step(name="Thinking") as step:
-        res = await app_graph.ainvoke(state)
+        try:
+            # A retry resumes the interrupted node from the checkpoint rather than resending the answer
+            res = await while_busy(lambda attempt: sessions.app_graph.ainvoke(
+                update if attempt == 0 else None, sessions.config(thread_id, on_report_token=report_msg.stream_token)
+            ))
+        except BackendBusy:
+            # The checkpoint keeps the answer and marks the turn pending (see sessions.pending)
+            step.output = "Busy"
+            await cl.Message(content="The interviewer is still busy. Your answer is saved; send any message in a minute to continue.").send()
+            return
         step.output = "Done"
+    await sessions.touch(thread_id)
     
     bot_text = res["messages"][-1]
     state = res
-    cl.user_session.set("state", state)
     
     msg_type = res.get("message_type", "question")
+    # The Markdown report goes out now; the PDF follows once rendered
+    if report_msg.streaming: await report_msg.send()
+    elif msg_type == "report": await cl.Message(content=res["report_text"]).send()
     
     # Display progress
     if state.get("question_count", 0) > 1 and state.get("question_count", 0) <= MAX_QUESTIONS:
@@ -140,14 +325,22 @@ async def main(message: cl.Message):
     # --- DISPLAY LOGIC ---
     if msg_type == "hint":
         await cl.Message(content=f"💡 **HINT:** {bot_text}").send()
+        await speak(bot_text, "hint")
     
-    elif res.get("pdf_report"):
-        audio = await ModalClient.tts("Here is your feedback report.")
-        els = [cl.Pdf(name="report.pdf", content=res["pdf_report"], display="inline")]
-        if audio: els.append(cl.Audio(name="end.wav", content=audio, display="inline", auto_play=True))
-        await cl.Message(content="Interview Complete.", elements=els).send()
+    elif msg_type == "report":
+        pdf, _ = await asyncio.gather(
+            render_pdf_report("Candidate", state.get("role"), res["report_text"]),
+            speak(REPORT_READY_MESSAGE, "end")
+        )
+        if pdf:
+            els = [cl.Pdf(name="report.pdf", content=pdf, display="inline")]
+            await cl.Message(content="Interview Complete.", elements=els).send()
+        else:
+            await cl.Message(content="Interview Complete. The PDF could not be generated; your report is above.").send()
     
     else:
-        audio = await ModalClient.tts(bot_text)
-        if audio:
-            await cl.Message(content="", elements=[cl.Audio(name="reply.wav", content=audio, display="inline", auto_play=True)]).send()
\ No newline at end of file
+        await speak(bot_text, "reply")
+
+    if METRICS_TURN_BREAKDOWN:
+        step.output = metrics.format_turn(turn_timings)
+        await step.update()
\ No newline at end of file
@@ -0,0 +1,100 @@
+import io
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+import soundfile as sf
+from config import (
+    STT_SAMPLE_RATE, STT_VAD_FRAME_MS, STT_VAD_MARGIN_DB, STT_VAD_PEAK_MARGIN_DB, STT_VAD_FLOOR_DB,
+    STT_VAD_PADDING_MS, STT_VAD_MIN_SILENCE_MS, STT_MAX_SEGMENT_SECONDS
+)
+
+class PreparedAudio(NamedTuple):
+    segments: List[bytes]       # 16-bit mono WAV at STT_SAMPLE_RATE, one upload each
+    original_seconds: float
+    removed_seconds: float
+
+def to_mono(audio: np.ndarray) -> np.ndarray:
+    return audio.mean(axis=1) if audio.ndim == 2 else audio
+
+def resample(audio: np.ndarray, rate: int, target: int = STT_SAMPLE_RATE) -> np.ndarray:
+    """Windowed-sinc low-pass (when downsampling) followed by linear interpolation."""
+    if rate == target or len(audio) == 0:
+        return audio.astype(np.float32)
+    if rate > target:
+        cutoff = 0.5 * target / rate
+        n = np.arange(-32, 33)
+        taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(len(n))
+        audio = np.convolve(audio, taps / taps.sum(), mode="same")
+    positions = np.arange(int(len(audio) * target / rate)) * (rate / target)
+    return np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+def voiced_regions(audio: np.ndarray, rate: int = STT_SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """
+    Energy VAD: frames louder than the noise floor (10th percentile) by STT_VAD_MARGIN_DB,
+    and above STT_VAD_FLOOR_DB, are speech. The margin is capped at STT_VAD_PEAK_MARGIN_DB
+    below the loud frames (90th percentile), so a clip with no pauses (whose 10th percentile
+    is speech too) is kept. Regions are padded, and pauses shorter than
+    STT_VAD_MIN_SILENCE_MS are kept so words are not clipped. Returns sample ranges.
+    """
+    frame = int(rate * STT_VAD_FRAME_MS / 1000)
+    count = len(audio) // frame
+    if count == 0:
+        return []
+    frames = audio[:count * frame].reshape(count, frame)
+    db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    noise, loud = np.percentile(db, [10, 90])
+    threshold = max(min(noise + STT_VAD_MARGIN_DB, loud - STT_VAD_PEAK_MARGIN_DB), STT_VAD_FLOOR_DB)
+
+    pad = int(rate * STT_VAD_PADDING_MS / 1000)
+    min_gap = int(rate * STT_VAD_MIN_SILENCE_MS / 1000)
+    regions = []
+    for i in np.flatnonzero(db > threshold):
+        start, end = max(0, i * frame - pad), min(len(audio), (i + 1) * frame + pad)
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+        else:
+            regions.append((start, end))
+    return regions
+
+def split_at_pauses(regions: List[Tuple[int, int]], rate: int = STT_SAMPLE_RATE) -> List[List[Tuple[int, int]]]:
+    """Packs consecutive regions into segments of at most STT_MAX_SEGMENT_SECONDS, cutting only at pauses."""
+    limit = int(rate * STT_MAX_SEGMENT_SECONDS)
+    segments, current, length = [], [], 0
+    for start, end in regions:
+        # A single region longer than the limit is cut hard
+        while end - start > limit:
+            if current: segments.append(current)
+            segments.append([(start, start + limit)])
+            current, length, start = [], 0, start + limit
+        if current and length + (end - start) > limit:
+            segments.append(current)
+            current, length = [], 0
+        current.append((start, end))
+        length += end - start
+    if current: segments.append(current)
+    return segments
+
+def to_wav(audio: np.ndarray, rate: int = STT_SAMPLE_RATE) -> bytes:
+    buf = io.BytesIO()
+    sf.write(buf, audio, rate, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+def preprocess(path: str) -> Optional[PreparedAudio]:
+    """
+    Downmixes, resamples to STT_SAMPLE_RATE and trims silence. Returns None for
+    formats soundfile cannot read (the caller uploads those untouched).
+    """
+    try:
+        audio, rate = sf.read(path, dtype="float32", always_2d=True)
+    except Exception:
+        return None
+    original_seconds = len(audio) / rate
+    audio = resample(to_mono(audio), rate)
+
+    # Nothing above the threshold: send the whole clip and let STT decide rather than drop the answer
+    segments = split_at_pauses(voiced_regions(audio) or [(0, len(audio))])
+    kept = sum(end - start for segment in segments for start, end in segment)
+    return PreparedAudio(
+        [to_wav(np.concatenate([audio[start:end] for start, end in segment])) for segment in segments],
+        original_seconds,
+        max(0.0, original_seconds - kept / STT_SAMPLE_RATE)
+    )
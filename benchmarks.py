@@ -0,0 +1,730 @@
+# benchmarks.py
+# Local benchmarks for the interview pipeline. Each subcommand is self-contained
+# and runs without the Modal deployment:
+#
+#   python benchmarks.py batching   # micro-batched vs one-at-a-time generation on a tiny CPU model
+#   python benchmarks.py intent     # local intent classifier latency/accuracy (--llm: agreement with the LLM)
+#   python benchmarks.py audio-path # a recorded answer through preprocess() and ModalClient.stt against mock_backend.py
+#   python benchmarks.py state      # per-turn AgentState size and allocations, bounded vs unbounded channels
+#   python benchmarks.py resume     # kill a worker mid-interview and resume the session in a new process
+#   python benchmarks.py report     # event-loop stalls seen by other sessions while a PDF report renders
+#   python benchmarks.py feedback   # time-to-report after the last answer vs MAX_QUESTIONS, full notes vs folded sections
+#   python benchmarks.py json       # analyzer parse failures and wasted tokens, free-form vs schema-constrained, tiny CPU model
+#   python benchmarks.py load       # N concurrent candidates through app_graph and ModalClient against mock_backend.py
+import argparse
+import asyncio
+import importlib
+import os
+import pickle
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+# Minimal template for tiny test models that ship without one
+SIMPLE_CHAT_TEMPLATE = (
+    "{% for m in messages %}{{ m['role'] }}: {{ m['content'] }}\n{% endfor %}"
+    "{% if add_generation_prompt %}assistant:{% endif %}"
+)
+
+def load_tiny_model(name: str):
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+    torch.manual_seed(0)
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    if tokenizer.chat_template is None:
+        tokenizer.chat_template = SIMPLE_CHAT_TEMPLATE
+    if tokenizer.pad_token_id is None:
+        tokenizer.pad_token_id = tokenizer.eos_token_id
+    model = AutoModelForCausalLM.from_pretrained(name).eval()
+    return model, tokenizer
+
+def bench_batching(args):
+    from concurrent.futures import ThreadPoolExecutor
+    from llm_engine import MicroBatcher, encode_chat, generate_batch
+
+    model, tokenizer = load_tiny_model(args.model)
+    # Greedy decoding so batched and sequential outputs must match exactly
+    requests = [{
+        "prompt": encode_chat(tokenizer, [{"role": "user", "content": f"Candidate {i} says: I built a cache for service {i}."}]),
+        "max_tokens": 8 + (i % 4) * 8,
+        "temperature": 0.0
+    } for i in range(args.requests)]
+
+    start = time.perf_counter()
+    sequential = [generate_batch(model, tokenizer, [r])[0] for r in requests]
+    sequential_time = time.perf_counter() - start
+
+    batcher = MicroBatcher(lambda reqs: generate_batch(model, tokenizer, reqs), args.batch_size, args.wait_ms)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(len(requests)) as pool:
+        batched = list(pool.map(batcher.submit, requests))
+    batched_time = time.perf_counter() - start
+
+    mismatches = [i for i, (a, b) in enumerate(zip(sequential, batched)) if a != b]
+    print(f"requests={len(requests)} batch_size={args.batch_size} wait_ms={args.wait_ms}")
+    print(f"sequential: {sequential_time:.2f}s ({len(requests) / sequential_time:.1f} req/s)")
+    print(f"batched:    {batched_time:.2f}s ({len(requests) / batched_time:.1f} req/s)")
+    print(f"speedup:    {sequential_time / batched_time:.2f}x")
+    print(f"per-request mismatches: {len(mismatches)} {mismatches if mismatches else ''}")
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def bench_intent(args):
+    from intent import LocalIntentClassifier, LLMIntentClassifier, load_examples
+    from config import INTENT_CONFIDENCE_THRESHOLD, INTENT_CONFIRM_OFF_TOPIC
+
+    start = time.perf_counter()
+    local = LocalIntentClassifier()
+    print(f"trained in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    examples = load_examples("eval")
+    latencies, predictions = [], []
+    for e in examples:
+        start = time.perf_counter()
+        predictions.append(local.predict(e["text"]))
+        latencies.append((time.perf_counter() - start) * 1e6)
+
+    correct = sum(label == e["label"] for (label, _), e in zip(predictions, examples))
+    # Hybrid mode: what reaches the LLM, and valid answers the local model alone would reject
+    to_llm = [conf < INTENT_CONFIDENCE_THRESHOLD or (INTENT_CONFIRM_OFF_TOPIC and label == "OFF_TOPIC")
+              for label, conf in predictions]
+    rejected = sum(not llm and label == "OFF_TOPIC" and e["label"] == "VALID"
+                   for llm, (label, _), e in zip(to_llm, predictions, examples))
+    print(f"local: n={len(examples)} accuracy={correct / len(examples):.1%} "
+          f"p50={percentile(latencies, 50):.1f}us p99={percentile(latencies, 99):.1f}us")
+    print(f"hybrid: would call LLM={sum(to_llm)} valid answers rejected without LLM={rejected}")
+
+    if args.llm:
+        async def run_llm():
+            from api_client import ModalClient
+            llm = LLMIntentClassifier()
+            results = []
+            for e in examples:
+                start = time.perf_counter()
+                label, _ = await llm.classify(e["text"])
+                results.append((label, (time.perf_counter() - start) * 1000))
+            await ModalClient.close()
+            return results
+
+        llm_results = asyncio.run(run_llm())
+        llm_ms = [ms for _, ms in llm_results]
+        agree = sum(label == l for (label, _), (l, _) in zip(predictions, llm_results))
+        llm_correct = sum(l == e["label"] for (l, _), e in zip(llm_results, examples))
+        print(f"llm:   accuracy={llm_correct / len(examples):.1%} p50={percentile(llm_ms, 50):.0f}ms p99={percentile(llm_ms, 99):.0f}ms")
+        print(f"agreement local vs llm: {agree / len(examples):.1%}")
+
+def start_mock(port: int, *flags: str) -> subprocess.Popen:
+    """Starts mock_backend.py on `port` and waits until it answers."""
+    from urllib.request import urlopen
+    server = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_backend.py"), "--port", str(port), *flags
+    ])
+    for _ in range(100):
+        try:
+            urlopen(f"http://127.0.0.1:{port}/health", timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("mock_backend.py did not start")
+
+def write_answer(path: str, seconds: float, rate: int, channels: int):
+    """A speech-like recording: 1.5 s voiced bursts (harmonics of 140 Hz at a syllable rate) between 1 s pauses, over faint noise."""
+    import numpy as np
+    import soundfile as sf
+    t = np.arange(int(seconds * rate)) / rate
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6)) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t))
+    audio = 0.2 * voice * ((t % 2.5) < 1.5) + 0.001 * np.random.default_rng(0).standard_normal(len(t))
+    sf.write(path, np.repeat(audio[:, None], channels, axis=1), rate, subtype="PCM_16")
+
+def bench_audio_path(args):
+    """
+    Times a recorded answer through app.main's real path against mock_backend.py, which
+    decodes each upload with stt_engine.decode_audio as the /stt route does: preprocess()
+    on the stored element, then one ModalClient.stt upload per segment. The untrimmed
+    upload (app.main's fallback for files soundfile cannot read) is timed too when
+    ffmpeg is installed, since the backend needs it for anything but 16 kHz.
+    """
+    import json
+    import shutil
+    import tracemalloc
+    from urllib.request import urlopen
+
+    path = os.path.join(tempfile.mkdtemp(), "answer.wav")
+    write_answer(path, args.seconds, args.rate, args.channels)
+    size = os.path.getsize(path)
+    url = f"http://127.0.0.1:{args.port}"
+    server = start_mock(args.port, "--latency-scale", "0", "--error-rate", "0")
+    # Read when api_client is first imported below
+    os.environ["MODAL_BASE_URL"] = url
+    from api_client import ModalClient
+    from audio_preprocess import preprocess
+
+    def decode_ms() -> float:
+        with urlopen(f"{url}/stats") as response:
+            return json.load(response).get("stt.decode_us", 0) / 1000
+
+    async def preprocessed():
+        prepared = await asyncio.to_thread(preprocess, path)
+        texts = await asyncio.gather(*(ModalClient.stt(segment) for segment in prepared.segments))
+        return sum(map(len, prepared.segments)), texts
+
+    async def direct():
+        return size, [await ModalClient.stt(path)]
+
+    async def measure(run):
+        times, decodes = [], []
+        for _ in range(args.repeats):
+            before = decode_ms()
+            start = time.perf_counter()
+            uploaded, texts = await run()
+            times.append((time.perf_counter() - start) * 1000)
+            decodes.append(decode_ms() - before)
+            if not all(texts): raise RuntimeError("STT returned an empty transcript")
+        # Peak client-side allocations, on a separate run since tracing slows everything down
+        tracemalloc.start()
+        await run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return times, decodes, uploaded, peak
+
+    async def run_all():
+        paths = [("preprocessed", preprocessed)]
+        if args.rate == 16000 or shutil.which("ffmpeg"): paths.append(("direct", direct))
+        try:
+            return [(name, await measure(run)) for name, run in paths]
+        finally:
+            await ModalClient.close()
+
+    try:
+        results = asyncio.run(run_all())
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"recording: {args.seconds:.0f}s at {args.rate} Hz x{args.channels}, {size:,d} bytes")
+    print(f"{'path':13s} {'p50 ms':>8s} {'p95 ms':>8s} {'decode ms':>10s} {'uploaded':>12s} {'client peak':>12s}")
+    for name, (times, decodes, uploaded, peak) in results:
+        print(f"{name:13s} {percentile(times, 50):8.1f} {percentile(times, 95):8.1f} {percentile(decodes, 50):10.1f} "
+              f"{uploaded:12,d} {peak / 1024 ** 2:9.1f} MiB")
+    if len(results) == 1:
+        print("direct        skipped: the backend needs ffmpeg to decode anything but 16 kHz")
+
+def run_turns(graph, turns: int):
+    """
+    Drives the interview graph like app.py does (remember() updates against a checkpointer);
+    returns (state bytes, peak allocation, list lengths) per turn.
+    """
+    import tracemalloc
+    from langgraph.checkpoint.memory import MemorySaver
+    app_graph = graph.workflow.compile(checkpointer=MemorySaver())
+    config = {"configurable": {"thread_id": "bench"}}
+
+    async def run():
+        state = await app_graph.ainvoke({
+            "messages": [], "llm_history": [], "history_summary": "", "role": "Backend Engineer",
+            "level": "medium", "resume_summary": "Built a payments API and a search service.",
+            "question_count": 0, "feedback_notes": [], "report_text": None, "message_type": "question",
+            "project_questions_asked": 0, "technical_questions_asked": 0, "followup_questions_asked": 0,
+            "consecutive_struggles": 0, "last_question_type": None, "requesting_hint": False,
+            "topic_depth": 0, "current_topic": "technical"
+        }, config)
+        samples = []
+        for turn in range(turns):
+            tracemalloc.start()
+            answer = f"In project {turn} I sharded the database and added a write-through cache. " * 3
+            update = {"requesting_hint": False, **graph.remember(state, {"role": "user", "content": answer})}
+            state = await app_graph.ainvoke(update, config)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lengths = tuple(len(state[k]) for k in ("llm_history", "messages", "feedback_notes"))
+            samples.append((len(pickle.dumps(state)), peak, lengths))
+        return samples
+
+    return asyncio.run(run())
+
+def stub_backend():
+    """Instant stand-ins for the backend so only state handling is measured."""
+    from api_client import Analysis, ModalClient
+    async def llm(messages, max_tokens=150, temperature=0.7, **kwargs): return "How did you pick the shard key for that database?"
+    async def check_intent(text): return "VALID"
+    async def analyze(question, answer, difficulty="medium"): return Analysis("Good", "Clear answer.", False, False)
+    ModalClient.llm, ModalClient.check_intent, ModalClient.analyze = llm, check_intent, analyze
+
+def bench_state(args):
+    import config
+    stub_backend()
+    config.MAX_QUESTIONS = args.turns + 10
+
+    bounded = (config.LLM_HISTORY_WINDOW, config.MESSAGES_WINDOW)
+    for name, (history_window, messages_window) in (("unbounded", (10 ** 9, 10 ** 9)), ("bounded", bounded)):
+        config.LLM_HISTORY_WINDOW, config.MESSAGES_WINDOW = history_window, messages_window
+        graph = importlib.reload(importlib.import_module("graph"))
+        samples = run_turns(graph, args.turns)
+        print(f"{name} (history window={history_window:,}, messages window={messages_window:,})")
+        for turn in sorted({0, args.turns // 4, args.turns // 2, args.turns - 1}):
+            size, peak, (history, messages, notes) = samples[turn]
+            print(f"  turn {turn + 1:4d}: state={size / 1024:7.1f} KiB  peak alloc/turn={peak / 1024:7.1f} KiB  "
+                  f"llm_history={history} messages={messages} feedback_notes={notes}")
+
+def resume_worker(args):
+    """One Chainlit-like worker: replays app.py's per-message flow against the session store."""
+    stub_backend()
+    import sessions
+    from graph import remember
+
+    async def run():
+        await sessions.open(args.db)
+        try:
+            await turns()
+        finally:
+            await sessions.close()
+
+    async def turns():
+        if await sessions.load(args.thread) is None:
+            await sessions.app_graph.ainvoke({
+                "messages": [], "llm_history": [], "history_summary": "", "role": None, "level": None,
+                "resume_summary": "", "question_count": 0, "feedback_notes": [], "report_text": None,
+                "message_type": "question", "project_questions_asked": 0, "technical_questions_asked": 0,
+                "followup_questions_asked": 0, "consecutive_struggles": 0, "last_question_type": None,
+                "requesting_hint": False, "topic_depth": 0, "current_topic": "technical"
+            }, sessions.config(args.thread))
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            state = await sessions.load(args.thread)
+            load_ms = (time.perf_counter() - start) * 1000
+            text = ["Backend Engineer", "medium", "I built a payments API."][turn] if turn < 3 else f"Answer {turn}"
+            update = {"requesting_hint": False}
+            if not state.get("role"): update["role"] = text
+            elif not state.get("level"): update["level"] = text
+            update.update(remember(state, {"role": "user", "content": text}))
+            state = await sessions.app_graph.ainvoke(update, sessions.config(args.thread))
+            await sessions.touch(args.thread)
+            print(f"pid={os.getpid()} question_count={state['question_count']} "
+                  f"notes={len(state['feedback_notes'])} load={load_ms:.1f}ms", flush=True)
+        if args.hang:
+            await asyncio.sleep(3600)
+
+    asyncio.run(run())
+
+def bench_resume(args):
+    db = os.path.join(tempfile.mkdtemp(), "sessions.sqlite")
+    worker = [sys.executable, os.path.abspath(__file__), "resume-worker", "--db", db, "--thread", "t1"]
+
+    # First worker answers a few questions, then dies without any chance to clean up
+    first = subprocess.Popen(worker + ["--turns", str(args.turns), "--hang"], stdout=subprocess.PIPE, text=True)
+    before = []
+    while len(before) < args.turns:
+        line = first.stdout.readline()
+        if not line: break
+        if "question_count=" in line: before.append(line.strip())
+    first.send_signal(signal.SIGKILL)
+    first.wait()
+    print("\n".join(before))
+    print(f"worker {first.pid} killed")
+
+    # A different process picks the same thread up from its last checkpoint
+    second = subprocess.run(worker + ["--turns", str(args.turns)], capture_output=True, text=True, check=True)
+    after = [line for line in second.stdout.splitlines() if "question_count=" in line]
+    print("\n".join(after))
+
+    count = lambda line: int(line.split("question_count=")[1].split()[0])
+    resumed = count(after[0]) == count(before[-1]) + 1
+    print(f"resumed: {'OK' if resumed else 'FAILED'} (question_count {count(before[-1])} -> {count(after[0])})")
+    if not resumed: sys.exit(1)
+
+def sample_report(paragraphs: int) -> str:
+    # Roughly 25 tokens per line, so 100 paragraphs is about a 2500-token report
+    lines = []
+    for i in range(paragraphs):
+        if i % 10 == 0: lines.append(f"## Section {i // 10 + 1}")
+        lines.append(f"The candidate explained the trade-offs of sharding strategy {i} clearly, "
+                     f"covering consistency, latency and the operational cost of rebalancing.")
+    return "\n".join(lines)
+
+async def loop_lag(work, interval: float = 0.01):
+    """Runs `work` while a ticker (standing in for other sessions) records how late each tick wakes up."""
+    lags, done = [], asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append((time.perf_counter() - start - interval) * 1000)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(interval * 3)
+    start = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    return elapsed, lags
+
+def bench_report(args):
+    from utils import create_pdf_report, render_pdf_report, shutdown_render_pool
+    report = sample_report(args.paragraphs)
+
+    async def inline():
+        create_pdf_report("Candidate", "Backend Engineer", report)
+
+    async def pooled():
+        await render_pdf_report("Candidate", "Backend Engineer", report)
+
+    async def run():
+        await pooled()  # start the worker processes before measuring
+        for name, work in (("inline", inline), ("process pool", pooled)):
+            elapsed, lags = await loop_lag(work)
+            print(f"{name:12s} render={elapsed * 1000:6.0f}ms  other sessions' loop lag: "
+                  f"p50={percentile(lags, 50):5.1f}ms p99={percentile(lags, 99):6.1f}ms max={max(lags):6.1f}ms")
+        shutdown_render_pool()
+
+    asyncio.run(run())
+
+def bench_feedback(args):
+    import feedback
+    from api_client import ModalClient
+    from prompts import FEEDBACK_GENERATOR_PROMPT, FEEDBACK_MERGE_PROMPT
+
+    # Latency model for the backend: prefill per prompt token plus decode per output token,
+    # where the output grows with the material in the prompt (capped by max_tokens)
+    async def llm(messages, max_tokens=150, temperature=0.7):
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        output_tokens = min(max_tokens, prompt_tokens // 2 + 50)
+        await asyncio.sleep((prompt_tokens * args.prefill_ms + output_tokens * args.decode_ms) / 1000)
+        return "Solid answer; explained trade-offs clearly but skipped failure modes. " * (output_tokens // 12)
+    ModalClient.llm = llm
+
+    note = "Q: How would you shard the orders table?\nA: By customer id with consistent hashing, rebalancing in the background.\nRating: Good"
+
+    async def run(questions: int):
+        notes = [note] * questions
+        start = time.perf_counter()
+        await llm([{"role": "user", "content": FEEDBACK_GENERATOR_PROMPT.format(notes="\n".join(notes))}], max_tokens=2500)
+        full = time.perf_counter() - start
+
+        # Answers arrive one per simulated turn; the folds run meanwhile
+        for i in range(questions):
+            feedback.submit("bench", i, note, "technical")
+            await asyncio.sleep(args.turn_seconds)
+        start = time.perf_counter()
+        sections = await feedback.finish("bench", questions)
+        await llm([{"role": "user", "content": FEEDBACK_MERGE_PROMPT.format(role="Engineer", **sections)}], max_tokens=2500)
+        return full, time.perf_counter() - start
+
+    for questions in args.questions:
+        full, folded = asyncio.run(run(questions))
+        print(f"MAX_QUESTIONS={questions:3d}  time-to-report: full notes={full:5.2f}s  folded sections={folded:5.2f}s")
+
+def bench_json(args):
+    import json
+    from api_client import parse_analysis
+    from llm_engine import encode_chat, generate_batch
+    from prompts import SYSTEM_PROMPT_ANALYZER, ANALYZER_SCHEMA
+
+    model, tokenizer = load_tiny_model(args.model)
+    answers = ["I would use a hash map for O(1) lookups.", "Not sure, maybe a database?", "Sharding by user id, with a rebalancing job."]
+    prompts = [encode_chat(tokenizer, [{"role": "user", "content": SYSTEM_PROMPT_ANALYZER.format(
+        question="How would you design a cache?", answer=answers[i % len(answers)], difficulty="medium"
+    )}]) for i in range(args.requests)]
+
+    failed_constrained = 0
+    for mode, schema in (("free-form", None), ("constrained", ANALYZER_SCHEMA)):
+        failures = wasted = generated = 0
+        start = time.perf_counter()
+        for prompt in prompts:
+            result = generate_batch(model, tokenizer, [{
+                "prompt": prompt, "max_tokens": args.max_tokens, "temperature": 0.3, "json_schema": schema
+            }])[0]
+            generated += result["tokens"]
+            # What node_interview_turn used to do with free-form replies
+            text = result["text"].replace("```json", "").replace("```", "").strip()
+            analysis = parse_analysis(text)
+            if analysis is None:
+                failures += 1
+                wasted += result["tokens"]
+            else:
+                needed = len(tokenizer.encode(json.dumps(json.loads(text), separators=(",", ":")), add_special_tokens=False))
+                wasted += max(0, result["tokens"] - needed)
+        elapsed = time.perf_counter() - start
+        print(f"{mode:11s} parse failures={failures}/{len(prompts)}  tokens={generated}  wasted={wasted}  time={elapsed:.1f}s")
+        if schema: failed_constrained = failures
+    if failed_constrained:
+        sys.exit(1)
+
+# Load-test candidates: after role and level, the intro and then answers in order (cycled
+# until the report). "hint" asks for a hint; off-topic lines exercise the intent check.
+CANDIDATE_SCRIPTS = [
+    {
+        "role": "Backend Engineer", "level": "medium",
+        "resume": "Backend engineer, 5 years. Built a payments API in Go handling 2k requests/s. "
+                  "Led the move from a monolith to services on Kubernetes. Designed a search service on Elasticsearch. " * 8,
+        "answers": [
+            "Hi, I'm a backend engineer. I built a payments API and a search service, and led a migration to Kubernetes.",
+            "For the payments API we used idempotency keys stored in Postgres so retries never charged twice.",
+            "I would shard by merchant id and keep a small lookup table so hot merchants can be moved.",
+            "hint",
+            "A write-through cache keeps reads fast, but we invalidate on every update to avoid stale balances.",
+            "We measured p99 latency per endpoint and added backpressure when the queue grew past a threshold."
+        ]
+    },
+    {
+        "role": "Data Scientist", "level": "hard",
+        "resume": "Data scientist. Built churn models with gradient boosting, ran A/B tests for pricing, "
+                  "and maintained feature pipelines in Spark. " * 6,
+        "answers": [
+            "I'm a data scientist working on churn prediction and pricing experiments.",
+            "The churn model used gradient boosting on usage features, and we calibrated it with isotonic regression.",
+            "I'm not sure, maybe cross validation?",
+            "I don't know.",
+            "hint",
+            "We checked for sample ratio mismatch first, then used CUPED to reduce variance in the pricing test."
+        ]
+    },
+    {
+        "role": "Frontend Developer", "level": "easy", "resume": None,
+        "answers": [
+            "Hello! I build React apps, most recently a dashboard for a logistics company.",
+            "The dashboard used virtualized tables so thousands of rows stayed smooth.",
+            "What's your favourite movie?",
+            "I memoized the expensive selectors and split the bundle by route.",
+            "Accessibility meant keyboard navigation and proper ARIA labels on every control."
+        ]
+    }
+]
+
+async def run_load(args, url: str):
+    """Runs args.sessions scripted candidates at once; returns (timings, backend call deltas, loop lags, summary)."""
+    import aiohttp
+    import random
+    import sessions
+    import numpy as np
+    from api_client import BackendBusy, ModalClient
+    from audio_preprocess import to_wav
+    from graph import remember
+    from speech import synthesize_sentences
+    from summarizer import summarize_resume
+
+    timings = {}
+    summary = {"turns": 0, "completed": 0, "failed": 0, "busy": 0, "busy_seconds": 0.0}
+
+    def timed(name: str, start: float):
+        timings.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+
+    async def backend_stats():
+        async with aiohttp.ClientSession() as http:
+            async with http.get(f"{url}/stats") as response:
+                return await response.json()
+
+    async def speak(text: str):
+        async for _ in synthesize_sentences(text): pass
+
+    async def on_report_token(token: str): pass
+
+    async def invoke(update, thread_id: str):
+        # Each node's time is measured up to its state update in the stream
+        start, state = time.perf_counter(), None
+        async for mode, chunk in sessions.app_graph.astream(
+            update, sessions.config(thread_id, on_report_token=on_report_token), stream_mode=["updates", "values"]
+        ):
+            if mode == "values":
+                state = chunk
+                continue
+            for node in chunk: timed(f"node:{node}", start)
+            start = time.perf_counter()
+        return state
+
+    async def patiently(make_call):
+        # Like app.while_busy: wait out each 429's Retry-After, then call again
+        attempt = 0
+        while True:
+            try:
+                return await make_call(attempt)
+            except BackendBusy as e:
+                summary["busy"] += 1
+                summary["busy_seconds"] += e.retry_after
+                await asyncio.sleep(e.retry_after)
+                attempt += 1
+
+    async def candidate(i: int):
+        rng = random.Random(args.seed + i)
+        script = CANDIDATE_SCRIPTS[i % len(CANDIDATE_SCRIPTS)]
+        thread_id = f"load-{i}"
+        await asyncio.sleep(rng.uniform(0, args.ramp))
+
+        start = time.perf_counter()
+        resume_summary = ""
+        if script["resume"]:
+            _, resume_summary = await summarize_resume(script["resume"])
+            timed("resume", start)
+        initial_state = {
+            "messages": [], "llm_history": [], "history_summary": "", "role": None, "level": None,
+            "resume_summary": resume_summary, "question_count": 0, "feedback_notes": [], "report_text": None,
+            "message_type": "question", "project_questions_asked": 0, "technical_questions_asked": 0,
+            "followup_questions_asked": 0, "consecutive_struggles": 0, "last_question_type": None,
+            "requesting_hint": False, "topic_depth": 0, "current_topic": "technical"
+        }
+        state = await patiently(lambda attempt: invoke(initial_state if attempt == 0 else None, thread_id))
+        await speak(state["messages"][-1])
+
+        replies = [script["role"], script["level"]] + script["answers"]
+        for turn in range(4 * (args.questions + len(replies))):
+            if state.get("report_text"): break
+            if args.think: await asyncio.sleep(rng.expovariate(1 / args.think))
+            text = replies[turn] if turn < len(replies) else rng.choice(script["answers"][1:])
+
+            start = time.perf_counter()
+            # The answer as spoken audio (16 kHz mono WAV, ~2.5 words/s); the script text
+            # stands in for the mock's transcript
+            audio = to_wav(np.zeros(int(len(text.split()) / 2.5 * 16000), np.float32))
+            await patiently(lambda _: ModalClient.stt(audio))
+            update = {"requesting_hint": text == "hint"}
+            if not update["requesting_hint"]:
+                if not state.get("role"): update["role"] = text
+                elif not state.get("level"): update["level"] = text
+                update.update(remember(state, {"role": "user", "content": text}))
+            # A retry resumes the interrupted node from the checkpoint
+            state = await patiently(lambda attempt: invoke(update if attempt == 0 else None, thread_id))
+            await sessions.touch(thread_id)
+            await speak(state["messages"][-1])
+            timed("turn", start)
+            summary["turns"] += 1
+        summary["completed"] += bool(state.get("report_text"))
+
+    async def run_all():
+        results = await asyncio.gather(*(candidate(i) for i in range(args.sessions)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                summary["failed"] += 1
+                print(f"candidate failed: {result!r}")
+
+    for _ in range(100):
+        try:
+            await backend_stats()
+            break
+        except aiohttp.ClientError:
+            await asyncio.sleep(0.1)
+    await sessions.open(os.path.join(tempfile.mkdtemp(), "sessions.sqlite"))
+    try:
+        before = await backend_stats()
+        elapsed, lags = await loop_lag(run_all)
+        after = await backend_stats()
+    finally:
+        await ModalClient.close()
+        await sessions.close()
+    calls = {k: after.get(k, 0) - before.get(k, 0) for k in sorted(after)}
+    summary["elapsed"] = elapsed
+    return timings, calls, lags, summary
+
+def bench_load(args):
+    server = None
+    url = args.url
+    if not url:
+        url = f"http://127.0.0.1:{args.port}"
+        server = start_mock(
+            args.port, "--latency-scale", str(args.latency_scale), "--capacity-scale", str(args.capacity_scale),
+            *(["--error-rate", str(args.error_rate)] if args.error_rate is not None else [])
+        )
+    # Read when api_client and graph are first imported below
+    os.environ["MODAL_BASE_URL"] = url
+    import config
+    config.MAX_QUESTIONS = args.questions
+    try:
+        timings, calls, lags, summary = asyncio.run(run_load(args, url))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print(f"sessions={args.sessions} completed={summary['completed']} failed={summary['failed']} "
+          f"turns={summary['turns']} wall={summary['elapsed']:.1f}s "
+          f"throughput={summary['turns'] / summary['elapsed']:.2f} turns/s "
+          f"busy={summary['busy']} ({summary['busy_seconds']:.0f}s waited)")
+    print(f"{'latency (ms)':24s} {'n':>5s} {'p50':>8s} {'p95':>8s} {'p99':>8s}")
+    for name in sorted(timings, key=lambda n: (not n.startswith("turn"), n)):
+        values = timings[name]
+        print(f"  {name:22s} {len(values):5d} {percentile(values, 50):8.0f} {percentile(values, 95):8.0f} "
+              f"{percentile(values, 99):8.0f}")
+    print("backend calls: " + "  ".join(f"{k}={v}" for k, v in calls.items()))
+    print(f"event-loop lag: p50={percentile(lags, 50):.1f}ms p99={percentile(lags, 99):.1f}ms max={max(lags):.1f}ms")
+
+    turn_p95 = percentile(timings.get("turn", [0]), 95)
+    if summary["failed"] or (args.max_p95_ms and turn_p95 > args.max_p95_ms):
+        print(f"FAILED: {summary['failed']} candidates failed, turn p95={turn_p95:.0f}ms (limit {args.max_p95_ms})")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("batching", help="LLM micro-batching throughput and per-request correctness")
+    p.add_argument("--model", default="hf-internal-testing/tiny-random-LlamaForCausalLM")
+    p.add_argument("--requests", type=int, default=32)
+    p.add_argument("--batch-size", type=int, default=8)
+    p.add_argument("--wait-ms", type=float, default=20)
+    p.set_defaults(func=bench_batching)
+
+    p = sub.add_parser("intent", help="Local intent classifier latency and accuracy on the labeled eval split")
+    p.add_argument("--llm", action="store_true", help="Also run the LLM classifier (needs the backend) and report agreement")
+    p.set_defaults(func=bench_intent)
+
+    p = sub.add_parser("audio-path", help="Latency, upload size and memory of one answer from recording to transcript")
+    p.add_argument("--seconds", type=float, default=15.0, help="Answer length")
+    p.add_argument("--rate", type=int, default=48000, help="Recording sample rate")
+    p.add_argument("--channels", type=int, default=2)
+    p.add_argument("--repeats", type=int, default=20)
+    p.add_argument("--port", type=int, default=8801)
+    p.set_defaults(func=bench_audio_path)
+
+    p = sub.add_parser("state", help="Per-turn AgentState size and allocations")
+    p.add_argument("--turns", type=int, default=200)
+    p.set_defaults(func=bench_state)
+
+    p = sub.add_parser("report", help="Event-loop stalls while a PDF report renders")
+    p.add_argument("--paragraphs", type=int, default=100, help="Report length (~25 tokens each)")
+    p.set_defaults(func=bench_report)
+
+    p = sub.add_parser("feedback", help="Time-to-report vs interview length")
+    p.add_argument("--questions", type=int, nargs="+", default=[5, 10, 20, 40])
+    p.add_argument("--prefill-ms", type=float, default=0.2, help="Simulated ms per prompt token")
+    p.add_argument("--decode-ms", type=float, default=2.0, help="Simulated ms per output token")
+    p.add_argument("--turn-seconds", type=float, default=0.5, help="Simulated time between answers")
+    p.set_defaults(func=bench_feedback)
+
+    p = sub.add_parser("json", help="Analyzer JSON: free-form vs schema-constrained decoding")
+    p.add_argument("--model", default="sshleifer/tiny-gpt2")
+    p.add_argument("--requests", type=int, default=12)
+    p.add_argument("--max-tokens", type=int, default=150)
+    p.set_defaults(func=bench_json)
+
+    p = sub.add_parser("load", help="Concurrent scripted candidates against a local mock backend")
+    p.add_argument("--sessions", type=int, default=20)
+    p.add_argument("--questions", type=int, default=4, help="MAX_QUESTIONS per interview")
+    p.add_argument("--think", type=float, default=0.5, help="Mean seconds a candidate waits before answering")
+    p.add_argument("--ramp", type=float, default=2.0, help="Candidates start spread over this many seconds")
+    p.add_argument("--url", default=None, help="Backend to load instead of starting mock_backend.py")
+    p.add_argument("--port", type=int, default=8800)
+    p.add_argument("--latency-scale", type=float, default=1.0)
+    p.add_argument("--error-rate", type=float, default=None)
+    p.add_argument("--capacity-scale", type=float, default=1.0, help="Shrinks the mock's admission limits to exercise 429s")
+    p.add_argument("--max-p95-ms", type=float, default=None, help="Exit 1 if turn p95 latency exceeds this")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_load)
+
+    p = sub.add_parser("resume", help="Kill a worker mid-interview and resume in a new process")
+    p.add_argument("--turns", type=int, default=4, help="Messages handled by each worker")
+    p.set_defaults(func=bench_resume)
+
+    p = sub.add_parser("resume-worker")
+    p.add_argument("--db", required=True)
+    p.add_argument("--thread", required=True)
+    p.add_argument("--turns", type=int, default=4)
+    p.add_argument("--hang", action="store_true", help="Stay alive after the last turn (to be killed)")
+    p.set_defaults(func=resume_worker)
+
+    args = parser.parse_args()
+    args.func(args)
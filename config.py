@@ -13,3 +13,138 @@ MAX_QUESTIONS = 10
 PROJECT_PERCENTAGE = 0.40
 TECHNICAL_PERCENTAGE = 0.50
 FOLLOWUP_PERCENTAGE = 0.10
+
+# Backend transport (shared aiohttp pool in api_client.ModalClient)
+HTTP_POOL_SIZE = 100            # Total keep-alive connections across endpoints
+HTTP_KEEPALIVE_TIMEOUT = 75     # Seconds an idle connection stays in the pool
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = {"llm": 300, "tts": 60, "stt": 60}
+ENDPOINT_CONCURRENCY = {"llm": 32, "tts": 16, "stt": 16}
+HTTP_MAX_RETRIES = 2            # Extra attempts on 5xx / connection resets
+HTTP_RETRY_BACKOFF = 0.5        # Base seconds for jittered exponential backoff
+HTTP_MAX_RETRY_AFTER = 10       # 429s are retried after their Retry-After if it is at most this; longer raises BackendBusy
+
+# Resume summarization (map-reduce in summarizer.py)
+RESUME_CHUNK_SIZE = 1000
+RESUME_CHUNK_OVERLAP = 100
+SUMMARY_CONCURRENCY = 4         # Parallel chunk summaries per session
+SUMMARY_REDUCE_FANIN = 4        # Max partial summaries combined in one prompt
+
+# Resume summary cache (resume_cache.py)
+RESUME_CACHE_DIR = os.path.join(".cache", "resumes")
+RESUME_CACHE_MAX_BYTES = 50 * 1024 * 1024   # LRU-evicted beyond this
+
+# Sentence-pipelined TTS (speech.py)
+TTS_PIPELINE_CONCURRENCY = 3    # Sentences synthesized at once per reply
+TTS_MIN_SENTENCE_CHARS = 20     # Shorter fragments are merged into the next sentence
+
+# Run intent check, answer analysis and (speculative) question generation in parallel each turn
+CONCURRENT_TURN = True
+
+# LLM server-side micro-batching (llm_engine.MicroBatcher inside LLMModel)
+LLM_MAX_BATCH_SIZE = 8          # Requests folded into one generate()
+LLM_BATCH_WAIT_MS = 20          # How long the first request waits for company
+LLM_MAX_CONCURRENT_INPUTS = 16  # Inputs one LLM container accepts at once
+API_MAX_CONCURRENT_INPUTS = 100 # Requests the FastAPI container handles at once
+LLM_STREAM_TOKEN_TIMEOUT = 60   # Seconds /llm/stream waits for the next piece before failing the request
+
+# Off-topic detection (intent.py): "local", "llm", or "hybrid" (local, LLM when unsure)
+INTENT_CLASSIFIER = "hybrid"
+INTENT_CONFIDENCE_THRESHOLD = 0.8
+INTENT_CONFIRM_OFF_TOPIC = True  # Hybrid: the LLM confirms every local OFF_TOPIC verdict (a wrong one rejects a real answer)
+
+# LLM prefix KV cache (llm_engine.PrefixCache inside LLMModel)
+LLM_PREFIX_CACHE_BYTES = 4 * 1024 ** 3   # GPU memory budget for cached past key/values
+LLM_PREFIX_BLOCK_TOKENS = 32             # Prefix match granularity
+
+# TTS memoization in ModalClient.tts
+TTS_VOICE = "p225"                      # VCTK speaker
+TTS_CACHE_MAX_BYTES = 64 * 1024 * 1024  # LRU-evicted beyond this
+
+# Compressed TTS replies: "wav" (uncompressed), "opus" (Ogg/Opus) or "mp3"
+TTS_FORMAT = "opus"
+TTS_BITRATE_KBPS = 32                   # Ignored for wav
+TTS_MIME_TYPES = {"wav": "audio/wav", "opus": "audio/ogg", "mp3": "audio/mpeg"}
+TTS_EXTENSIONS = {"wav": "wav", "opus": "ogg", "mp3": "mp3"}
+
+# Client-side audio preprocessing before STT (audio_preprocess.py)
+STT_SAMPLE_RATE = 16000         # Whisper's native rate; uploads are downmixed and resampled to it
+STT_VAD_FRAME_MS = 30
+STT_VAD_MARGIN_DB = 12          # Speech must be this much louder than the noise floor (capped at
+STT_VAD_PEAK_MARGIN_DB = 15     # this much below the loudest frames, for clips without pauses)...
+STT_VAD_FLOOR_DB = -50          # ...and louder than this (dBFS)
+STT_VAD_PADDING_MS = 200        # Kept around speech so word edges are not clipped
+STT_VAD_MIN_SILENCE_MS = 500    # Shorter pauses are kept rather than trimmed
+STT_MAX_SEGMENT_SECONDS = 30    # Long answers are split at pauses into uploads of at most this
+
+# STT backends and routing (stt_engine.py): "faster-whisper" (CTranslate2, int8) or "whisper"
+STT_ENGINE = "faster-whisper"
+STT_SHORT_MAX_SECONDS = 4.0     # Clips up to this long ("hint", "medium") use the small model...
+STT_SHORT_MODEL = "base.en"
+STT_SHORT_DEVICE = "cpu"        # ...on the CPU pool ("cuda" to keep them on the GPU pool)
+STT_LONG_MODEL = "large-v3"
+STT_COMPUTE_TYPE = {"cuda": "int8_float16", "cpu": "int8"}
+STT_CPU_FALLBACK = True         # Retry on the CPU pool if the GPU pool fails
+
+# Bounded conversation state (AgentState channels in graph.py)
+LLM_HISTORY_WINDOW = 8          # Turns kept verbatim; older ones are folded into history_summary
+HISTORY_SUMMARY_MAX_CHARS = 1500
+MESSAGES_WINDOW = 4             # UI-only messages kept in the session
+
+# Persistent interview sessions (sessions.py): LangGraph SQLite checkpointer shared by workers
+SESSION_DB_PATH = os.path.join(".cache", "sessions.sqlite")
+SESSION_TTL_HOURS = 24          # Threads idle longer than this are deleted
+SESSION_KEEP_CHECKPOINTS = 1    # Newest checkpoints kept per thread when compacting
+SESSION_GC_INTERVAL = 3600      # Seconds between compactions
+
+# PDF report rendering (utils.render_pdf_report), off the event loop
+REPORT_RENDER_WORKERS = 2       # Processes laying out PDFs
+REPORT_RENDER_QUEUE = 8         # Renders running or waiting; more wait for a slot
+REPORT_RENDER_TIMEOUT = 30      # Seconds before giving up on the attachment
+
+# Incremental feedback (feedback.py): section notes folded in the background after each answer
+FEEDBACK_FOLD_CONCURRENCY = 2   # Background fold calls in flight across all sessions
+FEEDBACK_FINISH_TIMEOUT = 20    # Seconds the report waits for outstanding folds before the full-notes fallback
+FEEDBACK_MAX_SESSIONS = 1000    # Running notes kept in memory (least recently updated dropped)
+
+# Token-budgeted prompts (context.py)
+CONTEXT_ENCODING = "cl100k_base"        # tiktoken encoding used for counting
+LLM_CONTEXT_TOKENS = 3000               # Prompt budget per ModalClient.llm call
+QUESTION_CONTEXT_TOKENS = 1200          # Prompt budget for generating the next question
+CONTEXT_RESUME_TOKENS = 400             # Share of that budget the resume summary may use
+CONTEXT_DIGEST_TOKENS = 200             # Digest of older turns
+CONTEXT_LOG_TOKENS = False              # Print per-call token counts
+
+# Local mock backend for load tests (mock_backend.py): per-endpoint latency as (median ms, p99 ms),
+# drawn from a lognormal; LLM replies also take MOCK_LLM_MS_PER_TOKEN per generated token
+MOCK_LATENCY_MS = {"llm": (250, 1200), "tts": (200, 800), "stt": (300, 1500)}
+MOCK_LLM_MS_PER_TOKEN = 15
+MOCK_LLM_FILL = (0.3, 0.8)      # Share of max_tokens a reply uses
+MOCK_ERROR_RATE = {"llm": 0.01, "tts": 0.01, "stt": 0.01}   # Injected 503s
+MOCK_TTS_BYTES_PER_CHAR = 250   # About Opus at 32 kbps for speech
+
+# Prometheus metrics for graph nodes and ModalClient calls (metrics.py)
+METRICS_PATH = "/metrics"               # Served by the Chainlit app
+METRICS_TURN_BREAKDOWN = False          # Show each turn's node/call timings in its "Thinking" step
+
+# Backend warm-up and keep-warm (warmup.py), run by the Chainlit app
+WARMUP_TIMEOUT = 1200           # Seconds to wait for a cold start (the 70B LLM can take minutes to load)
+WARMUP_POLL_INTERVAL = 10       # Seconds between readiness checks while warming up
+READY_PROBE_TIMEOUT = 5         # Seconds the backend's /ready waits on each model pool before reporting "loading"
+READY_REQUEST_TIMEOUT = 30      # Client deadline for one /ready or /warm call
+READY_NOTICE_DELAY = 8          # Seconds a new candidate waits on an idle backend's /ready before the warming-up notice
+KEEPWARM_INTERVAL = 120         # Seconds between keep-warm checks
+KEEPWARM_ACTIVE_WINDOW = 1800   # Sessions touched within this many seconds count as current traffic
+# Warm containers per pool: one per this many active sessions, at most the pool's max_containers
+KEEPWARM_SESSIONS_PER_CONTAINER = {"llm": LLM_MAX_CONCURRENT_INPUTS, "tts": 8, "stt": 8, "stt_cpu": 8}
+KEEPWARM_MAX_CONTAINERS = {"llm": 1, "tts": 4, "stt": 4, "stt_cpu": 8}
+# The backend's /warm only accepts requests carrying WARM_TOKEN (an environment variable on the
+# Chainlit host, and a key in the backend's Modal secret) in this header
+WARM_TOKEN_HEADER = "X-Warm-Token"
+
+# Admission control in the backend's FastAPI layer (admission.py): per model pool, at most
+# ADMISSION_CAPACITY requests run at once and ADMISSION_QUEUE_DEPTH more wait; the rest get 429
+ADMISSION_CAPACITY = {"llm": LLM_MAX_CONCURRENT_INPUTS, "tts": 4, "stt": 12}  # Matches the pools' max_containers
+ADMISSION_QUEUE_DEPTH = {"llm": 32, "tts": 16, "stt": 24}
+ADMISSION_MAX_RETRY_AFTER = 30  # Cap on the Retry-After hint, in seconds
+BUSY_MAX_WAIT_SECONDS = 120     # app.py keeps waiting out busy responses this long before asking the candidate to retry
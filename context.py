@@ -0,0 +1,126 @@
+# context.py
+# Token-budgeted prompt assembly shared by ModalClient.llm and the interview graph.
+# Counts use tiktoken; if the encoding cannot be loaded (e.g. no network to fetch
+# the BPE file) they fall back to ~4 characters per token.
+from typing import Dict, List, Optional
+from config import CONTEXT_ENCODING, CONTEXT_DIGEST_TOKENS, CONTEXT_LOG_TOKENS
+import metrics
+
+_encoding = None
+_encoding_failed = False
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(CONTEXT_ENCODING)
+        except Exception as e:
+            print(f"tiktoken unavailable, estimating tokens from length: {e}")
+            _encoding_failed = True
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    enc = _get_encoding()
+    if enc is None:
+        return (len(text or "") + 3) // 4
+    return len(enc.encode(text or "", disallowed_special=()))
+
+def message_tokens(message: Dict) -> int:
+    # Chat templates add a few tokens of role/header framing per message
+    return count_tokens(message["content"]) + 4
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """Keeps the start and end of `text` within `budget` tokens, marking the cut."""
+    if budget <= 0:
+        return ""
+    if count_tokens(text) <= budget:
+        return text
+    enc = _get_encoding()
+    if enc is None:
+        chars = max(2, (budget - 2) * 4)
+        return f"{text[:chars // 2]} ... {text[-(chars // 2):]}"
+    ids = enc.encode(text, disallowed_special=())
+    half = max(1, (budget - 3) // 2)
+    return f"{enc.decode(ids[:half])} ... {enc.decode(ids[-half:])}"
+
+def record(call: str, budget: int, prompt_tokens: int, dropped_tokens: int, turns_kept: int, turns_digested: int):
+    metrics.PROMPT_TOKENS.labels(call).observe(prompt_tokens)
+    metrics.TRIMMED_TOKENS.labels(call).inc(dropped_tokens)
+    if CONTEXT_LOG_TOKENS:
+        print(f"context[{call}] {prompt_tokens}/{budget} tokens, kept {turns_kept} turns, "
+              f"digested {turns_digested}, dropped {dropped_tokens} tokens")
+
+def _digest_line(turn: Dict) -> str:
+    label = "Q" if turn["role"] == "assistant" else "A"
+    text = " ".join(turn["content"].split())
+    return f"{label}: {text[:120]}{'...' if len(text) > 120 else ''}"
+
+def build_context(system_prompt: str, history: List[Dict], summary: str, budget: int, call: str = "context") -> List[Dict]:
+    """
+    System prompt first, then as many of the newest turns as fit in `budget` tokens.
+    Turns that do not fit, plus the running `summary` of turns already out of the
+    history window, go into one digest message of at most CONTEXT_DIGEST_TOKENS.
+    The newest turn is always kept, truncated if it alone is over budget.
+    """
+    system = {"role": "system", "content": system_prompt}
+    remaining = budget - message_tokens(system)
+    reserve = CONTEXT_DIGEST_TOKENS if (summary or len(history) > 1) else 0
+
+    kept: List[Dict] = []
+    dropped_tokens = 0
+    cut = len(history)
+    for i in range(len(history) - 1, -1, -1):
+        cost = message_tokens(history[i])
+        if cost <= remaining - reserve:
+            kept.insert(0, history[i])
+            remaining -= cost
+            cut = i
+        elif not kept:
+            # One very long answer: keep its start and end
+            content = truncate_tokens(history[i]["content"], max(16, remaining - reserve - 4))
+            kept.insert(0, {"role": history[i]["role"], "content": content})
+            dropped_tokens += cost - message_tokens(kept[0])
+            remaining -= message_tokens(kept[0])
+            cut = i
+        else:
+            break
+
+    older = history[:cut]
+    digest: Optional[Dict] = None
+    lines = [line for line in (summary or "").split("\n") if line] + [_digest_line(t) for t in older]
+    if lines:
+        # Newest lines win when the digest itself is over its share
+        allowed = max(0, min(CONTEXT_DIGEST_TOKENS, remaining) - 12)
+        while lines and count_tokens("\n".join(lines)) > allowed:
+            lines.pop(0)
+        dropped_tokens += sum(message_tokens(t) for t in older)
+        if lines:
+            digest = {"role": "system", "content": "Earlier in the interview:\n" + "\n".join(lines)}
+
+    messages = [system] + ([digest] if digest else []) + kept
+    record(call, budget, sum(message_tokens(m) for m in messages), dropped_tokens, len(kept), len(older))
+    return messages
+
+def fit_messages(messages: List[Dict], budget: int, call: str = "llm") -> List[Dict]:
+    """
+    Keeps a leading system message and the last message, then adds earlier messages
+    newest first while they fit in `budget` tokens. Single long prompts are passed whole.
+    """
+    if len(messages) <= 2:
+        record(call, budget, sum(message_tokens(m) for m in messages), 0, len(messages), 0)
+        return messages
+    head = messages[:1] if messages[0]["role"] == "system" else []
+    body = messages[len(head):]
+    remaining = budget - sum(message_tokens(m) for m in head) - message_tokens(body[-1])
+    kept = [body[-1]]
+    for message in reversed(body[:-1]):
+        cost = message_tokens(message)
+        if cost > remaining:
+            break
+        kept.insert(0, message)
+        remaining -= cost
+    dropped = body[:len(body) - len(kept)]
+    result = head + kept
+    record(call, budget, sum(message_tokens(m) for m in result), sum(message_tokens(m) for m in dropped), len(kept), 0)
+    return result
@@ -0,0 +1,75 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional
+from api_client import ModalClient
+from prompts import FEEDBACK_SECTION_PROMPT
+from config import FEEDBACK_FOLD_CONCURRENCY, FEEDBACK_FINISH_TIMEOUT, FEEDBACK_MAX_SESSIONS
+
+SECTIONS = ("technical", "projects", "communication")
+# Question type (graph.plan_turn) -> report section its answers feed; every answer also feeds communication
+TOPIC_SECTIONS = {"technical": "technical", "followup": "technical", "project": "projects"}
+
+class RunningFeedback:
+    """Section notes for one interview, folded in the order the notes were written."""
+    def __init__(self):
+        self.sections = {s: "" for s in SECTIONS}
+        self.folded = 0
+        self.tail: Optional[asyncio.Task] = None
+
+# Keyed by graph thread id; in-process only, so a restarted worker falls back to the full notes
+_running: "OrderedDict[str, RunningFeedback]" = OrderedDict()
+_limit: Optional[asyncio.Semaphore] = None
+
+async def _fold_section(section: str, summary: str, note: str) -> Optional[str]:
+    """The section's summary with `note` folded in, or None if the LLM call failed (llm() returns "")."""
+    prompt = FEEDBACK_SECTION_PROMPT.format(section=section, summary=summary or "(none yet)", note=note)
+    async with _limit:
+        updated = await ModalClient.llm([{"role": "user", "content": prompt}], max_tokens=200, temperature=0.3)
+    return updated.strip() or None
+
+async def _fold(running: RunningFeedback, previous: Optional[asyncio.Task], index: int, note: str, section: str):
+    if previous:
+        await asyncio.gather(previous, return_exceptions=True)
+    # A gap means earlier notes were never submitted here; finish() will fall back
+    if running.folded != index:
+        return
+    sections = running.sections
+    updated = await asyncio.gather(
+        _fold_section(section, sections[section], note),
+        _fold_section("communication", sections["communication"], note)
+    )
+    # A failed fold leaves `folded` short, so later notes stop here and finish() falls back
+    if None in updated:
+        print(f"Feedback fold failed for note {index}; the report will use the full notes")
+        return
+    sections[section], sections["communication"] = updated
+    running.folded = index + 1
+
+def submit(thread_id: str, index: int, note: str, topic: str):
+    """
+    Folds the interview's `index`-th note into its topic section and communication in a
+    background task. Folds for one interview run in order; at most FEEDBACK_FOLD_CONCURRENCY
+    fold calls run at once across all interviews.
+    """
+    global _limit
+    if _limit is None:
+        _limit = asyncio.Semaphore(FEEDBACK_FOLD_CONCURRENCY)
+    running = _running.get(thread_id) or RunningFeedback()
+    _running[thread_id] = running
+    _running.move_to_end(thread_id)
+    while len(_running) > FEEDBACK_MAX_SESSIONS:
+        _, dropped = _running.popitem(last=False)
+        if dropped.tail: dropped.tail.cancel()
+    running.tail = asyncio.create_task(_fold(running, running.tail, index, note, TOPIC_SECTIONS.get(topic, "technical")))
+
+async def finish(thread_id: str, note_count: int) -> Optional[Dict[str, str]]:
+    """Waits for outstanding folds; returns the sections if all `note_count` notes made it in, else None."""
+    running = _running.pop(thread_id, None)
+    if running is None:
+        return None
+    if running.tail:
+        try:
+            await asyncio.wait_for(running.tail, FEEDBACK_FINISH_TIMEOUT)
+        except Exception:
+            return None
+    return running.sections if running.folded == note_count else None
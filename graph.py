@@ -1,21 +1,41 @@
-from typing import TypedDict, List, Dict
+from typing import Annotated, TypedDict, List, Dict
 from langgraph.graph import StateGraph, END
-from api_client import ModalClient
-from prompts import FEEDBACK_GENERATOR_PROMPT, SYSTEM_PROMPT_INTERVIEWER
-from utils import create_pdf_report, clean_llm_response
-from config import MAX_QUESTIONS, PROJECT_PERCENTAGE, TECHNICAL_PERCENTAGE
-import json
+from langchain_core.runnables import RunnableConfig
+from api_client import ModalClient, LONG_FORM_STOP
+from prompts import (
+    FEEDBACK_GENERATOR_PROMPT, FEEDBACK_MERGE_PROMPT, SYSTEM_PROMPT_INTERVIEWER,
+    GREETING_MESSAGE, ASK_LEVEL_MESSAGE, OFF_TOPIC_MESSAGE, FALLBACK_QUESTION
+)
+from utils import clean_llm_response
+from config import (
+    MAX_QUESTIONS, PROJECT_PERCENTAGE, TECHNICAL_PERCENTAGE, CONCURRENT_TURN,
+    LLM_HISTORY_WINDOW, HISTORY_SUMMARY_MAX_CHARS, MESSAGES_WINDOW,
+    QUESTION_CONTEXT_TOKENS, CONTEXT_RESUME_TOKENS
+)
+from context import build_context, truncate_tokens
+from metrics import timed_node
+import asyncio
 import math
+import operator
+import feedback
 
+def append_window(size: int):
+    """Reducer for append-only channels that keep only their last `size` items."""
+    def reduce(left: List, right: List) -> List:
+        return (left + right)[-size:]
+    return reduce
+
+# Nodes return only the new items for list channels; the reducers append them
 class AgentState(TypedDict):
-    messages: List[str]
-    llm_history: List[Dict]
+    messages: Annotated[List[str], append_window(MESSAGES_WINDOW)]
+    llm_history: Annotated[List[Dict], append_window(LLM_HISTORY_WINDOW)]
+    history_summary: str
     role: str
     level: str
     resume_summary: str
     question_count: int
-    feedback_notes: List[str]
-    pdf_report: bytes
+    feedback_notes: Annotated[List[str], operator.add]
+    report_text: str
     message_type: str
     project_questions_asked: int
     technical_questions_asked: int
@@ -26,14 +46,34 @@ class AgentState(TypedDict):
     current_topic: str
     requesting_hint: bool 
 
+def fold_history(summary: str, turns: List[Dict]) -> str:
+    """Appends one short line per turn leaving the history window, oldest lines dropped first."""
+    lines = [line for line in (summary or "").split("\n") if line]
+    for turn in turns:
+        label = "Q" if turn["role"] == "assistant" else "A"
+        text = " ".join(turn["content"].split())
+        lines.append(f"{label}: {text[:150]}{'...' if len(text) > 150 else ''}")
+    while lines and len("\n".join(lines)) > HISTORY_SUMMARY_MAX_CHARS:
+        lines.pop(0)
+    return "\n".join(lines)
+
+def remember(state: AgentState, *turns: Dict) -> Dict:
+    """State update appending `turns` to llm_history and folding whatever falls out of the window."""
+    history = state.get("llm_history", [])
+    overflow = len(history) + len(turns) - LLM_HISTORY_WINDOW
+    update = {"llm_history": list(turns)}
+    if overflow > 0:
+        update["history_summary"] = fold_history(state.get("history_summary", ""), history[:overflow])
+    return update
+
 async def node_ask_role(state: AgentState):
-    msg = "Hello! I am your AI Interviewer. What role are you applying for?"
+    msg = GREETING_MESSAGE
     return {
         "messages": [msg], 
         "llm_history": [{"role": "assistant", "content": msg}], 
         "question_count": 0, 
         "feedback_notes": [], 
-        "pdf_report": None, 
+        "report_text": None, 
         "level": None, 
         "message_type": "question",
         "project_questions_asked": 0,
@@ -42,76 +82,30 @@ async def node_ask_role(state: AgentState):
         "consecutive_struggles": 0,
         "topic_depth": 0,
         "current_topic": "technical",
+        "history_summary": "",
         "resume_summary": state.get("resume_summary", "")
     }
 
 async def node_ask_level(state: AgentState):
-    msg = "Choose your difficulty: Easy, Medium, or Hard."
+    msg = ASK_LEVEL_MESSAGE
     return {
-        "messages": state.get("messages", []) + [msg],
-        "llm_history": state["llm_history"] + [{"role": "assistant", "content": msg}], 
+        "messages": [msg],
+        **remember(state, {"role": "assistant", "content": msg}),
         "message_type": "question"
     }
 
 async def node_ask_bio(state: AgentState):
     msg = f"Great. Let's begin the {state.get('level', 'medium')} interview for {state.get('role', 'candidate')}. Please introduce yourself and mention your key projects."
     return {
-        "messages": state.get("messages", []) + [msg],
-        "llm_history": state["llm_history"] + [{"role": "assistant", "content": msg}], 
+        "messages": [msg],
+        **remember(state, {"role": "assistant", "content": msg}),
         "question_count": 1, 
         "message_type": "question"
     }
 
-async def node_interview_turn(state: AgentState):
+def plan_turn(state: AgentState, is_struggling: bool, consecutive_struggles: int):
+    """Decision engine: returns (phase, message_type, question_increment, consecutive_struggles, next_question_type)."""
     current_q_count = state.get("question_count", 1)
-    topic_depth = state.get("topic_depth", 0)
-    level = state.get("level", "medium").lower()
-    new_notes = state.get("feedback_notes", [])
-    
-    # --- 0. INTENT CHECK ---
-    if len(state["llm_history"]) > 0 and state["llm_history"][-1]["role"] == "user":
-        last_user_input = state["llm_history"][-1]["content"]
-        if len(last_user_input) > 5:
-            intent = await ModalClient.check_intent(last_user_input)
-            if "OFF_TOPIC" in intent:
-                warning_msg = "Let's stay focused on the interview. Please answer the previous question."
-                return {
-                    "messages": state.get("messages", []) + [warning_msg],
-                    "llm_history": state["llm_history"] + [{"role": "assistant", "content": warning_msg}],
-                    "message_type": "hint",
-                    "question_count": current_q_count 
-                }
-
-    # --- 1. Analysis & Probing Logic ---
-    should_probe = False
-    is_struggling = False
-    consecutive_struggles = state.get("consecutive_struggles", 0)
-    
-    if len(state["llm_history"]) >= 2 and current_q_count > 1:
-        last_q = state["llm_history"][-2]["content"]
-        last_a = state["llm_history"][-1]["content"]
-        
-        # Only analyze if we are deep enough into the interview
-        if "introduce" not in last_q.lower() and current_q_count > 2:
-            anl = await ModalClient.analyze(last_q, last_a, level)
-            try:
-                # Robust cleaning for JSON
-                anl_cleaned = anl.replace("```json", "").replace("```", "").strip()
-                aj = json.loads(anl_cleaned)
-                
-                is_struggling = aj.get("is_struggling", False)
-                should_probe = aj.get("should_probe", False)
-                
-                if is_struggling: consecutive_struggles += 1
-                else: consecutive_struggles = 0
-                
-                new_notes.append(f"Q: {last_q}\nA: {last_a}\nRating: {aj.get('rating')}")
-            except:
-                new_notes.append(f"Q: {last_q}\nA: {last_a}")
-        else:
-            new_notes.append(f"Intro: {last_a}")
-
-    # --- 2. Decision Engine ---
     project_count = state.get("project_questions_asked", 0)
     technical_count = state.get("technical_questions_asked", 0)
     project_target = math.ceil(MAX_QUESTIONS * PROJECT_PERCENTAGE)
@@ -147,8 +141,11 @@ async def node_interview_turn(state: AgentState):
             phase = f"Follow-up. Ask a relevant technical follow-up question for a {state.get('role')}."
             next_question_type = "followup"
 
-    # --- 3. Generation ---
-    resume_context = state.get('resume_summary', 'Not provided')
+    return phase, message_type, question_increment, consecutive_struggles, next_question_type
+
+async def generate_question(state: AgentState, phase: str) -> str:
+    level = state.get("level", "medium").lower()
+    resume_context = truncate_tokens(state.get('resume_summary') or 'Not provided', CONTEXT_RESUME_TOKENS)
     full_context = f"Difficulty: {level}\nCandidate Resume Summary: {resume_context}"
     
     system_prompt = SYSTEM_PROMPT_INTERVIEWER.format(
@@ -157,26 +154,114 @@ async def node_interview_turn(state: AgentState):
         context=full_context
     )
     
-    messages = [{"role": "system", "content": system_prompt}]
-    for msg in state["llm_history"][-4:]: messages.append(msg)
+    # Newest turns that fit the budget; older ones (and history_summary) as a digest
+    messages = build_context(
+        system_prompt, state["llm_history"], state.get("history_summary", ""), QUESTION_CONTEXT_TOKENS, call="question"
+    )
         
     response_text = await ModalClient.llm(messages, max_tokens=60) 
     response_text = clean_llm_response(response_text)
-    if not response_text: response_text = "Could you elaborate?"
+    if not response_text: response_text = FALLBACK_QUESTION
+    return response_text
+
+async def node_interview_turn(state: AgentState, config: RunnableConfig):
+    current_q_count = state.get("question_count", 1)
+    topic_depth = state.get("topic_depth", 0)
+    level = state.get("level", "medium").lower()
+    new_notes = []
+    history = state["llm_history"]
+
+    last_user_input = history[-1]["content"] if history and history[-1]["role"] == "user" else ""
+    needs_intent = len(last_user_input) > 5
+    last_q = last_a = None
+    if len(history) >= 2 and current_q_count > 1:
+        last_q = history[-2]["content"]
+        last_a = history[-1]["content"]
+    # Only analyze if we are deep enough into the interview
+    needs_analysis = last_q is not None and "introduce" not in last_q.lower() and current_q_count > 2
+
+    # In concurrent mode the intent check, analysis and question generation start together.
+    # The question is generated speculatively for the "not struggling" plan; it is kept
+    # only if the analysis leads to the same phase, otherwise it is cancelled and redone.
+    intent_task = analysis_task = speculative_task = None
+    speculative_phase = None
+    try:
+        if needs_intent:
+            intent_task = asyncio.create_task(ModalClient.check_intent(last_user_input))
+        if CONCURRENT_TURN:
+            if needs_analysis:
+                analysis_task = asyncio.create_task(ModalClient.analyze(last_q, last_a, level))
+            speculative_phase = plan_turn(state, False, 0)[0]
+            speculative_task = asyncio.create_task(generate_question(state, speculative_phase))
+
+        # --- 0. INTENT CHECK ---
+        if intent_task and "OFF_TOPIC" in await intent_task:
+            warning_msg = OFF_TOPIC_MESSAGE
+            return {
+                "messages": [warning_msg],
+                **remember(state, {"role": "assistant", "content": warning_msg}),
+                "message_type": "hint",
+                "question_count": current_q_count 
+            }
+
+        # --- 1. Analysis & Probing Logic ---
+        should_probe = False
+        is_struggling = False
+        consecutive_struggles = state.get("consecutive_struggles", 0)
+        
+        if needs_analysis:
+            analysis = await analysis_task if analysis_task else await ModalClient.analyze(last_q, last_a, level)
+            if analysis:
+                is_struggling = analysis.is_struggling
+                should_probe = analysis.should_probe
+                
+                if is_struggling: consecutive_struggles += 1
+                else: consecutive_struggles = 0
+                
+                new_notes.append(f"Q: {last_q}\nA: {last_a}\nRating: {analysis.rating}")
+            else:
+                new_notes.append(f"Q: {last_q}\nA: {last_a}")
+        elif last_q is not None:
+            new_notes.append(f"Intro: {last_a}")
+
+        # --- 2. Decision Engine ---
+        phase, message_type, question_increment, consecutive_struggles, next_question_type = plan_turn(
+            state, is_struggling, consecutive_struggles
+        )
+
+        # --- 3. Generation ---
+        if speculative_task and phase == speculative_phase:
+            response_text = await speculative_task
+        else:
+            response_text = await generate_question(state, phase)
+    finally:
+        # Drop speculative work that is no longer needed
+        for task in (intent_task, analysis_task, speculative_task):
+            if task and not task.done(): task.cancel()
+            # A sibling's BackendBusy is already propagating; don't log this one as unretrieved
+            elif task and not task.cancelled(): task.exception()
 
     # --- 4. Update Counters ---
     project_count = state.get("project_questions_asked", 0)
     technical_count = state.get("technical_questions_asked", 0)
     followup_count = state.get("followup_questions_asked", 0)
 
+    # Fold this turn's notes into the running report sections without holding up the reply
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if thread_id:
+        note_index = len(state.get("feedback_notes", []))
+        answered_topic = "project" if last_q is not None and not needs_analysis else state.get("current_topic")
+        for i, note in enumerate(new_notes):
+            feedback.submit(thread_id, note_index + i, note, answered_topic)
+
     if message_type == "question":
         if next_question_type == "project": project_count += 1
         elif next_question_type == "technical": technical_count += 1
         elif next_question_type == "followup": followup_count += 1
 
     return {
-        "messages": state.get("messages", []) + [response_text],
-        "llm_history": state["llm_history"] + [{"role": "assistant", "content": response_text}],
+        "messages": [response_text],
+        **remember(state, {"role": "assistant", "content": response_text}),
         "question_count": current_q_count + question_increment,
         "feedback_notes": new_notes,
         "message_type": message_type,
@@ -189,24 +274,40 @@ async def node_interview_turn(state: AgentState):
         "followup_questions_asked": followup_count
     }
 
-async def node_feedback(state: AgentState):
-    notes_str = "\n".join(state["feedback_notes"])
-    full_notes = f"Role: {state.get('role')}\n{notes_str}"
+async def node_feedback(state: AgentState, config: RunnableConfig):
+    # Normally only the sections folded during the interview are merged; the full
+    # notes are used when they are incomplete (e.g. the worker restarted mid-interview)
+    sections = await feedback.finish(config.get("configurable", {}).get("thread_id"), len(state["feedback_notes"]))
+    if sections:
+        prompt = FEEDBACK_MERGE_PROMPT.format(role=state.get("role"), **{k: v or "(no evidence)" for k, v in sections.items()})
+    else:
+        notes_str = "\n".join(state["feedback_notes"])
+        full_notes = f"Role: {state.get('role')}\n{notes_str}"
+        prompt = FEEDBACK_GENERATOR_PROMPT.format(notes=full_notes)
     
-    feedback_messages = [{"role": "user", "content": FEEDBACK_GENERATOR_PROMPT.format(notes=full_notes)}]
-    report = await ModalClient.llm(feedback_messages, max_tokens=2500)
+    feedback_messages = [{"role": "user", "content": prompt}]
+
+    # Stream the report to the UI as it is generated when the caller asks for it
+    on_token = config.get("configurable", {}).get("on_report_token")
+    if on_token:
+        parts = []
+        async for token in ModalClient.llm_stream(feedback_messages, max_tokens=2500, stop=LONG_FORM_STOP):
+            parts.append(token)
+            await on_token(token)
+        report = "".join(parts)
+    else:
+        report = await ModalClient.llm(feedback_messages, max_tokens=2500, stop=LONG_FORM_STOP)
     
     if "Here is" in report: report = report.split(":", 1)[-1].strip()
-    pdf = create_pdf_report("Candidate", state.get("role"), report)
-    
+    # The PDF is rendered by the caller (app.py), after the Markdown report is on screen
     return {
-        "messages": state.get("messages", []) + ["Interview complete. Here is your report."], 
-        "pdf_report": pdf, 
+        "messages": ["Interview complete. Here is your report."], 
+        "report_text": report or "No feedback could be generated for this interview.", 
         "message_type": "report"
     }
 
 def master_router(state: AgentState):
-    if state.get("pdf_report"): return END
+    if state.get("report_text"): return END
     
     if state.get("requesting_hint"): return "interview_turn"
     if not state.get("role"): return "ask_role"
@@ -216,11 +317,12 @@ def master_router(state: AgentState):
     return "interview_turn"
 
 workflow = StateGraph(AgentState)
-workflow.add_node("ask_role", node_ask_role)
-workflow.add_node("ask_level", node_ask_level)
-workflow.add_node("ask_bio", node_ask_bio)
-workflow.add_node("interview_turn", node_interview_turn)
-workflow.add_node("feedback", node_feedback)
+# Every node is timed (metrics.NODE_SECONDS and the per-turn breakdown)
+workflow.add_node("ask_role", timed_node("ask_role", node_ask_role))
+workflow.add_node("ask_level", timed_node("ask_level", node_ask_level))
+workflow.add_node("ask_bio", timed_node("ask_bio", node_ask_bio))
+workflow.add_node("interview_turn", timed_node("interview_turn", node_interview_turn))
+workflow.add_node("feedback", timed_node("feedback", node_feedback))
 
 workflow.set_conditional_entry_point(master_router, 
     {"ask_role": "ask_role", "ask_level": "ask_level", "ask_bio": "ask_bio", 
@@ -0,0 +1,132 @@
+# intent.py
+# Off-topic detection for candidate answers. The local classifier (TF-IDF +
+# keyword features with a small logistic regression, trained at startup on
+# data/intent_labeled.jsonl) answers in microseconds; low-confidence inputs
+# fall back to the LLM prompt, and so do its OFF_TOPIC verdicts unless
+# INTENT_CONFIRM_OFF_TOPIC is off: with so little training data, answers about
+# a football club's website or a coffee shop's app can look off-topic to it.
+import json
+import math
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from config import INTENT_CLASSIFIER, INTENT_CONFIDENCE_THRESHOLD, INTENT_CONFIRM_OFF_TOPIC
+
+VALID = "VALID"
+OFF_TOPIC = "OFF_TOPIC"
+LABELED_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intent_labeled.jsonl")
+
+INTERVIEW_KEYWORDS = {
+    "project", "projects", "api", "database", "design", "designed", "implemented", "built", "team", "code",
+    "algorithm", "system", "experience", "data", "model", "service", "server", "cache", "query", "test",
+    "tests", "deployed", "architecture", "bug", "performance", "role", "position", "interview", "question",
+    "answer", "hint", "clarify", "repeat", "internship", "engineer", "developer", "python", "java", "sql",
+    "complexity", "thread", "memory", "scalability", "latency", "framework", "library", "frontend", "backend"
+}
+OFF_TOPIC_KEYWORDS = {
+    "weather", "rain", "raining", "snow", "hot", "football", "cricket", "basketball", "tennis", "match",
+    "movie", "film", "song", "music", "band", "concert", "joke", "funny", "recipe", "cook", "cooking",
+    "pizza", "cake", "dinner", "lunch", "eat", "coffee", "vacation", "holiday", "beach", "dog", "cat",
+    "puppy", "game", "games", "celebrity", "politics", "poem", "league", "olympics", "sunset", "ghosts"
+}
+
+def load_examples(split: Optional[str] = None) -> List[Dict]:
+    with open(LABELED_DATA, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [r for r in rows if split is None or r.get("split") == split]
+
+def _tokens(text: str) -> List[str]:
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+class IntentClassifier(ABC):
+    @abstractmethod
+    async def classify(self, text: str) -> Tuple[str, float]:
+        """Returns (label, confidence) where label is VALID or OFF_TOPIC."""
+
+class LLMIntentClassifier(IntentClassifier):
+    async def classify(self, text: str) -> Tuple[str, float]:
+        from api_client import ModalClient
+        from prompts import INTENT_CHECK_PROMPT
+        prompt = INTENT_CHECK_PROMPT.format(last_user_input=text)
+        resp = await ModalClient.llm([{"role": "user", "content": prompt}], max_tokens=10, temperature=0.1)
+        # A failed call returns "", which keeps the candidate in the interview
+        return (OFF_TOPIC if OFF_TOPIC in resp.strip().upper() else VALID), 1.0
+
+class LocalIntentClassifier(IntentClassifier):
+    def __init__(self, examples: Optional[List[Dict]] = None, epochs: int = 200, lr: float = 0.5, l2: float = 1e-3):
+        examples = examples if examples is not None else load_examples("train")
+        docs = [_tokens(e["text"]) for e in examples]
+        df: Dict[str, int] = {}
+        for doc in docs:
+            for tok in set(doc): df[tok] = df.get(tok, 0) + 1
+        self.idf = {tok: math.log((1 + len(docs)) / (1 + n)) + 1 for tok, n in df.items()}
+
+        # Plain SGD on the logistic loss; the dataset is tiny, and a fixed order keeps training reproducible
+        self.weights: Dict[str, float] = {}
+        self.bias = 0.0
+        data = [(self._features(doc), 1.0 if e["label"] == OFF_TOPIC else 0.0) for doc, e in zip(docs, examples)]
+        for _ in range(epochs):
+            for feats, y in data:
+                err = self._prob(feats) - y
+                self.bias -= lr * err
+                for name, value in feats.items():
+                    w = self.weights.get(name, 0.0)
+                    self.weights[name] = w - lr * (err * value + l2 * w)
+
+    def _features(self, tokens: List[str]) -> Dict[str, float]:
+        feats: Dict[str, float] = {}
+        for tok in tokens:
+            if tok in self.idf: feats[tok] = feats.get(tok, 0.0) + self.idf[tok]
+        norm = math.sqrt(sum(v * v for v in feats.values())) or 1.0
+        feats = {k: v / norm for k, v in feats.items()}
+        feats["kw:interview"] = float(sum(t in INTERVIEW_KEYWORDS for t in tokens))
+        feats["kw:off_topic"] = float(sum(t in OFF_TOPIC_KEYWORDS for t in tokens))
+        return feats
+
+    def _prob(self, feats: Dict[str, float]) -> float:
+        z = self.bias + sum(self.weights.get(k, 0.0) * v for k, v in feats.items())
+        return 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        p = self._prob(self._features(_tokens(text)))
+        return (OFF_TOPIC, p) if p >= 0.5 else (VALID, 1.0 - p)
+
+    async def classify(self, text: str) -> Tuple[str, float]:
+        return self.predict(text)
+
+class FallbackIntentClassifier(IntentClassifier):
+    """
+    Uses `primary` when it is confident enough, otherwise asks `fallback`. Labels in
+    `confirm` are always checked with `fallback`, however confident `primary` is.
+    """
+    def __init__(self, primary: IntentClassifier, fallback: IntentClassifier, threshold: float,
+                 confirm: Tuple[str, ...] = ()):
+        self.primary = primary
+        self.fallback = fallback
+        self.threshold = threshold
+        self.confirm = confirm
+
+    async def classify(self, text: str) -> Tuple[str, float]:
+        label, confidence = await self.primary.classify(text)
+        if confidence >= self.threshold and label not in self.confirm:
+            return label, confidence
+        return await self.fallback.classify(text)
+
+_classifier: Optional[IntentClassifier] = None
+
+def get_classifier() -> IntentClassifier:
+    """Builds the classifier selected by INTENT_CLASSIFIER ("local", "llm" or "hybrid") once per process."""
+    global _classifier
+    if _classifier is None:
+        if INTENT_CLASSIFIER == "llm":
+            _classifier = LLMIntentClassifier()
+        elif INTENT_CLASSIFIER == "local":
+            _classifier = LocalIntentClassifier()
+        else:
+            _classifier = FallbackIntentClassifier(
+                LocalIntentClassifier(), LLMIntentClassifier(), INTENT_CONFIDENCE_THRESHOLD,
+                confirm=(OFF_TOPIC,) if INTENT_CONFIRM_OFF_TOPIC else ()
+            )
+    return _classifier
@@ -1,19 +1,31 @@
 import os
+import json
+import asyncio
+import hmac
+from typing import Optional
 import modal
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException
 from fastapi.responses import JSONResponse, Response
 import re
+from config import (
+    LLM_MAX_BATCH_SIZE, LLM_BATCH_WAIT_MS, LLM_MAX_CONCURRENT_INPUTS, API_MAX_CONCURRENT_INPUTS,
+    LLM_PREFIX_CACHE_BYTES, LLM_PREFIX_BLOCK_TOKENS, LLM_STREAM_TOKEN_TIMEOUT, TTS_MIME_TYPES,
+    STT_SHORT_MODEL, STT_SHORT_DEVICE, STT_LONG_MODEL, STT_CPU_FALLBACK, READY_PROBE_TIMEOUT,
+    ADMISSION_CAPACITY, ADMISSION_QUEUE_DEPTH, ADMISSION_MAX_RETRY_AFTER, KEEPWARM_MAX_CONTAINERS, WARM_TOKEN_HEADER
+)
+from admission import AdmittedStream, Overloaded, make_gates
 
 def create_model_image():
     return (
         modal.Image.debian_slim(python_version="3.11")
         .pip_install(
             "torch",
-            "transformers>=4.40.0",  # CRITICAL: Llama 3 requires >=4.40
+            "transformers>=4.45.0",  # CRITICAL: Llama 3 requires >=4.40; prefix-cache resume needs >=4.45
             "accelerate",
             "bitsandbytes",
             "huggingface-hub",
             "openai-whisper",
+            "faster-whisper",
             "TTS",
             "soundfile",
             "numpy",
@@ -23,10 +35,11 @@ def create_model_image():
             "sentencepiece",
             "protobuf"
         )
-        .apt_install("espeak-ng")
+        .apt_install("espeak-ng", "ffmpeg")
     )
 
-model_image = create_model_image()
+# Local modules the containers import (must be the last image step)
+model_image = create_model_image().add_local_python_source("config", "llm_engine", "stt_engine", "admission")
 
 app = modal.App(
     "open-source-interview-trainer",
@@ -34,42 +47,78 @@ app = modal.App(
     secrets=[modal.Secret.from_name("dr-sense-secrets")]
 )
 
-# --- STT (Whisper Large) ---
+# ffmpeg encoder and container per compressed TTS format
+AUDIO_ENCODERS = {"opus": ("libopus", "ogg"), "mp3": ("libmp3lame", "mp3")}
+
+def encode_audio(wav_bytes: bytes, fmt: str, bitrate_kbps: int) -> bytes:
+    """Transcodes WAV to `fmt` through ffmpeg pipes; "wav" is returned untouched."""
+    import subprocess
+
+    if fmt == "wav":
+        return wav_bytes
+    codec, container = AUDIO_ENCODERS[fmt]
+    return subprocess.run(
+        ["ffmpeg", "-nostdin", "-i", "pipe:0", "-vn", "-ac", "1",
+         "-c:a", codec, "-b:a", f"{bitrate_kbps}k", "-f", container, "pipe:1"],
+        input=wav_bytes, capture_output=True, check=True
+    ).stdout
+
+# --- STT (Whisper, routed by clip duration) ---
 @app.cls(gpu="t4", max_containers=4)
 class STTModel:
     @modal.enter()
     def load(self):
-        import whisper
-        self.model = whisper.load_model("large-v3", device="cuda")
+        from stt_engine import BackendPool
+        self.pool = BackendPool("cuda")
+        self.pool.get(STT_LONG_MODEL)
 
     @modal.method()
-    def transcribe(self, audio_bytes: bytes) -> str:
-        import tempfile
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=True) as tmp:
-            tmp.write(audio_bytes)
-            tmp.flush()
-            try:
-                result = self.model.transcribe(tmp.name, fp16=True)
-            except:
-                result = self.model.transcribe(tmp.name, fp16=False)
-            return result["text"].strip()
+    def ping(self) -> bool:
+        # Only answered once load() has finished, so a reply means the model is in memory
+        return True
+
+    @modal.method()
+    def transcribe(self, audio, model_name: str = STT_LONG_MODEL) -> str:
+        # `audio` is decode_audio's int16 PCM
+        return self.pool.transcribe(audio, model_name)
+
+# CPU-only pool: short clips, and the fallback when the GPU pool fails
+@app.cls(cpu=4, memory=8192, max_containers=8)
+class STTCPUModel:
+    @modal.enter()
+    def load(self):
+        from stt_engine import BackendPool
+        self.pool = BackendPool("cpu")
+        self.pool.get(STT_SHORT_MODEL)
+
+    @modal.method()
+    def ping(self) -> bool:
+        # Only answered once load() has finished, so a reply means the model is in memory
+        return True
+
+    @modal.method()
+    def transcribe(self, audio, model_name: str = STT_SHORT_MODEL) -> str:
+        return self.pool.transcribe(audio, model_name)
 
 # --- LLM (Llama 3 70B on H100) ---
 # UPDATES:
 # 1. gpu="h100": Upgraded for speed.
 # 2. scaledown_window=1200: Replaces deprecated 'container_idle_timeout'.
 # 3. timeout=1200: Allows 20 mins for the model to download/load.
+# 4. modal.concurrent + MicroBatcher: concurrent requests share one batched generate().
 @app.cls(
     gpu="h100", 
     max_containers=1, 
     scaledown_window=1200, 
     timeout=1200
 )
+@modal.concurrent(max_inputs=LLM_MAX_CONCURRENT_INPUTS)
 class LLMModel:
     @modal.enter()
     def load(self):
         import torch
         from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+        from llm_engine import MicroBatcher, PrefixCache, generate_batch, prepare_json_schema
         
         # Using the environment variable for the token
         hf_token = os.environ["HF_TOKEN"]
@@ -98,44 +147,125 @@ class LLMModel:
         )
         self.device = next(self.model.parameters()).device
         self.model.eval()
+        # KV for shared prompt prefixes (e.g. the stable interviewer instructions)
+        self.prefix_cache = PrefixCache(LLM_PREFIX_CACHE_BYTES, LLM_PREFIX_BLOCK_TOKENS)
+        # Here rather than in the first constrained request, which would stall its whole batch
+        prepare_json_schema(self.tokenizer)
+        self.batcher = MicroBatcher(
+            lambda requests: generate_batch(self.model, self.tokenizer, requests, self.prefix_cache),
+            LLM_MAX_BATCH_SIZE,
+            LLM_BATCH_WAIT_MS
+        )
         print("Llama 3 loaded successfully.")
 
     @modal.method()
-    def generate_response(self, messages: list, max_tokens: int = 512, temperature: float = 0.7) -> str:
+    def ping(self) -> bool:
+        # Only answered once load() has finished, so a reply means the model is in memory
+        return True
+
+    @modal.method()
+    def generate_response(self, messages: list, max_tokens: int = 512, temperature: float = 0.7, stop: list = None,
+                          json_schema: dict = None) -> dict:
+        """
+        Returns {"text", "finish_reason", "tokens"}; decoding ends at the first stop string,
+        or, with `json_schema`, is constrained to a matching JSON object and ends when it closes.
+        """
+        from llm_engine import encode_chat
         try:
-            # Apply Llama 3 Chat Template
-            templ = self.tokenizer.apply_chat_template(
-                messages, return_dict=True, return_tensors="pt", add_generation_prompt=True
-            )
-            ids = templ["input_ids"].to(self.device)
-            mask = templ.get("attention_mask", (ids != self.tokenizer.pad_token_id).long()).to(self.device)
+            prompt = encode_chat(self.tokenizer, messages)
         except Exception as e:
             # Fallback if template fails
             print(f"Template Error: {e}")
-            return "I encountered an error processing your request."
+            return {"text": "I encountered an error processing your request.", "finish_reason": "error", "tokens": 0}
+
+        # Waits for the micro-batch this request lands in
+        result = self.batcher.submit({
+            "prompt": prompt, "max_tokens": max_tokens, "temperature": temperature, "stop": stop or [],
+            "json_schema": json_schema
+        })
+        if json_schema:
+            return result
+
+        # --- STRICT SANITIZATION ---
+        # Removes dialogue labels like "Assistant:" or "AI:" at the start of the reply
+        pattern = r"(?i)^(assistant|ai|user|candidate|interviewer)\s*:\s*"
+        result["text"] = re.sub(pattern, "", result["text"]).strip()
+        return result
+
+    @modal.method(is_generator=True)
+    def stream_response(self, messages: list, max_tokens: int = 512, temperature: float = 0.7, stop: list = None):
+        """
+        Yields decoded text pieces while generate() runs on a background thread, then a
+        final {"finish_reason", "tokens"} dict. Nothing from the first stop string on is yielded.
+        """
+        import torch
+        from threading import Event, Thread
+        from transformers import StoppingCriteriaList, TextIteratorStreamer
+        from llm_engine import Cancelled, RowStopStrings, encode_chat, finish_completion
+
+        try:
+            prompt = encode_chat(self.tokenizer, messages)
+        except Exception as e:
+            print(f"Template Error: {e}")
+            yield "I encountered an error processing your request."
+            return
+
+        stop = stop or []
+        ids = torch.tensor([prompt], device=self.device)
+        # A stalled generate() raises queue.Empty here instead of holding the slot forever
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=LLM_STREAM_TOKEN_TIMEOUT
+        )
+        output = {}
+        cancel = Event()
+
+        def run(**kwargs):
+            try:
+                output["ids"] = self.model.generate(**kwargs)
+            except BaseException as e:
+                output["error"] = e
+            finally:
+                # generate() only ends the stream itself when it returns
+                streamer.end()
 
-        output = self.model.generate(
+        worker = Thread(target=run, kwargs=dict(
             input_ids=ids,
-            attention_mask=mask,
+            attention_mask=torch.ones_like(ids),
+            past_key_values=self.prefix_cache.prefill(self.model, prompt),
             max_new_tokens=max_tokens,
             do_sample=True,
             temperature=temperature,
             pad_token_id=self.tokenizer.eos_token_id,
-            eos_token_id=self.tokenizer.eos_token_id
-        )
-
-        generated_text = self.tokenizer.decode(output[0][ids.shape[1]:], skip_special_tokens=True).strip()
-
-        # --- STRICT SANITIZATION ---
-        # Removes dialogue labels like "Assistant:" or "AI:" to prevent the bot from talking to itself
-        pattern = r"(?i)^(assistant|ai|user|candidate|interviewer)\s*:\s*"
-        cleaned_text = re.sub(pattern, "", generated_text).strip()
-        
-        # Remove hallucinated user turns (common in 70B models)
-        if "User:" in cleaned_text:
-            cleaned_text = cleaned_text.split("User:")[0].strip()
-        
-        return cleaned_text
+            eos_token_id=self.tokenizer.eos_token_id,
+            stopping_criteria=StoppingCriteriaList([RowStopStrings(self.tokenizer, len(prompt), [stop]), Cancelled(cancel)]),
+            streamer=streamer
+        ))
+        worker.start()
+        # Hold back enough text to recognise a stop string split across pieces
+        holdback = max([len(x) for x in stop] + [1]) - 1
+        pending, stopped = "", False
+        try:
+            for text in streamer:
+                if stopped or not text: continue
+                pending += text
+                cuts = [pending.find(x) for x in stop if x in pending]
+                if cuts:
+                    if pending[:min(cuts)]: yield pending[:min(cuts)]
+                    pending, stopped = "", True
+                elif len(pending) > holdback:
+                    yield pending[:len(pending) - holdback]
+                    pending = pending[len(pending) - holdback:]
+            if pending: yield pending
+        finally:
+            # Ending early (the consumer closed this generator, or a token timed out) stops
+            # generate() at its next step instead of letting it decode up to max_tokens
+            cancel.set()
+            worker.join(LLM_STREAM_TOKEN_TIMEOUT)
+        if "error" in output:
+            raise output["error"]
+        generated = output["ids"][0, len(prompt):].tolist() if "ids" in output else []
+        result = finish_completion(self.tokenizer, generated, max_tokens, stop)
+        yield {"finish_reason": result["finish_reason"], "tokens": result["tokens"]}
 
 # --- TTS (VCTK) ---
 @app.cls(gpu="t4", max_containers=4)
@@ -148,7 +278,12 @@ class TTSModel:
         self.tts = TTS(self.model_name, gpu=True)
 
     @modal.method()
-    def synthesize(self, text: str) -> bytes:
+    def ping(self) -> bool:
+        # Only answered once load() has finished, so a reply means the model is in memory
+        return True
+
+    @modal.method()
+    def synthesize(self, text: str, voice: str = "p225", fmt: str = "wav", bitrate_kbps: int = 32) -> bytes:
         import tempfile, os
         
         # Pre-processing for better speech
@@ -161,8 +296,8 @@ class TTSModel:
         with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
             path = tmp.name
 
-        # Speaker "p225" is generally clear and professional
-        self.tts.tts_to_file(text=text, file_path=path, speaker="p225")
+        # Speaker "p225" (the default) is generally clear and professional
+        self.tts.tts_to_file(text=text, file_path=path, speaker=voice)
 
         with open(path, "rb") as f:
             audio = f.read()
@@ -171,32 +306,153 @@ class TTSModel:
             os.remove(path)
         except:
             pass
-        return audio
+        return encode_audio(audio, fmt, bitrate_kbps)
 
 # --- FastAPI ---
 fastapi_app = FastAPI()
 
+# Model pools probed by /ready and sized by /warm
+MODEL_POOLS = {"llm": LLMModel, "tts": TTSModel, "stt": STTModel, "stt_cpu": STTCPUModel}
+# Bounded in-flight + queued requests per pool; beyond that, 429 with Retry-After
+GATES = make_gates(ADMISSION_CAPACITY, ADMISSION_QUEUE_DEPTH, ADMISSION_MAX_RETRY_AFTER)
+
+@fastapi_app.exception_handler(Overloaded)
+async def overloaded(request, exc: Overloaded):
+    return JSONResponse(
+        {"detail": str(exc)}, status_code=429, headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@fastapi_app.get("/queue")
+async def queue():
+    # Running and queued requests per pool in this API container
+    return {pool: gate.snapshot() for pool, gate in GATES.items()}
+
+@fastapi_app.get("/health")
+async def health():
+    # Liveness of this API container only; /ready covers the models
+    return {"status": "ok"}
+
+@fastapi_app.get("/ready")
+async def ready():
+    """
+    Pings every model pool at once, which also starts containers for pools that are down.
+    A pool is "ready" if its ping is answered within READY_PROBE_TIMEOUT, else "loading".
+    A failed probe marks its pool "error"; the route answers 503 rather than failing.
+    """
+    async def ping(name: str):
+        call = await MODEL_POOLS[name]().ping.spawn.aio()
+        await call.get.aio(timeout=READY_PROBE_TIMEOUT)
+
+    async def probe(name: str) -> str:
+        try:
+            # Modal raises its own TimeoutError (not the builtin) when get() runs out
+            await asyncio.wait_for(ping(name), READY_PROBE_TIMEOUT + 1)
+            return "ready"
+        except (asyncio.TimeoutError, TimeoutError, modal.exception.TimeoutError):
+            return "loading"
+        except Exception as e:
+            print(f"Readiness probe for {name} failed: {e}")
+            return "error"
+
+    states = dict(zip(MODEL_POOLS, await asyncio.gather(*(probe(name) for name in MODEL_POOLS))))
+    is_ready = all(state == "ready" for state in states.values())
+    return JSONResponse({"ready": is_ready, "models": states}, status_code=200 if is_ready else 503)
+
+@fastapi_app.post("/warm")
+async def warm(payload: dict, token: Optional[str] = Header(None, alias=WARM_TOKEN_HEADER)):
+    # {"llm": 1, "tts": 2, ...}: minimum warm containers per pool; 0 lets a pool scale to zero.
+    # Warm GPU containers are billed, so only callers holding WARM_TOKEN (from the app's Modal
+    # secret) may set them, and never above KEEPWARM_MAX_CONTAINERS
+    expected = os.environ.get("WARM_TOKEN", "")
+    if not expected or not hmac.compare_digest((token or "").encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Missing or invalid warm token")
+    unknown = set(payload) - set(MODEL_POOLS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown model pools: {sorted(unknown)}")
+    try:
+        counts = {name: max(0, min(int(count), KEEPWARM_MAX_CONTAINERS[name])) for name, count in payload.items()}
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Container counts must be integers")
+    await asyncio.gather(*(
+        MODEL_POOLS[name]().update_autoscaler.aio(min_containers=count) for name, count in counts.items()
+    ))
+    return {"min_containers": counts}
+
 @fastapi_app.post("/stt")
 async def stt(file: UploadFile = File(...)):
-    return {"text": STTModel().transcribe.remote(await file.read())}
+    from stt_engine import decode_audio, route
+    async with GATES["stt"].admit():
+        # Decoded once here so the clip length can pick the model (and pool); off the event
+        # loop, which every other request on this container shares
+        audio = await asyncio.to_thread(decode_audio, await file.read())
+        model_name = route(audio)
+        if model_name == STT_SHORT_MODEL and STT_SHORT_DEVICE == "cpu":
+            return {"text": await STTCPUModel().transcribe.remote.aio(audio, model_name)}
+        try:
+            return {"text": await STTModel().transcribe.remote.aio(audio, model_name)}
+        except Exception as e:
+            if not STT_CPU_FALLBACK:
+                raise
+            print(f"GPU STT failed, using CPU pool: {e}")
+            return {"text": await STTCPUModel().transcribe.remote.aio(audio, model_name)}
 
 @fastapi_app.post("/llm")
 async def llm(payload: dict):
-    # Pass max_tokens and temperature to the model
-    return {
-        "response": LLMModel().generate_response.remote(
+    # Pass max_tokens, temperature, stop strings and an optional JSON schema to the model
+    from llm_engine import JsonSchemaMatcher
+    response_format = payload.get("response_format") or {}
+    json_schema = response_format.get("schema") if response_format.get("type") == "json_schema" else None
+    if json_schema:
+        try:
+            JsonSchemaMatcher(json_schema)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    async with GATES["llm"].admit():
+        result = await LLMModel().generate_response.remote.aio(
             payload.get("messages", []),
             payload.get("max_tokens", 512),
-            payload.get("temperature", 0.7)
+            payload.get("temperature", 0.7),
+            payload.get("stop", []),
+            json_schema
         )
-    }
+    return {"response": result["text"], "finish_reason": result["finish_reason"], "tokens": result["tokens"]}
+
+@fastapi_app.post("/llm/stream")
+async def llm_stream(payload: dict):
+    # Newline-delimited JSON: {"token": "..."} per piece, then {"done": true, "finish_reason", "tokens"}
+    # The slot is taken before responding (so overload is still a 429) and held until the stream ends
+    started = await GATES["llm"].acquire()
+
+    async def ndjson():
+        final = {}
+        async for piece in LLMModel().stream_response.remote_gen.aio(
+            payload.get("messages", []),
+            payload.get("max_tokens", 512),
+            payload.get("temperature", 0.7),
+            payload.get("stop", [])
+        ):
+            if isinstance(piece, dict): final = piece
+            else: yield json.dumps({"token": piece}) + "\n"
+        yield json.dumps({"done": True, **final}) + "\n"
+    return AdmittedStream(GATES["llm"], started, ndjson(), media_type="application/x-ndjson")
 
 @fastapi_app.post("/tts")
 async def tts(payload: dict):
-    wav = TTSModel().synthesize.remote(payload.get("text", ""))
-    return Response(content=wav, media_type="audio/wav")
+    # "format": wav (default), opus or mp3; "bitrate" in kbps for the compressed ones
+    fmt = payload.get("format", "wav")
+    if fmt not in TTS_MIME_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    async with GATES["tts"].admit():
+        audio = await TTSModel().synthesize.remote.aio(
+            payload.get("text", ""),
+            payload.get("voice", "p225"),
+            fmt,
+            int(payload.get("bitrate", 32))
+        )
+    return Response(content=audio, media_type=TTS_MIME_TYPES[fmt])
 
 @app.function()
+@modal.concurrent(max_inputs=API_MAX_CONCURRENT_INPUTS)
 @modal.asgi_app()
 def asgi_app():
     return fastapi_app
\ No newline at end of file
@@ -0,0 +1,433 @@
+# llm_engine.py
+# Generation helpers used by LLMModel in interview_trainer_app.py. Nothing here
+# depends on Modal, so the same code runs on CPU with a tiny Hugging Face model
+# (see `python benchmarks.py batching`).
+import copy
+import hashlib
+import json
+import re
+import string
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+import torch
+from transformers import DynamicCache, LogitsProcessor, LogitsProcessorList, StoppingCriteria, StoppingCriteriaList
+
+def encode_chat(tokenizer, messages: List[Dict]) -> List[int]:
+    """Applies the chat template and returns the prompt token ids."""
+    return list(tokenizer.apply_chat_template(messages, add_generation_prompt=True, return_dict=False))
+
+class RowTemperature(LogitsProcessor):
+    """Per-row temperature so one batch can mix requests; <= 0 means greedy."""
+    def __init__(self, temperatures: List[float]):
+        self.temperatures = temperatures
+
+    def __call__(self, input_ids, scores):
+        scores = scores.clone()
+        for row, temperature in enumerate(self.temperatures):
+            if temperature <= 0:
+                best = scores[row].argmax()
+                scores[row] = -float("inf")
+                scores[row, best] = 0.0
+            else:
+                scores[row] = scores[row] / temperature
+        return scores
+
+class RowMaxTokens(StoppingCriteria):
+    """Finishes each row once it has produced its own max_tokens."""
+    def __init__(self, prompt_len: int, max_tokens: List[int]):
+        self.prompt_len = prompt_len
+        self.max_tokens = max_tokens
+
+    def __call__(self, input_ids, scores, **kwargs):
+        generated = input_ids.shape[1] - self.prompt_len
+        return torch.tensor([generated >= m for m in self.max_tokens], dtype=torch.bool, device=input_ids.device)
+
+class RowStopStrings(StoppingCriteria):
+    """
+    Finishes a row as soon as any of its stop strings appears in the text it has
+    generated. Only the last few tokens are decoded each step.
+    """
+    def __init__(self, tokenizer, prompt_len: int, stops: List[List[str]]):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.stops = stops
+        # Enough trailing tokens to contain the longest stop string plus a boundary
+        self.window = max([len(tokenizer.encode(x, add_special_tokens=False)) for row in stops for x in row] + [0]) + 2
+        self.hit = [False] * len(stops)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        for row, stops in enumerate(self.stops):
+            if stops and not self.hit[row]:
+                start = max(self.prompt_len, input_ids.shape[1] - self.window)
+                tail = self.tokenizer.decode(input_ids[row, start:], skip_special_tokens=True)
+                self.hit[row] = any(x in tail for x in stops)
+        return torch.tensor(self.hit, dtype=torch.bool, device=input_ids.device)
+
+class Cancelled(StoppingCriteria):
+    """Finishes every row once `event` is set, e.g. when nobody reads a streamed generation any more."""
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+def finish_completion(tokenizer, generated: List[int], limit: int, stops: List[str]) -> Dict:
+    """
+    Decodes one row's generated ids into {"text", "finish_reason", "tokens"}. The text is
+    cut before the earliest stop string; "length" means max_tokens ran out first.
+    Rows finished early are padded with pad/eos ids, which are not counted.
+    """
+    ids = list(generated[:limit])
+    ended = tokenizer.eos_token_id in ids or tokenizer.pad_token_id in ids
+    for special in (tokenizer.eos_token_id, tokenizer.pad_token_id):
+        if special in ids: ids = ids[:ids.index(special)]
+    text = tokenizer.decode(ids, skip_special_tokens=True)
+    cuts = [text.find(x) for x in stops if x and x in text]
+    if cuts:
+        return {"text": text[:min(cuts)].strip(), "finish_reason": "stop", "tokens": len(ids)}
+    return {"text": text.strip(), "finish_reason": "stop" if ended else "length", "tokens": len(ids)}
+
+class JsonSchemaMatcher:
+    """
+    Character-level prefix checker for compact JSON matching a flat object schema:
+    every property is required and emitted in declared order, values are boolean,
+    integer, number or string (optionally with "enum" or "maxLength").
+    """
+    TYPES = ("boolean", "integer", "number", "string")
+    # (complete value, valid prefix) patterns from the JSON grammar: no leading zeros or bare "."
+    INTEGER = (re.compile(r"-?(0|[1-9]\d*)"), re.compile(r"-?(0|[1-9]\d*)?"))
+    NUMBER = (
+        re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?"),
+        re.compile(r"-?((0|[1-9]\d*)(\.\d*|\.\d+[eE][+-]?\d*|[eE][+-]?\d*)?)?")
+    )
+    # Longest number accepted, so an unconstrained model cannot emit digits until max_tokens
+    NUMBER_MAX_CHARS = 16
+
+    def __init__(self, schema: Dict):
+        if schema.get("type") != "object" or not schema.get("properties"):
+            raise ValueError("Only object schemas with properties are supported")
+        self.props = list(schema["properties"].items())
+        for name, prop in self.props:
+            if prop.get("type") not in self.TYPES:
+                raise ValueError(f"Unsupported type for {name!r}: {prop.get('type')}")
+
+    @staticmethod
+    def _literal(text: str, pos: int, lit: str):
+        rest = text[pos:pos + len(lit)]
+        if rest == lit: return "ok", pos + len(lit), ""
+        if lit.startswith(rest) and pos + len(rest) == len(text): return "partial", pos, lit[len(rest):]
+        return "bad", pos, ""
+
+    @staticmethod
+    def _choice(text: str, pos: int, options: List[str]):
+        rest = text[pos:]
+        for option in options:
+            if rest.startswith(option): return "ok", pos + len(option), ""
+        partial = [o for o in options if o.startswith(rest)]
+        if not partial: return "bad", pos, ""
+        common = partial[0]
+        for o in partial[1:]:
+            while not o.startswith(common): common = common[:-1]
+        return "partial", pos, common[len(rest):]
+
+    @staticmethod
+    def _string(text: str, pos: int, max_length: Optional[int]):
+        if pos == len(text): return "partial", pos, '"'
+        if text[pos] != '"': return "bad", pos, ""
+        i, length = pos + 1, 0
+        while i < len(text):
+            c = text[i]
+            if c == '"': return "ok", i + 1, ""
+            if c == "\\":
+                if i + 1 == len(text): return "partial", pos, ""
+                if text[i + 1] not in '"\\/bfnrt': return "bad", pos, ""
+                i += 2
+            elif c < " " or c == "\ufffd":
+                return "bad", pos, ""
+            else:
+                i += 1
+            length += 1
+            if max_length is not None and length > max_length: return "bad", pos, ""
+        return "partial", pos, '"' if max_length is not None and length == max_length else ""
+
+    @classmethod
+    def _number(cls, text: str, pos: int, integer: bool):
+        allowed = "-0123456789" if integer else "-+0123456789.eE"
+        end = pos
+        while end < len(text) and text[end] in allowed: end += 1
+        value = text[pos:end]
+        complete, prefix = cls.INTEGER if integer else cls.NUMBER
+        if end < len(text):
+            return ("ok", end, "") if complete.fullmatch(value) else ("bad", pos, "")
+        # Still open: it must be able to end (one more character at most) within NUMBER_MAX_CHARS
+        needed = 0 if complete.fullmatch(value) else 1
+        if not prefix.fullmatch(value) or len(value) + needed > cls.NUMBER_MAX_CHARS: return "bad", pos, ""
+        return "partial", pos, ""
+
+    def scan(self, text: str) -> Tuple[bool, bool, str]:
+        """Returns (valid prefix, complete object, forced continuation)."""
+        pos = 0
+        steps = [("literal", "{")]
+        for i, (name, prop) in enumerate(self.props):
+            steps.append(("literal", ("," if i else "") + json.dumps(name) + ":"))
+            steps.append(("value", prop))
+        steps.append(("literal", "}"))
+        for kind, arg in steps:
+            if kind == "literal":
+                state, pos, forced = self._literal(text, pos, arg)
+            elif arg["type"] == "boolean":
+                state, pos, forced = self._choice(text, pos, ["true", "false"])
+            elif arg["type"] == "string" and "enum" in arg:
+                state, pos, forced = self._choice(text, pos, [json.dumps(o) for o in arg["enum"]])
+            elif arg["type"] == "string":
+                state, pos, forced = self._string(text, pos, arg.get("maxLength"))
+            else:
+                state, pos, forced = self._number(text, pos, arg["type"] == "integer")
+            if state == "bad": return False, False, ""
+            if state == "partial": return True, False, forced
+        return pos == len(text), pos == len(text), ""
+
+_vocab_cache: Dict[int, Tuple[List[str], Dict[str, int]]] = {}
+
+def _vocab_strings(tokenizer) -> Tuple[List[str], Dict[str, int]]:
+    """Every token id decoded on its own (special tokens as ""), plus a string -> id lookup (built once per tokenizer)."""
+    key = id(tokenizer)
+    if key not in _vocab_cache:
+        strings = [tokenizer.decode([i], skip_special_tokens=True) for i in range(len(tokenizer))]
+        lookup = {}
+        for i, s in enumerate(strings):
+            if s and s not in lookup: lookup[s] = i
+        _vocab_cache[key] = (strings, lookup)
+    return _vocab_cache[key]
+
+def prepare_json_schema(tokenizer):
+    """Builds the token table RowJsonSchema needs (seconds for a large vocabulary), e.g. at model load."""
+    _vocab_strings(tokenizer)
+
+class RowJsonSchema(LogitsProcessor):
+    """
+    Masks each constrained row to tokens that keep its output a valid prefix of its
+    schema. Skeleton text (braces, keys, fixed enum prefixes) is forced directly;
+    free values are picked from the `top_k` most likely tokens that fit, falling back
+    to single characters. Once the object closes only EOS is allowed.
+    """
+    def __init__(self, tokenizer, prompt_len: int, schemas: List[Optional[Dict]], top_k: int = 64):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.matchers = [JsonSchemaMatcher(s) if s else None for s in schemas]
+        self.top_k = top_k
+        self.strings, self.lookup = _vocab_strings(tokenizer)
+        self.fallback = [self.lookup[c] for c in string.printable if c in self.lookup]
+
+    def _allowed(self, matcher: JsonSchemaMatcher, text: str, scores) -> List[int]:
+        ok, complete, forced = matcher.scan(text)
+        if complete or not ok:
+            return [self.tokenizer.eos_token_id]
+        if forced:
+            for end in range(len(forced), 0, -1):
+                if forced[:end] in self.lookup: return [self.lookup[forced[:end]]]
+        candidates = scores.topk(min(self.top_k, scores.shape[-1])).indices.tolist()
+        allowed = [i for i in candidates if self.strings[i] and matcher.scan(text + self.strings[i])[0]]
+        return allowed or [i for i in self.fallback if matcher.scan(text + self.strings[i])[0]]
+
+    def __call__(self, input_ids, scores):
+        if not any(self.matchers): return scores
+        scores = scores.clone()
+        for row, matcher in enumerate(self.matchers):
+            if matcher is None: continue
+            text = self.tokenizer.decode(input_ids[row, self.prompt_len:], skip_special_tokens=True)
+            allowed = self._allowed(matcher, text, scores[row])
+            mask = torch.full_like(scores[row], -float("inf"))
+            mask[allowed] = 0.0
+            scores[row] = scores[row] + mask
+        return scores
+
+def _cache_bytes(cache) -> int:
+    layers = getattr(cache, "layers", None)
+    if layers is not None:
+        tensors = [t for layer in layers for t in (layer.keys, layer.values)]
+    else:
+        tensors = list(cache.key_cache) + list(cache.value_cache)
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+class PrefixCache:
+    """
+    LRU cache of past key/values for prompt prefixes, bounded by `budget_bytes`.
+    Prompts are hashed in chained blocks of `block_size` tokens, and every block
+    boundary is indexed, so a new prompt can reuse any entry it shares leading
+    blocks with (the copy is cropped to the shared length). Callers get their own
+    copy because generate() extends the cache in place.
+    """
+    def __init__(self, budget_bytes: int, block_size: int):
+        self.budget_bytes = budget_bytes
+        self.block_size = block_size
+        self.entries: "OrderedDict[str, Tuple[DynamicCache, int, List[str]]]" = OrderedDict()
+        self.block_index: Dict[str, str] = {}
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "reused_tokens": 0, "prefilled_tokens": 0}
+        self._lock = threading.Lock()
+
+    def _block_hashes(self, ids: List[int]) -> List[str]:
+        hashes, h = [], hashlib.sha1()
+        for end in range(self.block_size, len(ids) + 1, self.block_size):
+            h.update(",".join(map(str, ids[end - self.block_size:end])).encode() + b";")
+            hashes.append(h.hexdigest())
+        return hashes
+
+    def _lookup(self, hashes: List[str]) -> Tuple[int, Optional[DynamicCache]]:
+        with self._lock:
+            for i in reversed(range(len(hashes))):
+                key = self.block_index.get(hashes[i])
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    cached = self.entries[key][0]
+                    break
+            else:
+                return 0, None
+        reused = (i + 1) * self.block_size
+        cache = copy.deepcopy(cached)
+        # Negative: drop that many trailing tokens (positive lengths are deprecated)
+        if cache.get_seq_length() > reused: cache.crop(reused - cache.get_seq_length())
+        return reused, cache
+
+    def _store(self, hashes: List[str], cache: DynamicCache):
+        key = hashes[-1]
+        entry = copy.deepcopy(cache)
+        size = _cache_bytes(entry)
+        if size > self.budget_bytes: return
+        with self._lock:
+            if key in self.entries: return
+            self.entries[key] = (entry, size, hashes)
+            self.total_bytes += size
+            for h in hashes: self.block_index[h] = key
+            while self.total_bytes > self.budget_bytes:
+                old_key, (_, old_size, old_hashes) = self.entries.popitem(last=False)
+                self.total_bytes -= old_size
+                for h in old_hashes:
+                    if self.block_index.get(h) == old_key: del self.block_index[h]
+
+    def prefill(self, model, ids: List[int]) -> Optional[DynamicCache]:
+        """
+        Returns a cache covering the longest block-aligned prefix of `ids` (leaving at
+        least one token for generate() to process), reusing cached blocks where possible.
+        """
+        target = ((len(ids) - 1) // self.block_size) * self.block_size
+        if target == 0: return None
+        hashes = self._block_hashes(ids[:target])
+        reused, cache = self._lookup(hashes)
+        self.stats["hits" if reused else "misses"] += 1
+        self.stats["reused_tokens"] += reused
+        if reused < target:
+            cache = cache if cache is not None else DynamicCache()
+            device = next(model.parameters()).device
+            with torch.no_grad():
+                model(input_ids=torch.tensor([ids[reused:target]], device=device), past_key_values=cache, use_cache=True)
+            self.stats["prefilled_tokens"] += target - reused
+            self._store(hashes, cache)
+        return cache
+
+def shared_prefix_length(prompts: List[List[int]]) -> int:
+    """Number of leading token ids all prompts have in common."""
+    first, n = prompts[0], min(len(p) for p in prompts)
+    for i in range(n):
+        if any(p[i] != first[i] for p in prompts): return i
+    return n
+
+def generate_batch(model, tokenizer, requests: List[Dict], prefix_cache: Optional[PrefixCache] = None) -> List[Dict]:
+    """
+    Runs one left-padded generate() over several requests, each a dict with
+    "prompt" (token ids), "max_tokens", "temperature" and optionally "stop" (strings)
+    and "json_schema" (decoding is constrained to JSON matching it; see RowJsonSchema).
+    Returns one finish_completion() dict per request. Each row stops decoding at its
+    own stop strings; the batch ends when every row has stopped.
+    With `prefix_cache`, the prompt prefix every row shares (e.g. the interviewer system
+    prompt, or a lone request's whole prompt) resumes from cached key/values; the rest
+    of each prompt is left-padded after that prefix rather than before the prompt.
+    """
+    device = next(model.parameters()).device
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    prompts = [r["prompt"] for r in requests]
+    max_tokens = [r["max_tokens"] for r in requests]
+    stops = [r.get("stop") or [] for r in requests]
+    width = max(len(p) for p in prompts)
+
+    past, shared = None, 0
+    if prefix_cache is not None:
+        # Every row keeps at least one uncached token for generate() to process
+        limit = min(shared_prefix_length(prompts), min(len(p) for p in prompts) - 1)
+        past = prefix_cache.prefill(model, prompts[0][:limit + 1])
+        if past is not None:
+            shared = past.get_seq_length()
+            if len(prompts) > 1: past.batch_repeat_interleave(len(prompts))
+
+    # Padding goes between the shared (cached) prefix and each row's own suffix; attention
+    # mask positions keep every row's suffix numbered straight after the prefix
+    ids = torch.tensor([p[:shared] + [pad_id] * (width - len(p)) + p[shared:] for p in prompts], device=device)
+    mask = torch.tensor([[1] * shared + [0] * (width - len(p)) + [1] * (len(p) - shared) for p in prompts], device=device)
+
+    processors = [RowTemperature([r["temperature"] for r in requests])]
+    schemas = [r.get("json_schema") for r in requests]
+    if any(schemas):
+        # Schema masking first so greedy rows pick the best *valid* token
+        processors.insert(0, RowJsonSchema(tokenizer, width, schemas))
+
+    with torch.no_grad():
+        output = model.generate(
+            input_ids=ids,
+            attention_mask=mask,
+            past_key_values=past,
+            max_new_tokens=max(max_tokens),
+            do_sample=True,
+            temperature=1.0,  # Real per-row temperatures are applied by RowTemperature
+            logits_processor=LogitsProcessorList(processors),
+            stopping_criteria=StoppingCriteriaList([RowMaxTokens(width, max_tokens), RowStopStrings(tokenizer, width, stops)]),
+            pad_token_id=pad_id,
+            eos_token_id=tokenizer.eos_token_id
+        )
+
+    return [
+        finish_completion(tokenizer, row[width:].tolist(), limit, row_stops)
+        for row, limit, row_stops in zip(output, max_tokens, stops)
+    ]
+
+class MicroBatcher:
+    """
+    Collects requests submitted from concurrent threads for up to `max_wait_ms`
+    (or until `max_batch_size` are waiting) and hands them to `run_batch` together.
+    `submit` blocks until that request's own result is ready.
+    """
+    def __init__(self, run_batch: Callable[[List[Dict]], List], max_batch_size: int, max_wait_ms: float):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, request: Dict):
+        future = Future()
+        self._queue.put((request, future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.run_batch([request for request, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
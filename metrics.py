@@ -0,0 +1,107 @@
+# metrics.py
+# Latency and size metrics for interview graph nodes and ModalClient calls, plus prompt
+# token counts from context.py, exported in Prometheus format (app.py serves them at
+# METRICS_PATH). Timings taken during a turn started with start_turn() are also collected
+# for that turn's breakdown.
+import functools
+import time
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+NODE_SECONDS = Histogram(
+    "interview_node_seconds", "Time spent in each interview graph node", ["node"], buckets=LATENCY_BUCKETS
+)
+CALL_SECONDS = Histogram(
+    "interview_client_call_seconds", "ModalClient method latency, retries and cache hits included",
+    ["method", "outcome"], buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "interview_backend_request_seconds", "One HTTP attempt against the backend", ["endpoint", "status"],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_BYTES = Histogram("interview_backend_request_bytes", "Backend request body size", ["endpoint"], buckets=SIZE_BUCKETS)
+RESPONSE_BYTES = Histogram("interview_backend_response_bytes", "Backend response body size", ["endpoint"], buckets=SIZE_BUCKETS)
+TOKENS = Counter("interview_llm_tokens_total", "Tokens generated by the LLM backend", ["endpoint", "finish_reason"])
+RETRIES = Counter("interview_backend_retries_total", "Backend attempts that were retried", ["endpoint", "reason"])
+FAILURES = Counter("interview_backend_failures_total", "Backend calls that gave up", ["endpoint", "reason"])
+PROMPT_TOKENS = Histogram(
+    "interview_prompt_tokens", "Prompt size after context budgeting (see context.py)", ["call"], buckets=TOKEN_BUCKETS
+)
+TRIMMED_TOKENS = Counter(
+    "interview_prompt_trimmed_tokens_total", "History tokens left out of prompts or digested to fit the budget", ["call"]
+)
+
+# (name, seconds) timings of the current turn; None outside a turn
+_turn: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("turn_timings", default=None)
+
+def start_turn() -> List[Tuple[str, float]]:
+    """Starts collecting this task's (and its child tasks') timings; returns the list they go into."""
+    timings: List[Tuple[str, float]] = []
+    _turn.set(timings)
+    return timings
+
+def note(name: str, seconds: float):
+    timings = _turn.get()
+    if timings is not None: timings.append((name, seconds))
+
+def format_turn(timings: List[Tuple[str, float]]) -> str:
+    """
+    One line per node or call name, in the order they first finished. Repeated calls
+    (e.g. one TTS call per sentence, often concurrent) show the slowest, count and sum.
+    """
+    grouped = {}
+    for name, seconds in timings:
+        grouped.setdefault(name, []).append(seconds)
+    lines = []
+    for name, values in grouped.items():
+        line = f"{name}: {max(values):.2f}s"
+        if len(values) > 1: line += f" (x{len(values)}, {sum(values):.2f}s total)"
+        lines.append(line)
+    return "\n".join(lines)
+
+def failure_reason(error: BaseException) -> str:
+    return type(error).__name__
+
+def timed_node(name: str, node: Callable) -> Callable:
+    """Wraps an async graph node; the signature is kept so LangGraph still passes config."""
+    @functools.wraps(node)
+    async def run(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await node(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            NODE_SECONDS.labels(name).observe(seconds)
+            note(name, seconds)
+    return run
+
+def timed_call(method: str, seconds: float, outcome: str = "ok"):
+    CALL_SECONDS.labels(method, outcome).observe(seconds)
+    note(method, seconds)
+
+def timed(method: str) -> Callable:
+    """
+    Decorates an async ModalClient method to record its latency, with outcome "ok", or
+    "failed" when it raised or returned an empty result (the methods return ""/None on errors).
+    """
+    def wrap(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def run(*args, **kwargs):
+            start, outcome = time.perf_counter(), "failed"
+            try:
+                result = await fn(*args, **kwargs)
+                if result: outcome = "ok"
+                return result
+            finally:
+                timed_call(method, time.perf_counter() - start, outcome)
+        return run
+    return wrap
+
+def render() -> Tuple[bytes, str]:
+    """(body, content type) for the metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,186 @@
+# mock_backend.py
+# Local stand-in for the Modal backend (interview_trainer_app.fastapi_app) for load tests.
+# Same routes, payloads and admission control (429 + Retry-After), no models: replies are
+# filler text of realistic size, after a sampled delay, with a configurable share of injected 503s. Point the client at it with
+# MODAL_BASE_URL=http://127.0.0.1:8800, or let `python benchmarks.py load` start it.
+#
+#   python mock_backend.py --port 8800 --latency-scale 0.5 --error-rate 0.02 --capacity-scale 0.25
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter
+from typing import Dict
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import JSONResponse, Response
+from admission import AdmittedStream, Overloaded, make_gates
+from stt_engine import SAMPLE_RATE, decode_audio
+from config import (
+    MOCK_LATENCY_MS, MOCK_LLM_MS_PER_TOKEN, MOCK_LLM_FILL, MOCK_ERROR_RATE, MOCK_TTS_BYTES_PER_CHAR,
+    TTS_MIME_TYPES, ADMISSION_CAPACITY, ADMISSION_QUEUE_DEPTH, ADMISSION_MAX_RETRY_AFTER
+)
+
+WORDS = (
+    "the service cache shard latency request database index queue worker retry design "
+    "trade-off consistency throughput memory replica partition client API schema test deploy"
+).split()
+
+settings = {
+    "latency_scale": 1.0,
+    "error_rate": dict(MOCK_ERROR_RATE),
+    "tts_bytes_per_char": MOCK_TTS_BYTES_PER_CHAR
+}
+# "<route>.calls", "<route>.errors" and "<route>.rejected" (plus "tts.bytes_out", "stt.bytes_in"
+# and "stt.decode_us"), served at /stats
+stats: Counter = Counter()
+gates = make_gates(ADMISSION_CAPACITY, ADMISSION_QUEUE_DEPTH, ADMISSION_MAX_RETRY_AFTER)
+
+def sample_delay(endpoint: str) -> float:
+    """Seconds, lognormal with the endpoint's configured median and p99."""
+    median, p99 = MOCK_LATENCY_MS[endpoint]
+    sigma = math.log(p99 / median) / 2.326
+    return random.lognormvariate(math.log(median), sigma) * settings["latency_scale"] / 1000
+
+def filler(words: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(max(1, words))).capitalize()
+
+def fill_schema(schema: Dict) -> Dict:
+    values = {}
+    for name, prop in schema.get("properties", {}).items():
+        if "enum" in prop: values[name] = random.choice(prop["enum"])
+        elif prop["type"] == "boolean": values[name] = random.random() < 0.2
+        elif prop["type"] == "integer": values[name] = random.randint(0, 10)
+        elif prop["type"] == "number": values[name] = round(random.random(), 3)
+        else: values[name] = filler(12)[:prop.get("maxLength", 200)]
+    return values
+
+def llm_reply(payload: Dict) -> str:
+    response_format = payload.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return json.dumps(fill_schema(response_format["schema"]), separators=(",", ":"))
+    max_tokens = payload.get("max_tokens", 512)
+    # Intent checks ask for a one-word label
+    if max_tokens <= 10: return "VALID"
+    words = int(max_tokens * 0.75 * random.uniform(*MOCK_LLM_FILL))
+    return filler(words) + "?"
+
+async def admit(endpoint: str, route: str) -> float:
+    stats[f"{route}.calls"] += 1
+    try:
+        return await gates[endpoint].acquire()
+    except Overloaded:
+        stats[f"{route}.rejected"] += 1
+        raise
+
+def maybe_fail(endpoint: str, route: str):
+    if random.random() < settings["error_rate"][endpoint]:
+        stats[f"{route}.errors"] += 1
+        raise HTTPException(status_code=503, detail="Injected failure")
+
+async def serve(endpoint: str, extra_seconds: float = 0.0):
+    """Waits out the sampled latency in one of the pool's slots, then fails with the configured probability."""
+    started = await admit(endpoint, endpoint)
+    try:
+        await asyncio.sleep(sample_delay(endpoint) + extra_seconds)
+    finally:
+        gates[endpoint].release(started)
+    maybe_fail(endpoint, endpoint)
+
+fastapi_app = FastAPI()
+
+@fastapi_app.exception_handler(Overloaded)
+async def overloaded(request, exc: Overloaded):
+    return JSONResponse({"detail": str(exc)}, status_code=429, headers={"Retry-After": str(exc.retry_after)})
+
+@fastapi_app.get("/queue")
+async def queue():
+    return {pool: gate.snapshot() for pool, gate in gates.items()}
+
+@fastapi_app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+@fastapi_app.get("/ready")
+async def ready():
+    return {"ready": True, "models": {name: "ready" for name in ("llm", "tts", "stt", "stt_cpu")}}
+
+@fastapi_app.post("/warm")
+async def warm(payload: dict):
+    stats["warm.calls"] += 1
+    return {"min_containers": payload}
+
+@fastapi_app.get("/stats")
+async def get_stats():
+    return dict(stats)
+
+@fastapi_app.post("/stt")
+async def stt(file: UploadFile = File(...)):
+    # Uploads are decoded like the real route does; the transcript has ~2.5 words per second of audio
+    audio = await file.read()
+    stats["stt.bytes_in"] += len(audio)
+    started = time.perf_counter()
+    try:
+        samples = await asyncio.to_thread(decode_audio, audio)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Undecodable audio")
+    stats["stt.decode_us"] += int((time.perf_counter() - started) * 1e6)
+    await serve("stt")
+    return {"text": filler(int(len(samples) / SAMPLE_RATE * 2.5))}
+
+@fastapi_app.post("/llm")
+async def llm(payload: dict):
+    text = llm_reply(payload)
+    tokens = max(1, len(text.split()) * 4 // 3)
+    await serve("llm", tokens * MOCK_LLM_MS_PER_TOKEN * settings["latency_scale"] / 1000)
+    return {"response": text, "finish_reason": "stop", "tokens": tokens}
+
+@fastapi_app.post("/llm/stream")
+async def llm_stream(payload: dict):
+    text = llm_reply(payload)
+    words = text.split()
+    # One slot from before the first token until the stream ends
+    started = await admit("llm", "llm_stream")
+    try:
+        await asyncio.sleep(sample_delay("llm"))
+        maybe_fail("llm", "llm_stream")
+    except BaseException:
+        gates["llm"].release(started)
+        raise
+
+    async def ndjson():
+        for i, word in enumerate(words):
+            await asyncio.sleep(MOCK_LLM_MS_PER_TOKEN * 4 / 3 * settings["latency_scale"] / 1000)
+            yield json.dumps({"token": word if i == 0 else " " + word}) + "\n"
+        yield json.dumps({"done": True, "finish_reason": "stop", "tokens": len(words) * 4 // 3}) + "\n"
+    return AdmittedStream(gates["llm"], started, ndjson(), media_type="application/x-ndjson")
+
+@fastapi_app.post("/tts")
+async def tts(payload: dict):
+    fmt = payload.get("format", "wav")
+    if fmt not in TTS_MIME_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    await serve("tts")
+    size = len(payload.get("text", "")) * settings["tts_bytes_per_char"]
+    stats["tts.bytes_out"] += size
+    return Response(content=bytes(size), media_type=TTS_MIME_TYPES[fmt])
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Local mock of the Modal interview backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplies every configured latency")
+    parser.add_argument("--error-rate", type=float, default=None, help="Overrides MOCK_ERROR_RATE for all endpoints")
+    parser.add_argument("--tts-bytes-per-char", type=int, default=MOCK_TTS_BYTES_PER_CHAR)
+    parser.add_argument("--capacity-scale", type=float, default=1.0, help="Multiplies ADMISSION_CAPACITY and ADMISSION_QUEUE_DEPTH")
+    args = parser.parse_args()
+
+    scale = lambda sizes: {pool: max(1, round(n * args.capacity_scale)) for pool, n in sizes.items()}
+    gates.update(make_gates(scale(ADMISSION_CAPACITY), scale(ADMISSION_QUEUE_DEPTH), ADMISSION_MAX_RETRY_AFTER))
+    settings["latency_scale"] = args.latency_scale
+    settings["tts_bytes_per_char"] = args.tts_bytes_per_char
+    if args.error_rate is not None:
+        settings["error_rate"] = {name: args.error_rate for name in MOCK_ERROR_RATE}
+    uvicorn.run(fastapi_app, host=args.host, port=args.port, log_level="warning")
@@ -1,8 +1,20 @@
 # prompts.py
 
+# --- Fixed interviewer phrases (pre-synthesized by speech.prewarm at startup) ---
+GREETING_MESSAGE = "Hello! I am your AI Interviewer. What role are you applying for?"
+ASK_LEVEL_MESSAGE = "Choose your difficulty: Easy, Medium, or Hard."
+OFF_TOPIC_MESSAGE = "Let's stay focused on the interview. Please answer the previous question."
+REPORT_READY_MESSAGE = "Here is your feedback report."
+FALLBACK_QUESTION = "Could you elaborate on that?"
+
+CANONICAL_TTS_PHRASES = [
+    GREETING_MESSAGE, ASK_LEVEL_MESSAGE, OFF_TOPIC_MESSAGE, REPORT_READY_MESSAGE, FALLBACK_QUESTION
+]
+
+# Stable instructions come first and the per-turn fields ({role}, {phase}, {context})
+# last, so every turn shares one token prefix the LLM server can reuse from its KV cache.
 SYSTEM_PROMPT_INTERVIEWER = """
-You are a professional technical interviewer evaluating a {role}. 
-Current Phase: {phase}
+You are a professional technical interviewer.
 
 CRITICAL INSTRUCTIONS:
 1. Ask EXACTLY ONE clear, practical question based ONLY on the context provided below or the candidate's previous answers.
@@ -22,6 +34,9 @@ Bad Question Examples:
 - "Explain the philosophical underpinnings of object-oriented programming."
 - "Recite the specifications of the latest JavaScript update."
 
+Candidate is interviewing for: {role}
+Current Phase: {phase}
+
 Context:
 {context}
 """
@@ -57,6 +72,17 @@ Output ONLY valid JSON:
 {{"rating": "Needs Improvement/Good/Excellent", "feedback": "Short critique", "is_struggling": true, "should_probe": true}}
 """
 
+# Enforced server-side while decoding the analyzer's reply (see llm_engine.RowJsonSchema)
+ANALYZER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rating": {"type": "string", "enum": ["Needs Improvement", "Good", "Excellent"]},
+        "feedback": {"type": "string", "maxLength": 200},
+        "is_struggling": {"type": "boolean"},
+        "should_probe": {"type": "boolean"}
+    }
+}
+
 FEEDBACK_GENERATOR_PROMPT = """
 You are a Senior Hiring Manager writing a final report.
 Based on these interview notes, generate a detailed Markdown report.
@@ -83,6 +109,58 @@ REQUIRED STRUCTURE:
 (HIRE / NO HIRE / HOLD - with justification.)
 """
 
+# Running per-section feedback, updated in the background after every answer (feedback.py)
+FEEDBACK_SECTION_PROMPT = """You are keeping running notes on a candidate for the "{section}" section of an interview report.
+
+Current notes:
+{summary}
+
+New evidence from the latest answer:
+{note}
+
+Rewrite the notes to include the new evidence. Keep them under 120 words, in one paragraph. Output ONLY the notes."""
+
+# Final report built from the precomputed sections
+FEEDBACK_MERGE_PROMPT = """
+You are a Senior Hiring Manager writing a final report for a {role} candidate.
+Write a detailed Markdown report from these section notes.
+
+TECHNICAL NOTES:
+{technical}
+
+PROJECT NOTES:
+{projects}
+
+COMMUNICATION NOTES:
+{communication}
+
+REQUIRED STRUCTURE:
+# Interview Report
+
+## 1. Executive Summary
+(3-4 sentences summarizing overall fit.)
+
+## 2. Technical Knowledge
+(Analyze technical depth.)
+
+## 3. Project Experience
+(Evaluate complexity of projects.)
+
+## 4. Communication
+(Assess clarity.)
+
+## 5. Final Recommendation
+(HIRE / NO HIRE / HOLD - with justification.)
+"""
+
+RESUME_CHUNK_SUMMARY_PROMPT = """Summarize the key skills and experiences in this section of a resume:
+
+{chunk}"""
+
+RESUME_COMBINE_PROMPT = """Combine these summaries into a single, coherent overview of the candidate's skills and project history:
+
+{summaries}"""
+
 # --- Example Questions (for reference, not used directly) ---
 
 # Project Questions
@@ -0,0 +1,36 @@
+// Plays an interviewer reply's sentence clips back to back (see app.speak). Clips are named
+// "<kind>_<reply>_<part>.<ext>" and only part 0 auto-plays; when a clip ends, the next part
+// of the same reply plays, or plays as soon as it arrives if it is still being synthesized.
+(function () {
+  const CLIP = /^(\w+_[0-9a-f]+)_(\d+)(\.\w+)$/;
+  const WAIT_MS = 60000;    // A reply's last clip has no next part; stop looking after this
+  let waiting = null;       // {name, until}: the clip to play as soon as it is rendered
+
+  function clipName(audio) {
+    // Chainlit renders the element name as text next to the <audio> tag
+    return (audio.parentElement ? audio.parentElement.textContent : "").trim();
+  }
+
+  function play(name) {
+    const audio = Array.from(document.querySelectorAll("audio")).find((a) => clipName(a) === name);
+    if (!audio) {
+      if (!waiting) waiting = { name, until: Date.now() + WAIT_MS };
+      return;
+    }
+    waiting = null;
+    audio.play().catch(() => {});
+  }
+
+  // "ended" does not bubble, so listen in the capture phase
+  document.addEventListener("ended", (event) => {
+    if (!(event.target instanceof HTMLAudioElement)) return;
+    const match = CLIP.exec(clipName(event.target));
+    if (match) play(`${match[1]}_${Number(match[2]) + 1}${match[3]}`);
+  }, true);
+
+  new MutationObserver(() => {
+    if (!waiting) return;
+    if (Date.now() > waiting.until) waiting = null;
+    else play(waiting.name);
+  }).observe(document.body, { childList: true, subtree: true });
+})();
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+from prompts import RESUME_CHUNK_SUMMARY_PROMPT, RESUME_COMBINE_PROMPT
+from config import RESUME_CACHE_DIR, RESUME_CACHE_MAX_BYTES, RESUME_CHUNK_SIZE, RESUME_CHUNK_OVERLAP
+
+def _cache_version() -> str:
+    # Anything that changes the summaries invalidates old entries
+    h = hashlib.sha256()
+    for part in (RESUME_CHUNK_SUMMARY_PROMPT, RESUME_COMBINE_PROMPT, str(RESUME_CHUNK_SIZE), str(RESUME_CHUNK_OVERLAP)):
+        h.update(part.encode("utf-8") + b"\0")
+    return h.hexdigest()[:12]
+
+CACHE_VERSION = _cache_version()
+
+def resume_key(pdf_bytes: bytes) -> str:
+    return f"{hashlib.sha256(pdf_bytes).hexdigest()}-{CACHE_VERSION}"
+
+def _path(key: str) -> str:
+    return os.path.join(RESUME_CACHE_DIR, f"{key}.json")
+
+def get(key: str) -> Optional[Dict]:
+    """Returns {"resume_text", "chunk_summaries", "resume_summary"} or None."""
+    path = _path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        os.utime(path)  # mtime doubles as the LRU timestamp
+        return entry
+    except (OSError, ValueError):
+        return None
+
+def put(key: str, entry: Dict):
+    os.makedirs(RESUME_CACHE_DIR, exist_ok=True)
+    tmp = f"{_path(key)}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(tmp, _path(key))
+    evict()
+
+def evict(max_bytes: int = RESUME_CACHE_MAX_BYTES):
+    """Drops least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    for name in os.listdir(RESUME_CACHE_DIR):
+        if not name.endswith(".json"): continue
+        try:
+            st = os.stat(os.path.join(RESUME_CACHE_DIR, name))
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes: break
+        try:
+            os.remove(os.path.join(RESUME_CACHE_DIR, name))
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,123 @@
+# sessions.py
+# Interview state persisted by a LangGraph SQLite checkpointer, keyed by the Chainlit
+# thread id. WAL mode lets several Chainlit worker processes on the host share the file,
+# and a restarted worker picks up any interview from its last checkpoint.
+import os
+import time
+from typing import Dict, Optional, Tuple
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from graph import workflow
+from config import SESSION_DB_PATH, SESSION_TTL_HOURS, SESSION_KEEP_CHECKPOINTS
+
+_saver: Optional[AsyncSqliteSaver] = None
+# The interview graph compiled with the checkpointer, set by open()
+app_graph = None
+
+async def open(path: str = SESSION_DB_PATH):
+    global _saver, app_graph
+    if _saver is not None:
+        return
+    if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = await aiosqlite.connect(path)
+    # Other workers may hold the write lock briefly; wait for it instead of failing
+    await conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA busy_timeout=5000;
+        CREATE TABLE IF NOT EXISTS thread_activity (
+            thread_id TEXT PRIMARY KEY,
+            updated_at REAL NOT NULL
+        );
+    """)
+    await conn.commit()
+    _saver = AsyncSqliteSaver(conn)
+    await _saver.setup()
+    app_graph = workflow.compile(checkpointer=_saver)
+
+async def close():
+    global _saver, app_graph
+    if _saver is not None:
+        await _saver.conn.close()
+    _saver = app_graph = None
+
+def config(thread_id: str, **configurable) -> Dict:
+    return {"configurable": {"thread_id": thread_id, **configurable}}
+
+async def load(thread_id: str) -> Optional[Dict]:
+    """Latest checkpointed state for the thread, or None if it has none."""
+    await open()
+    snapshot = await app_graph.aget_state(config(thread_id))
+    return snapshot.values or None
+
+async def pending(thread_id: str) -> bool:
+    """
+    True if the thread's last turn stopped partway (a node raised, e.g. BackendBusy): its
+    input is already checkpointed, and invoking the graph with None finishes it.
+    """
+    await open()
+    snapshot = await app_graph.aget_state(config(thread_id))
+    return bool(snapshot.next)
+
+async def touch(thread_id: str):
+    """Marks the thread active so compact() keeps it."""
+    await open()
+    async with _saver.lock:
+        await _saver.conn.execute(
+            "INSERT INTO thread_activity (thread_id, updated_at) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+            (thread_id, time.time())
+        )
+        await _saver.conn.commit()
+
+async def active_count(window_seconds: float) -> int:
+    """Threads touched in the last `window_seconds`, across every worker sharing the store."""
+    await open()
+    async with _saver.lock:
+        async with _saver.conn.execute(
+            "SELECT COUNT(*) FROM thread_activity WHERE updated_at >= ?", (time.time() - window_seconds,)
+        ) as cur:
+            (count,) = await cur.fetchone()
+    return count
+
+async def forget(thread_id: str):
+    await open()
+    async with _saver.lock:
+        for table in ("writes", "checkpoints", "thread_activity"):
+            await _saver.conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        await _saver.conn.commit()
+
+async def compact() -> Tuple[int, int]:
+    """
+    Drops threads idle for more than SESSION_TTL_HOURS, and all but the newest
+    SESSION_KEEP_CHECKPOINTS checkpoints (and their writes) of the rest.
+    Returns (threads removed, checkpoints removed).
+    """
+    await open()
+    cutoff = time.time() - SESSION_TTL_HOURS * 3600
+    async with _saver.lock:
+        conn = _saver.conn
+        async with conn.execute("SELECT thread_id FROM thread_activity WHERE updated_at < ?", (cutoff,)) as cur:
+            idle = [row[0] for row in await cur.fetchall()]
+        for table in ("writes", "checkpoints", "thread_activity"):
+            await conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in idle])
+
+        # Checkpoint ids are time-ordered, so the newest sort last
+        cur = await conn.execute("""
+            DELETE FROM checkpoints WHERE (thread_id, checkpoint_ns, checkpoint_id) IN (
+                SELECT thread_id, checkpoint_ns, checkpoint_id FROM (
+                    SELECT thread_id, checkpoint_ns, checkpoint_id, ROW_NUMBER() OVER (
+                        PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                    ) AS newest
+                    FROM checkpoints
+                ) WHERE newest > ?
+            )
+        """, (SESSION_KEEP_CHECKPOINTS,))
+        removed = cur.rowcount
+        await conn.execute("""
+            DELETE FROM writes WHERE (thread_id, checkpoint_ns, checkpoint_id) NOT IN (
+                SELECT thread_id, checkpoint_ns, checkpoint_id FROM checkpoints
+            )
+        """)
+        await conn.commit()
+    return len(idle), removed
@@ -0,0 +1,44 @@
+import asyncio
+import re
+from typing import AsyncIterator, List
+from api_client import ModalClient
+from config import TTS_PIPELINE_CONCURRENCY, TTS_MIN_SENTENCE_CHARS
+
+def split_sentences(text: str) -> List[str]:
+    """Splits on sentence punctuation, merging tiny fragments so each clip is worth a request."""
+    sentences = []
+    pending = ""
+    for part in re.split(r'(?<=[.!?])\s+', (text or "").strip()):
+        pending = f"{pending} {part}".strip() if pending else part.strip()
+        if len(pending) >= TTS_MIN_SENTENCE_CHARS:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        if sentences: sentences[-1] = f"{sentences[-1]} {pending}"
+        else: sentences.append(pending)
+    return sentences
+
+async def synthesize_sentences(text: str) -> AsyncIterator[bytes]:
+    """
+    Synthesizes every sentence concurrently (at most TTS_PIPELINE_CONCURRENCY at once)
+    and yields the clips in order, each as soon as it and all earlier ones are ready.
+    """
+    limit = asyncio.Semaphore(TTS_PIPELINE_CONCURRENCY)
+
+    async def synthesize(sentence: str) -> bytes:
+        async with limit:
+            return await ModalClient.tts(sentence)
+
+    tasks = [asyncio.create_task(synthesize(s)) for s in split_sentences(text)]
+    try:
+        for task in tasks:
+            audio = await task
+            if audio: yield audio
+    finally:
+        # Consumer stopped early (e.g. session closed): drop the rest
+        for task in tasks: task.cancel()
+
+async def prewarm(phrases: List[str]):
+    """Synthesizes fixed phrases sentence by sentence, matching the cache keys speak() will hit."""
+    sentences = {s for phrase in phrases for s in split_sentences(phrase)}
+    await asyncio.gather(*(ModalClient.tts(s) for s in sentences))
@@ -0,0 +1,85 @@
+# stt_engine.py
+# Speech-to-text backends used by the STT pools in interview_trainer_app.py. Nothing
+# here depends on Modal. Audio travels from the API container as mono int16 PCM at 16 kHz
+# (half the size of float32) and BackendPool converts it to the float32 the backends take.
+import threading
+from typing import Dict
+from config import STT_ENGINE, STT_SHORT_MAX_SECONDS, STT_SHORT_MODEL, STT_LONG_MODEL, STT_COMPUTE_TYPE
+
+SAMPLE_RATE = 16000
+
+def decode_audio(audio_bytes: bytes, sample_rate: int = SAMPLE_RATE):
+    """
+    Returns mono int16 samples at `sample_rate` without touching disk. 16 kHz
+    WAV/FLAC is read directly with soundfile; anything else is piped through ffmpeg.
+    Blocking (file parsing, a subprocess): async callers run it in a thread.
+    """
+    import io
+    import subprocess
+    import numpy as np
+    import soundfile as sf
+
+    try:
+        audio, rate = sf.read(io.BytesIO(audio_bytes), dtype="int16", always_2d=True)
+        if rate == sample_rate:
+            if audio.shape[1] == 1: return audio[:, 0]
+            return audio.mean(axis=1).astype(np.int16)
+    except Exception:
+        pass
+
+    out = subprocess.run(
+        ["ffmpeg", "-nostdin", "-threads", "0", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "pipe:1"],
+        input=audio_bytes, capture_output=True, check=True
+    ).stdout
+    return np.frombuffer(out, np.int16)
+
+class WhisperBackend:
+    """openai-whisper; fp16 on GPU, falling back to fp32 if the kernel refuses."""
+    def __init__(self, model_name: str, device: str):
+        import whisper
+        self.device = device
+        self.model = whisper.load_model(model_name, device=device)
+
+    def transcribe(self, audio) -> str:
+        try:
+            result = self.model.transcribe(audio, fp16=self.device == "cuda")
+        except:
+            result = self.model.transcribe(audio, fp16=False)
+        return result["text"].strip()
+
+class FasterWhisperBackend:
+    """CTranslate2 (faster-whisper) with int8 weights; runs on CUDA or CPU."""
+    def __init__(self, model_name: str, device: str):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model_name, device=device, compute_type=STT_COMPUTE_TYPE[device])
+
+    def transcribe(self, audio) -> str:
+        segments, _ = self.model.transcribe(audio, beam_size=5, vad_filter=False)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+BACKENDS = {"whisper": WhisperBackend, "faster-whisper": FasterWhisperBackend}
+
+def route(audio) -> str:
+    """Model name for a clip: STT_SHORT_MODEL up to STT_SHORT_MAX_SECONDS, else STT_LONG_MODEL."""
+    return STT_SHORT_MODEL if len(audio) / SAMPLE_RATE <= STT_SHORT_MAX_SECONDS else STT_LONG_MODEL
+
+class BackendPool:
+    """Loads one backend per model name on first use and keeps it for the container's lifetime."""
+    def __init__(self, device: str, engine: str = STT_ENGINE):
+        self.device = device
+        self.engine = BACKENDS[engine]
+        self.backends: Dict[str, object] = {}
+        self.lock = threading.Lock()
+
+    def get(self, model_name: str):
+        with self.lock:
+            if model_name not in self.backends:
+                self.backends[model_name] = self.engine(model_name, self.device)
+            return self.backends[model_name]
+
+    def transcribe(self, audio, model_name: str) -> str:
+        """`audio` is decode_audio's int16 PCM (float32 samples are passed through)."""
+        import numpy as np
+        if audio.dtype == np.int16: audio = audio.astype(np.float32) / 32768.0
+        return self.get(model_name).transcribe(audio)
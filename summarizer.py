@@ -0,0 +1,67 @@
+import asyncio
+import time
+from typing import List, Tuple, Callable, Awaitable, Optional
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from api_client import BackendBusy, ModalClient, LONG_FORM_STOP
+from prompts import RESUME_CHUNK_SUMMARY_PROMPT, RESUME_COMBINE_PROMPT
+from config import RESUME_CHUNK_SIZE, RESUME_CHUNK_OVERLAP, SUMMARY_CONCURRENCY, SUMMARY_REDUCE_FANIN, BUSY_MAX_WAIT_SECONDS
+
+# Called with (chunks_done, chunks_total) each time a chunk summary finishes
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+def split_resume(text: str) -> List[str]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=RESUME_CHUNK_SIZE, chunk_overlap=RESUME_CHUNK_OVERLAP)
+    return splitter.split_text(text)
+
+async def _llm(prompt: str) -> str:
+    """
+    One summarization call. While the backend sheds load, waits out its Retry-After and
+    calls again (up to BUSY_MAX_WAIT_SECONDS), so finished chunks are not redone.
+    """
+    deadline = time.monotonic() + BUSY_MAX_WAIT_SECONDS
+    while True:
+        try:
+            return await ModalClient.llm([{"role": "user", "content": prompt}], stop=LONG_FORM_STOP)
+        except BackendBusy as e:
+            if time.monotonic() + e.retry_after > deadline: raise
+            await asyncio.sleep(e.retry_after)
+
+async def _combine(summaries: List[str], limit: asyncio.Semaphore) -> str:
+    prompt = RESUME_COMBINE_PROMPT.format(summaries="\n".join(summaries))
+    async with limit:
+        return await _llm(prompt)
+
+async def summarize_chunks(chunks: List[str], on_progress: Optional[ProgressCallback] = None) -> List[str]:
+    """Map step: summarizes every chunk in parallel, at most SUMMARY_CONCURRENCY at a time."""
+    limit = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+    done = 0
+
+    async def summarize(chunk: str) -> str:
+        nonlocal done
+        async with limit:
+            summary = await _llm(RESUME_CHUNK_SUMMARY_PROMPT.format(chunk=chunk))
+        done += 1
+        if on_progress: await on_progress(done, len(chunks))
+        return summary
+
+    return list(await asyncio.gather(*(summarize(c) for c in chunks)))
+
+async def reduce_summaries(summaries: List[str]) -> str:
+    """
+    Reduce step: while there are more partial summaries than fit in one prompt,
+    combine them in groups of SUMMARY_REDUCE_FANIN (in parallel), then do a final combine.
+    """
+    limit = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+    partials = [s for s in summaries if s]
+    while len(partials) > SUMMARY_REDUCE_FANIN:
+        groups = [partials[i:i + SUMMARY_REDUCE_FANIN] for i in range(0, len(partials), SUMMARY_REDUCE_FANIN)]
+        partials = [s for s in await asyncio.gather(*(_combine(g, limit) for g in groups)) if s]
+    if not partials:
+        return ""
+    return await _combine(partials, limit)
+
+async def summarize_resume(resume_text: str, on_progress: Optional[ProgressCallback] = None) -> Tuple[List[str], str]:
+    """Returns (chunk_summaries, resume_summary)."""
+    chunks = split_resume(resume_text)
+    chunk_summaries = await summarize_chunks(chunks, on_progress)
+    return chunk_summaries, await reduce_summaries(chunk_summaries)
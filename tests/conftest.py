@@ -0,0 +1,77 @@
+# Shared fixtures. Nothing here needs the network or Modal: the LLM is a tiny randomly
+# initialised Llama with a character-level tokenizer, and backend calls go to
+# mock_backend.py served in-process.
+import os
+import socket
+import string
+import sys
+import threading
+import time
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# api_client reads MODAL_BASE_URL when first imported, so it is fixed before any test module loads
+MOCK_PORT = _free_port()
+os.environ["MODAL_BASE_URL"] = f"http://127.0.0.1:{MOCK_PORT}"
+
+CHAT_TEMPLATE = (
+    "{% for m in messages %}<|{{ m['role'] }}|>{{ m['content'] }}\n{% endfor %}"
+    "{% if add_generation_prompt %}<|assistant|>{% endif %}"
+)
+
+@pytest.fixture(scope="session")
+def tokenizer():
+    """
+    Character-level tokenizer over printable ASCII. The multi-character tokens are never
+    produced by encode() but can be generated, so stop strings and JSON skeletons can
+    arrive split across tokens or inside one.
+    """
+    from tokenizers import Tokenizer, decoders, models
+    from transformers import PreTrainedTokenizerFast
+
+    specials = ["<pad>", "<eos>", "<|user|>", "<|assistant|>", "<|system|>"]
+    pieces = specials + list(dict.fromkeys(string.printable)) + ["the", "ing", "User:", '{"', '":', '","', '"}']
+    vocab = {piece: i for i, piece in enumerate(pieces)}
+    backend = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    backend.add_special_tokens(specials)
+    backend.decoder = decoders.Fuse()
+    tok = PreTrainedTokenizerFast(tokenizer_object=backend, pad_token="<pad>", eos_token="<eos>")
+    tok.chat_template = CHAT_TEMPLATE
+    return tok
+
+@pytest.fixture(scope="session")
+def model(tokenizer):
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    torch.manual_seed(0)
+    config = LlamaConfig(
+        vocab_size=len(tokenizer), hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=512,
+        pad_token_id=tokenizer.pad_token_id, eos_token_id=tokenizer.eos_token_id
+    )
+    return LlamaForCausalLM(config).eval()
+
+@pytest.fixture(scope="session")
+def mock_backend():
+    """mock_backend.py on MOCK_PORT with no injected latency or errors; yields its module for settings/stats/gates."""
+    import uvicorn
+    import mock_backend as backend
+
+    backend.settings["latency_scale"] = 0.0
+    backend.settings["error_rate"] = {name: 0.0 for name in backend.settings["error_rate"]}
+    server = uvicorn.Server(uvicorn.Config(backend.fastapi_app, host="127.0.0.1", port=MOCK_PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield backend
+    server.should_exit = True
+    thread.join(timeout=5)
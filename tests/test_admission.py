@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from starlette.requests import ClientDisconnect
+from admission import AdmissionGate, AdmittedStream, Overloaded
+
+SCOPE = {"type": "http", "asgi": {"spec_version": "2.4"}}
+
+async def receive():
+    return {"type": "http.disconnect"}
+
+def stream(gate, started, closed):
+    async def body():
+        try:
+            for i in range(100):
+                yield f"{i}\n"
+        finally:
+            closed.append(True)
+    return AdmittedStream(gate, started, body())
+
+@pytest.mark.parametrize("sent_before_disconnect", [0, 3])
+def test_stream_releases_slot_when_client_disconnects(sent_before_disconnect):
+    # 0: gone before the generator starts; 3: gone mid-stream
+    async def run():
+        gate, closed, sent = AdmissionGate("llm", 1, 0, 30), [], []
+        response = stream(gate, await gate.acquire(), closed)
+        with pytest.raises(Overloaded):
+            await gate.acquire()
+
+        async def send(message):
+            if len(sent) == sent_before_disconnect: raise OSError("client went away")
+            sent.append(message)
+
+        with pytest.raises(ClientDisconnect):
+            await response(SCOPE, receive, send)
+        assert gate.running == 0
+        assert len(sent) == sent_before_disconnect
+        # A generator that never started has no cleanup to run; one cut off mid-stream is closed
+        assert closed == ([True] if sent_before_disconnect else [])
+        await asyncio.wait_for(gate.acquire(), 1)
+
+    asyncio.run(run())
+
+def test_stream_releases_slot_once_when_finished():
+    async def run():
+        gate, closed, sent = AdmissionGate("llm", 2, 0, 30), [], []
+
+        async def send(message):
+            sent.append(message)
+
+        await stream(gate, await gate.acquire(), closed)(SCOPE, receive, send)
+        assert gate.running == 0 and gate._slots._value == 2
+        assert closed == [True] and sent[-1]["more_body"] is False
+
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+import asyncio
+import time
+import aiohttp
+import pytest
+from prometheus_client import REGISTRY
+import api_client
+from api_client import Analysis, BackendBusy, ModalClient, parse_analysis
+
+@pytest.fixture(autouse=True)
+def fresh_client():
+    ModalClient._busy_until.clear()
+    yield
+    ModalClient._busy_until.clear()
+    asyncio.run(ModalClient.close())
+
+def test_check_intent_lets_load_shedding_through():
+    # The local model calls this off-topic, so hybrid mode asks the LLM, which is shedding load
+    ModalClient._busy_until["llm"] = time.monotonic() + 60
+    with pytest.raises(BackendBusy):
+        asyncio.run(ModalClient.check_intent("Do you like football?"))
+
+def test_parse_analysis():
+    text = '{"rating":"Good","feedback":"Clear, but skipped failure modes.","is_struggling":false,"should_probe":true}'
+    assert parse_analysis(text) == Analysis("Good", "Clear, but skipped failure modes.", False, True)
+
+@pytest.mark.parametrize("text", ["", "Rating: Good", '{"rating":"Good"}', "[1, 2]", '{"rating":"Good","feedback":"x",'])
+def test_parse_analysis_rejects_other_replies(text):
+    assert parse_analysis(text) is None
+
+def test_read_timeout_is_not_retried(mock_backend, monkeypatch):
+    # The backend is still generating when the client gives up; sending it again would double the work
+    monkeypatch.setitem(mock_backend.settings, "latency_scale", 1.0)
+    monkeypatch.setitem(api_client.HTTP_READ_TIMEOUT, "llm", 0.1)
+    calls = mock_backend.stats["llm.calls"]
+    payload = {"messages": [{"role": "user", "content": "hi"}], "max_tokens": 60}
+    with pytest.raises(aiohttp.ServerTimeoutError):
+        asyncio.run(ModalClient._post("llm", api_client.LLM_URL, json=payload))
+    assert mock_backend.stats["llm.calls"] == calls + 1
+
+def test_connect_failure_is_retried(monkeypatch):
+    monkeypatch.setattr(api_client, "HTTP_RETRY_BACKOFF", 0.01)
+    before = REGISTRY.get_sample_value("interview_backend_retries_total", {"endpoint": "tts", "reason": "ClientConnectorError"}) or 0
+    with pytest.raises(aiohttp.ClientConnectorError):
+        # Nothing listens on port 9 (discard) here
+        asyncio.run(ModalClient._post("tts", "http://127.0.0.1:9/tts", json={"text": "hi"}))
+    after = REGISTRY.get_sample_value("interview_backend_retries_total", {"endpoint": "tts", "reason": "ClientConnectorError"})
+    assert after - before == api_client.HTTP_MAX_RETRIES
@@ -0,0 +1,40 @@
+import io
+import numpy as np
+import pytest
+import soundfile as sf
+from audio_preprocess import preprocess, voiced_regions
+from config import STT_SAMPLE_RATE
+
+def speech(seconds: float, rate: int, voiced=lambda t: np.ones_like(t)) -> np.ndarray:
+    """Harmonics of 140 Hz at a steady level (no pauses unless `voiced` adds them), over light noise."""
+    t = np.arange(int(seconds * rate)) / rate
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6)) * (0.8 + 0.2 * np.sin(2 * np.pi * 4 * t))
+    return 0.2 * voice * voiced(t) + 0.01 * np.random.default_rng(0).standard_normal(len(t))
+
+def recording(tmp_path, audio: np.ndarray, rate: int, channels: int = 1) -> str:
+    path = str(tmp_path / "answer.wav")
+    sf.write(path, np.repeat(audio[:, None], channels, axis=1), rate, subtype="PCM_16")
+    return path
+
+def kept_seconds(prepared) -> float:
+    return sum(len(sf.read(io.BytesIO(s))[0]) for s in prepared.segments) / STT_SAMPLE_RATE
+
+@pytest.mark.parametrize("seconds, rate, channels", [(1, 16000, 1), (2, 44100, 2)])
+def test_clip_without_pauses_is_kept(tmp_path, seconds, rate, channels):
+    prepared = preprocess(recording(tmp_path, speech(seconds, rate), rate, channels))
+    assert len(prepared.segments) == 1
+    assert prepared.removed_seconds < 0.1
+    assert kept_seconds(prepared) == pytest.approx(seconds, abs=0.1)
+
+def test_long_pauses_are_trimmed(tmp_path):
+    # 1.5 s of speech, then 2 s of near-silence, three times
+    audio = speech(10.5, 16000, voiced=lambda t: (t % 3.5) < 1.5)
+    prepared = preprocess(recording(tmp_path, audio, 16000))
+    assert 4.0 < prepared.removed_seconds < 6.0
+    assert kept_seconds(prepared) == pytest.approx(10.5 - prepared.removed_seconds, abs=0.1)
+
+def test_nothing_above_threshold_sends_the_whole_clip(tmp_path):
+    quiet = 1e-4 * np.random.default_rng(1).standard_normal(16000)
+    assert voiced_regions(quiet.astype(np.float32)) == []
+    prepared = preprocess(recording(tmp_path, quiet, 16000))
+    assert len(prepared.segments) == 1 and prepared.removed_seconds == 0
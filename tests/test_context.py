@@ -0,0 +1,16 @@
+from prometheus_client import REGISTRY
+from context import build_context, message_tokens
+
+def sample(name, call):
+    return REGISTRY.get_sample_value(name, {"call": call}) or 0
+
+def test_prompt_and_trimmed_tokens_are_exported():
+    history = [{"role": "user" if i % 2 else "assistant", "content": f"turn {i} " + "word " * 60} for i in range(12)]
+    count, total, trimmed = (sample(n, "test") for n in (
+        "interview_prompt_tokens_count", "interview_prompt_tokens_sum", "interview_prompt_trimmed_tokens_total"
+    ))
+    messages = build_context("You are an interviewer.", history, "", 300, call="test")
+    assert len(messages) < len(history)
+    assert sample("interview_prompt_tokens_count", "test") == count + 1
+    assert sample("interview_prompt_tokens_sum", "test") == total + sum(message_tokens(m) for m in messages)
+    assert sample("interview_prompt_trimmed_tokens_total", "test") > trimmed
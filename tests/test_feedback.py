@@ -0,0 +1,26 @@
+import asyncio
+import feedback
+from api_client import ModalClient
+
+def run_interview(monkeypatch, fail_call=None):
+    calls = []
+
+    async def llm(messages, **kwargs):
+        calls.append(messages)
+        return "" if len(calls) == fail_call else f"summary {len(calls)}"
+    monkeypatch.setattr(ModalClient, "llm", llm)
+
+    async def run():
+        for i, topic in enumerate(("project", "technical", "followup")):
+            feedback.submit("t", i, f"note {i}", topic)
+        return await feedback.finish("t", 3)
+    return asyncio.run(run())
+
+def test_every_note_folded(monkeypatch):
+    sections = run_interview(monkeypatch)
+    assert set(sections) == set(feedback.SECTIONS)
+    assert all(sections[s] for s in ("technical", "projects", "communication"))
+
+def test_failed_fold_falls_back_to_full_notes(monkeypatch):
+    # The second note's section fold fails; its answer must not silently drop out of the report
+    assert run_interview(monkeypatch, fail_call=3) is None
@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from config import INTENT_CONFIDENCE_THRESHOLD
+from intent import OFF_TOPIC, VALID, FallbackIntentClassifier, IntentClassifier, LocalIntentClassifier, load_examples
+
+class Recorder(IntentClassifier):
+    """Stands in for the LLM check: answers VALID and remembers what it was asked."""
+    def __init__(self):
+        self.asked = []
+
+    async def classify(self, text):
+        self.asked.append(text)
+        return VALID, 1.0
+
+@pytest.fixture(scope="module")
+def local():
+    return LocalIntentClassifier()
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        IntentClassifier()
+
+def test_local_off_topic_is_confirmed(local):
+    answer = "The football club's ticketing website crashed so I rewrote the checkout"
+    llm = Recorder()
+    hybrid = FallbackIntentClassifier(local, llm, threshold=0.8, confirm=(OFF_TOPIC,))
+    assert asyncio.run(hybrid.classify(answer))[0] == VALID
+    assert llm.asked == [answer]
+
+def test_confident_valid_skips_the_llm(local):
+    llm = Recorder()
+    hybrid = FallbackIntentClassifier(local, llm, threshold=0.8, confirm=(OFF_TOPIC,))
+    label, _ = asyncio.run(hybrid.classify("I built a REST API in Flask and added caching to the hot queries"))
+    assert label == VALID and llm.asked == []
+
+def test_local_accuracy_on_eval_split(local):
+    examples = load_examples("eval")
+    correct = sum(local.predict(e["text"])[0] == e["label"] for e in examples)
+    assert correct / len(examples) >= 0.85
+
+def test_confident_valid_eval_answers_skip_the_llm(local):
+    # Only confident VALID verdicts are final without the LLM, so they must be right
+    examples = load_examples("eval")
+    skipped = []
+    for example in examples:
+        llm = Recorder()
+        hybrid = FallbackIntentClassifier(local, llm, threshold=INTENT_CONFIDENCE_THRESHOLD, confirm=(OFF_TOPIC,))
+        asyncio.run(hybrid.classify(example["text"]))
+        label, confidence = local.predict(example["text"])
+        confident_valid = label == VALID and confidence >= INTENT_CONFIDENCE_THRESHOLD
+        assert (llm.asked == []) == confident_valid, example["text"]
+        if confident_valid: skipped.append(example)
+    assert all(e["label"] == VALID for e in skipped)
+    # ...and cover most valid answers, or the LLM is called for nearly every turn anyway
+    assert len(skipped) >= 0.6 * sum(e["label"] == VALID for e in examples)
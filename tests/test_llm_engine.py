@@ -0,0 +1,183 @@
+import json
+import threading
+import pytest
+import torch
+from transformers import StoppingCriteriaList, TextIteratorStreamer
+import llm_engine
+from llm_engine import (
+    Cancelled, JsonSchemaMatcher, MicroBatcher, PrefixCache, encode_chat, finish_completion, generate_batch, shared_prefix_length
+)
+
+QUESTIONS = ["hi", "Tell me about a project you are proud of.", "Why?"]
+
+def greedy(tokenizer, content: str, max_tokens: int = 16, **extra):
+    prompt = encode_chat(tokenizer, [{"role": "user", "content": content}])
+    return {"prompt": prompt, "max_tokens": max_tokens, "temperature": 0, **extra}
+
+def test_batched_rows_match_single_requests(model, tokenizer):
+    # Prompts of different lengths, so the batch is left-padded
+    requests = [greedy(tokenizer, q) for q in QUESTIONS]
+    alone = [generate_batch(model, tokenizer, [r])[0] for r in requests]
+    assert generate_batch(model, tokenizer, requests) == alone
+
+def test_rows_stop_at_their_own_max_tokens(model, tokenizer):
+    requests = [greedy(tokenizer, q, max_tokens=n) for q, n in zip(QUESTIONS, (3, 9, 16))]
+    results = generate_batch(model, tokenizer, requests)
+    assert [r["tokens"] for r in results] == [3, 9, 16]
+    assert {r["finish_reason"] for r in results} == {"length"}
+
+def test_stop_string_cuts_only_its_own_row(model, tokenizer):
+    free = generate_batch(model, tokenizer, [greedy(tokenizer, q) for q in QUESTIONS])
+    text = free[1]["text"]
+    stop = text[5:8]
+    expected = text[:text.find(stop)].strip()
+
+    requests = [greedy(tokenizer, q) for q in QUESTIONS]
+    requests[1]["stop"] = [stop]
+    results = generate_batch(model, tokenizer, requests)
+    assert results[1]["text"] == expected
+    assert results[1]["finish_reason"] == "stop"
+    assert results[1]["tokens"] < 16
+    assert results[0] == free[0] and results[2] == free[2]
+
+SYSTEM = "You are a strict technical interviewer. Ask one question at a time and keep it short."
+
+def with_system(tokenizer, content: str):
+    request = greedy(tokenizer, content)
+    request["prompt"] = encode_chat(tokenizer, [{"role": "system", "content": SYSTEM}, {"role": "user", "content": content}])
+    return request
+
+def test_shared_prefix_length():
+    assert shared_prefix_length([[1, 2, 3], [1, 2, 4, 5], [1, 2]]) == 2
+    assert shared_prefix_length([[1, 2, 3]]) == 3
+    assert shared_prefix_length([[1], [2]]) == 0
+
+def test_batched_rows_reuse_the_shared_system_prompt(model, tokenizer):
+    requests = [with_system(tokenizer, q) for q in QUESTIONS]
+    uncached = generate_batch(model, tokenizer, requests)
+    cache = PrefixCache(1 << 30, 8)
+    assert generate_batch(model, tokenizer, requests, cache) == uncached
+    assert generate_batch(model, tokenizer, requests, cache) == uncached
+    assert cache.stats["hits"] == 1 and cache.stats["reused_tokens"] >= len(tokenizer.encode(SYSTEM)) - 8
+
+def test_prefix_cache_edge_batches(model, tokenizer):
+    cache = PrefixCache(1 << 30, 8)
+    # A lone request, a batch whose first prompt is a prefix of another, and one with no shared block
+    lone = [with_system(tokenizer, QUESTIONS[1])]
+    nested = [with_system(tokenizer, "Why"), with_system(tokenizer, "Why not?")]
+    unrelated = [greedy(tokenizer, q) for q in QUESTIONS]
+    for requests in (lone, nested, unrelated):
+        assert generate_batch(model, tokenizer, requests, cache) == generate_batch(model, tokenizer, requests)
+
+def test_finish_completion(tokenizer):
+    ids = tokenizer.encode("Next question\nUser: hi", add_special_tokens=False)
+    assert finish_completion(tokenizer, ids, 100, ["\nUser:"]) == {"text": "Next question", "finish_reason": "stop", "tokens": len(ids)}
+    assert finish_completion(tokenizer, ids, 4, ["\nUser:"])["finish_reason"] == "length"
+    # Padding after EOS is not counted
+    padded = ids[:4] + [tokenizer.eos_token_id] + [tokenizer.pad_token_id] * 3
+    assert finish_completion(tokenizer, padded, 100, []) == {"text": "Next", "finish_reason": "stop", "tokens": 4}
+
+def test_micro_batcher_groups_concurrent_requests():
+    batches = []
+
+    def run_batch(requests):
+        batches.append(len(requests))
+        return [r * 10 for r in requests]
+
+    batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=500)
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.update({i: batcher.submit(i)})) for i in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert results == {i: i * 10 for i in range(4)}
+    assert batches == [4]
+
+def test_micro_batcher_fails_the_whole_batch():
+    def run_batch(requests):
+        raise RuntimeError("out of memory")
+
+    batcher = MicroBatcher(run_batch, max_batch_size=2, max_wait_ms=1)
+    with pytest.raises(RuntimeError, match="out of memory"):
+        batcher.submit("x")
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rating": {"type": "string", "enum": ["Needs Improvement", "Good", "Excellent"]},
+        "score": {"type": "integer"},
+        "note": {"type": "string", "maxLength": 12},
+        "ok": {"type": "boolean"}
+    }
+}
+
+def test_json_schema_matcher_scan():
+    matcher = JsonSchemaMatcher(SCHEMA)
+    assert matcher.scan("") == (True, False, "{")
+    assert matcher.scan("{") == (True, False, '"rating":')
+    assert matcher.scan('{"rating":"G') == (True, False, 'ood"')
+    assert matcher.scan('{"rating":"Needs') == (True, False, ' Improvement"')
+    assert matcher.scan('{"rating":"Bad"')[0] is False
+    assert matcher.scan('{"rating":"Good","score":1') == (True, False, "")
+    assert matcher.scan('{"rating":"Good","score":1.5')[0] is False
+    assert matcher.scan('{"rating":"Good","score":0')[0] is True
+    assert matcher.scan('{"rating":"Good","score":06')[0] is False
+    assert matcher.scan('{"rating":"Good","score":' + "9" * JsonSchemaMatcher.NUMBER_MAX_CHARS)[0] is True
+    assert matcher.scan('{"rating":"Good","score":' + "9" * (JsonSchemaMatcher.NUMBER_MAX_CHARS + 1))[0] is False
+    assert matcher.scan('{"rating":"Good","score":1,"note":"twelve chars"')[0] is True
+    assert matcher.scan('{"rating":"Good","score":1,"note":"thirteen char')[0] is False
+    assert matcher.scan('{"rating":"Good","score":1,"note":"x","ok":t') == (True, False, "rue")
+    assert matcher.scan('{"rating":"Good","score":-3,"note":"a\\"b","ok":false}') == (True, True, "")
+    assert matcher.scan('{"rating":"Good","score":-3,"note":"","ok":false} ')[0] is False
+
+@pytest.mark.parametrize("value, ok", [
+    ("-", True), ("1.", True), ("1.5e", True), ("1e-", True), ("-0.25E+3}", True),
+    ("1.e5", False), (".5", False), ("01", False), ("1.}", False), ("-}", False)
+])
+def test_json_schema_matcher_numbers(value, ok):
+    matcher = JsonSchemaMatcher({"type": "object", "properties": {"x": {"type": "number"}}})
+    assert matcher.scan('{"x":' + value)[0] is ok
+
+@pytest.mark.parametrize("schema", [{"type": "array"}, {"type": "object", "properties": {"tags": {"type": "array"}}}])
+def test_json_schema_matcher_rejects_unsupported_schemas(schema):
+    with pytest.raises(ValueError):
+        JsonSchemaMatcher(schema)
+
+def test_json_schema_rows_decode_to_matching_objects(model, tokenizer):
+    # The untrained model only produces valid JSON because decoding is constrained
+    # Longest possible object is ~80 characters, so 120 tokens always reach the closing brace
+    requests = [greedy(tokenizer, q, max_tokens=120, json_schema=s) for q, s in zip(QUESTIONS, (SCHEMA, None, SCHEMA))]
+    requests[2]["temperature"] = 1.0
+    results = generate_batch(model, tokenizer, requests)
+    for result in (results[0], results[2]):
+        data = json.loads(result["text"])
+        assert list(data) == ["rating", "score", "note", "ok"]
+        assert data["rating"] in SCHEMA["properties"]["rating"]["enum"]
+        assert isinstance(data["score"], int) and isinstance(data["ok"], bool)
+        assert len(data["note"]) <= 12
+        assert result["finish_reason"] == "stop"
+    # The unconstrained row in the same batch decodes as it would alone
+    assert results[1] == generate_batch(model, tokenizer, [greedy(tokenizer, QUESTIONS[1], max_tokens=120)])[0]
+
+def test_cancelled_stops_an_abandoned_stream(model, tokenizer):
+    prompt = greedy(tokenizer, QUESTIONS[1])["prompt"]
+    ids = torch.tensor([prompt])
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, timeout=30)
+    cancel, output = threading.Event(), {}
+    worker = threading.Thread(target=lambda: output.setdefault("ids", model.generate(
+        input_ids=ids, attention_mask=torch.ones_like(ids), max_new_tokens=2000, min_new_tokens=2000, do_sample=False,
+        pad_token_id=tokenizer.pad_token_id, stopping_criteria=StoppingCriteriaList([Cancelled(cancel)]), streamer=streamer
+    )))
+    worker.start()
+    # The consumer reads a little, then goes away
+    for _ in zip(range(3), streamer): pass
+    cancel.set()
+    worker.join(30)
+    assert not worker.is_alive()
+    assert output["ids"].shape[1] - len(prompt) < 2000
+
+def test_batches_without_schemas_skip_the_vocab_table(model, tokenizer, monkeypatch):
+    # Decoding the whole vocabulary would hold up every unconstrained batch after a cold start
+    def fail(tokenizer):
+        raise AssertionError("vocab table built for a batch with no json_schema")
+    monkeypatch.setattr(llm_engine, "_vocab_strings", fail)
+    generate_batch(model, tokenizer, [greedy(tokenizer, q, max_tokens=4) for q in QUESTIONS])
@@ -0,0 +1,54 @@
+import asyncio
+import time
+import pytest
+import graph
+import sessions
+from api_client import BackendBusy, ModalClient
+
+ANSWER = "I built a payments API in Go and sharded its Postgres database by merchant."
+
+@pytest.fixture(autouse=True)
+def fresh_client():
+    ModalClient._busy_until.clear()
+    yield
+    ModalClient._busy_until.clear()
+    asyncio.run(ModalClient.close())
+
+def start_state():
+    return {
+        "messages": [], "llm_history": [], "history_summary": "", "role": "Backend Engineer",
+        "level": "medium", "resume_summary": "", "question_count": 0, "feedback_notes": [],
+        "report_text": None, "message_type": "question", "project_questions_asked": 0,
+        "technical_questions_asked": 0, "followup_questions_asked": 0, "consecutive_struggles": 0,
+        "last_question_type": None, "requesting_hint": False, "topic_depth": 0, "current_topic": "technical"
+    }
+
+def test_busy_turn_stays_pending_across_restart(tmp_path, mock_backend):
+    path = str(tmp_path / "sessions.db")
+
+    async def run():
+        await sessions.open(path)
+        state = await sessions.app_graph.ainvoke(start_state(), sessions.config("t"))
+        assert not await sessions.pending("t")
+
+        # The LLM is shedding load, so the answer is checkpointed but its turn does not finish
+        ModalClient._busy_until["llm"] = time.monotonic() + 60
+        update = {"requesting_hint": False, **graph.remember(state, {"role": "user", "content": ANSWER})}
+        with pytest.raises(BackendBusy):
+            await sessions.app_graph.ainvoke(update, sessions.config("t"))
+        assert await sessions.pending("t")
+
+        # A fresh worker (no in-memory session) still sees the turn as pending
+        await sessions.close()
+        await sessions.open(path)
+        assert await sessions.pending("t")
+
+        ModalClient._busy_until.clear()
+        state = await sessions.app_graph.ainvoke(None, sessions.config("t"))
+        assert not await sessions.pending("t")
+        assert [t["content"] for t in state["llm_history"]].count(ANSWER) == 1
+        assert state["llm_history"][-1]["role"] == "assistant"
+        assert state["question_count"] == 2
+        await sessions.close()
+
+    asyncio.run(run())
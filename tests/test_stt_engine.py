@@ -0,0 +1,44 @@
+import asyncio
+import io
+import numpy as np
+import soundfile as sf
+from stt_engine import BackendPool, decode_audio
+
+def wav(samples: np.ndarray, rate: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    sf.write(buf, samples, rate, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+def test_decode_audio_returns_mono_int16():
+    stereo = np.stack([np.full(16000, 0.5), np.full(16000, -0.25)], axis=1)
+    audio = decode_audio(wav(stereo))
+    assert audio.dtype == np.int16 and audio.shape == (16000,)
+    assert abs(int(audio[0]) - int(0.125 * 32768)) <= 1
+
+class Recorder:
+    def __init__(self, model_name, device):
+        self.received = None
+
+    def transcribe(self, audio):
+        self.received = audio
+        return "ok"
+
+def test_pool_converts_pcm_to_float():
+    pool = BackendPool("cpu", engine="whisper")
+    pool.engine = Recorder
+    assert pool.transcribe(np.array([16384, -32768], np.int16), "base.en") == "ok"
+    received = pool.get("base.en").received
+    assert received.dtype == np.float32 and received.tolist() == [0.5, -1.0]
+
+def test_stt_round_trip_through_the_mock(mock_backend):
+    from api_client import ModalClient
+
+    async def run():
+        try:
+            return await ModalClient.stt(wav(np.zeros(32000)))
+        finally:
+            await ModalClient.close()
+
+    before = mock_backend.stats["stt.bytes_in"]
+    assert asyncio.run(run())
+    assert mock_backend.stats["stt.bytes_in"] > before
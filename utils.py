@@ -1,8 +1,14 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
+import asyncio
 import io
+import multiprocessing
 import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from prompts import FALLBACK_QUESTION
+from config import REPORT_RENDER_WORKERS, REPORT_RENDER_QUEUE, REPORT_RENDER_TIMEOUT
 
 def clean_llm_response(text: str) -> str:
     """
@@ -42,7 +48,7 @@ def clean_llm_response(text: str) -> str:
     text = re.sub(r'\s+', ' ', text).strip()
 
     if not text or len(text) < 3:
-        text = "Could you elaborate on that?"
+        text = FALLBACK_QUESTION
 
     return text
 
@@ -66,3 +72,35 @@ def create_pdf_report(candidate_name, role, content):
     doc.build(story)
     buffer.seek(0)
     return buffer.getvalue()
+
+# ReportLab layout is pure Python, so it runs in worker processes rather than on the event loop
+_render_pool: Optional[ProcessPoolExecutor] = None
+_render_slots: Optional[asyncio.Semaphore] = None
+
+async def render_pdf_report(candidate_name, role, content) -> Optional[bytes]:
+    """
+    create_pdf_report in the render pool. At most REPORT_RENDER_QUEUE renders are
+    queued or running; returns None if waiting plus rendering exceeds REPORT_RENDER_TIMEOUT.
+    """
+    global _render_pool, _render_slots
+    if _render_pool is None:
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _render_pool = ProcessPoolExecutor(REPORT_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        _render_slots = asyncio.Semaphore(REPORT_RENDER_QUEUE)
+
+    async def render():
+        async with _render_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_render_pool, create_pdf_report, candidate_name, role, content)
+
+    try:
+        return await asyncio.wait_for(render(), REPORT_RENDER_TIMEOUT)
+    except Exception as e:
+        print(f"PDF render failed: {e!r}")
+        return None
+
+def shutdown_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+    _render_pool = None
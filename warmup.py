@@ -1,98 +1,108 @@
-import requests
-import json
-import os
+# warmup.py
+# Backend warm-up, run by the Chainlit app for its lifetime (see app.py's lifespan).
+# The backend's /ready route pings the LLM, TTS and STT pools at once, starting any that
+# are down, so polling it until every pool answers is the warm-up. Meanwhile is_ready()
+# gates new interviews. keep_warm() then holds a minimum of warm containers sized to the
+# sessions active recently, and lets the pools scale to zero once traffic stops.
+#
+#   python warmup.py   # warm the deployment by hand, then smoke-test each endpoint
+import asyncio
+import math
+import time
+from typing import Dict, Optional
+from api_client import ModalClient
+from config import (
+    WARMUP_TIMEOUT, WARMUP_POLL_INTERVAL, KEEPWARM_INTERVAL, KEEPWARM_ACTIVE_WINDOW,
+    KEEPWARM_SESSIONS_PER_CONTAINER, KEEPWARM_MAX_CONTAINERS
+)
+import sessions
 
-# --- CONFIGURATION ---
-BASE_URL = "https://bommireddyvenkatadheerajreddy--open-source-interview-tra-3173fc.modal.run"
-# specific endpoints
-URL_HEALTH = f"{BASE_URL}/health"
-URL_LLM = f"{BASE_URL}/llm"
-URL_TTS = f"{BASE_URL}/tts"
-URL_STT = f"{BASE_URL}/stt"
+# Latest /ready report, for logs and the UI
+status: Dict = {"ready": False, "models": {}}
+_last_ready = 0.0
+_warming: Optional[asyncio.Task] = None
 
-# Colors for terminal output
-GREEN = "\033[92m"
-RED = "\033[91m"
-RESET = "\033[0m"
+def is_ready() -> bool:
+    """True if the backend answered ready recently enough to trust without asking again."""
+    return _last_ready > 0 and time.monotonic() - _last_ready < 2 * KEEPWARM_INTERVAL
 
-def test_health():
-    print(f"Testing Health ({URL_HEALTH})...", end=" ")
-    try:
-        resp = requests.get(URL_HEALTH, verify=False)
-        if resp.status_code == 200:
-            print(f"{GREEN}PASSED{RESET}")
-            return True
-    except Exception as e:
-        print(f"{RED}FAILED{RESET} - {e}")
-    return False
+async def check() -> bool:
+    """Asks the backend now (starting any pool that is down); True if every model is loaded."""
+    global _last_ready
+    report = await ModalClient.readiness()
+    status.clear()
+    status.update(report)
+    if report.get("ready"):
+        _last_ready = time.monotonic()
+    return bool(report.get("ready"))
 
-def test_llm():
-    print(f"Testing LLM ({URL_LLM})...", end=" ")
-    # Matching your docs: {"history": [{"role": "user", "content": "..."}]}
-    payload = {
-        "history": [
-            {"role": "user", "content": "I am testing your API. Say hello."}
-        ]
+async def warm_until_ready(timeout: float = WARMUP_TIMEOUT) -> bool:
+    start = time.monotonic()
+    while not await check():
+        if time.monotonic() - start >= timeout:
+            print(f"Backend not ready after {timeout}s: {status.get('models') or status.get('error')}")
+            return False
+        await asyncio.sleep(WARMUP_POLL_INTERVAL)
+    print(f"Backend ready after {time.monotonic() - start:.0f}s")
+    return True
+
+def warm() -> asyncio.Task:
+    """The shared warm-up task, started if none is running; its result is True once ready."""
+    global _warming
+    if _warming is None or _warming.done():
+        _warming = asyncio.create_task(warm_until_ready())
+    return _warming
+
+def warm_targets(active_sessions: int) -> Dict[str, int]:
+    """Minimum warm containers per pool for `active_sessions` (all zero when idle)."""
+    return {
+        pool: min(KEEPWARM_MAX_CONTAINERS[pool], math.ceil(active_sessions / per_container))
+        for pool, per_container in KEEPWARM_SESSIONS_PER_CONTAINER.items()
     }
-    try:
-        resp = requests.post(URL_LLM, json=payload, verify=False)
-        data = resp.json()
-        if "response" in data:
-            print(f"{GREEN}PASSED{RESET}")
-            print(f"   └── Response: {data['response']}")
-            return True
-        else:
-            print(f"{RED}FAILED{RESET} (Unexpected format): {data}")
-    except Exception as e:
-        print(f"{RED}FAILED{RESET} - {e}")
-    return False
 
-def test_tts():
-    print(f"Testing TTS ({URL_TTS})...", end=" ")
-    payload = {"text": "System check complete. Audio generation successful."}
-    try:
-        resp = requests.post(URL_TTS, json=payload, verify=False)
-        if resp.status_code == 200:
-            with open("warmup_audio.wav", "wb") as f:
-                f.write(resp.content)
-            print(f"{GREEN}PASSED{RESET}")
-            print(f"   └── Saved to 'warmup_audio.wav'")
-            return True
-        else:
-            print(f"{RED}FAILED{RESET} Status: {resp.status_code}")
-    except Exception as e:
-        print(f"{RED}FAILED{RESET} - {e}")
-    return False
+async def keep_warm():
+    applied = None
+    while True:
+        try:
+            active = await sessions.active_count(KEEPWARM_ACTIVE_WINDOW)
+            targets = warm_targets(active)
+            if targets != applied and await ModalClient.set_warm_containers(targets):
+                print(f"Keep-warm: {active} active sessions, minimum containers {targets}")
+                applied = targets
+            # While candidates are around, keep the readiness gate current
+            if active: await check()
+        except Exception as e:
+            print(f"Keep-warm failed: {e}")
+        await asyncio.sleep(KEEPWARM_INTERVAL)
 
-def test_stt():
-    print(f"Testing STT ({URL_STT})...", end=" ")
-    # We will use the audio generated in the previous step
-    if not os.path.exists("warmup_audio.wav"):
-        print(f"{RED}SKIPPED{RESET} (No audio file from TTS step)")
-        return False
+async def run():
+    """Warms every pool on launch, then keeps them warm while sessions are active."""
+    await warm()
+    await keep_warm()
 
-    try:
-        with open("warmup_audio.wav", "rb") as f:
-            files = {'file': ('test.wav', f, 'audio/wav')}
-            resp = requests.post(URL_STT, files=files, verify=False)
-        
-        data = resp.json()
-        if "text" in data:
-            print(f"{GREEN}PASSED{RESET}")
-            print(f"   └── Transcribed: '{data['text']}'")
-            return True
-        else:
-            print(f"{RED}FAILED{RESET} (Unexpected format): {data}")
-    except Exception as e:
-        print(f"{RED}FAILED{RESET} - {e}")
-    return False
+async def smoke_test():
+    from api_client import LONG_FORM_STOP
+    print("--- STARTING SYSTEM WARMUP ---\n")
+    start = time.monotonic()
+    if not await warm_until_ready():
+        print(f"FAILED: {status}")
+        return
+    print(f"Ready in {time.monotonic() - start:.0f}s: {status.get('models')}")
+
+    # One request per endpoint, at once; STT transcribes the TTS output
+    llm, audio = await asyncio.gather(
+        ModalClient.llm([{"role": "user", "content": "I am testing your API. Say hello."}], stop=LONG_FORM_STOP),
+        ModalClient.tts("System check complete. Audio generation successful.", fmt="wav")
+    )
+    text = await ModalClient.stt(audio) if audio else ""
+    for name, result in (("LLM", llm), ("TTS", audio and f"{len(audio)} bytes"), ("STT", text)):
+        print(f"{name}: {'PASSED' if result else 'FAILED'}" + (f"\n   └── {result}" if result else ""))
+    print("\n--- WARMUP COMPLETE ---")
 
 if __name__ == "__main__":
-    print("--- STARTING SYSTEM WARMUP ---\n")
-    
-    if test_health():
-        test_llm()
-        if test_tts():
-            test_stt() # Only runs if TTS successfully created the file
-            
-    print("\n--- WARMUP COMPLETE ---")
\ No newline at end of file
+    async def main():
+        try:
+            await smoke_test()
+        finally:
+            await ModalClient.close()
+    asyncio.run(main())